@@ -0,0 +1,286 @@
+# run.py
+# Headless benchmarks for the recommendation hot paths, on synthetic catalogs of any size.
+#
+# Run from the project root:
+#   python -m benchmarks.run                            # 25k, 100k and 500k games, compared with the baseline
+#   python -m benchmarks.run --sizes 25000 --calls 200  # quicker
+#   python -m benchmarks.run --save-baseline            # record this run as the new baseline
+#   python -m benchmarks.run --output run.json          # also keep the full report
+#
+# For each catalog size a synthetic gamedata frame and top-50 table are generated (see
+# synthetic.py) and loaded into a DataRegistry, exactly as the app would hold them. Each
+# operation is then called --calls times on distinct inputs, after a few untimed warm-up calls,
+# and reported as p50/p95/p99 latency, single-threaded throughput and peak RSS. This is repeated
+# --rounds times and the fastest round is kept, which filters out most of the noise from other
+# load on the machine (the way timeit reports its best repeat). Inputs
+# are prepared outside the timed region: trim_franchise_clones and filter_games get the tables
+# get_rec_by_name builds. find_closest_name is timed on queries it has not seen, i.e. without
+# its per-query memo (typed prefixes, exact titles and misspelled titles).
+#
+# Peak RSS is the process high-water mark while the operation ran; on Linux it is reset before
+# each operation, elsewhere it is the high-water mark of the whole run so far.
+#
+# The run is compared with benchmarks/baselines/baseline.json (same size and operation only). An
+# operation regresses when its p95 latency grows by more than --max-slowdown and by more than
+# --min-delta-ms (sub-millisecond timings jitter by tens of percent on a shared machine), or its
+# peak RSS by more than --max-rss-growth; the exit status is 1 if anything regressed. Baselines
+# are only comparable on the same machine, so record one on the deploy hardware before relying on it.
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import numpy as np
+import pandas as pd
+from src.data_registry import RECIPE_PATHS, DataRegistry
+from src.filters import SIDEBAR_DEFAULTS
+from src.helper_funct import filter_games, find_closest_name, trim_franchise_clones
+from src.recommendation import get_rec_by_name
+from benchmarks.synthetic import synthetic_gamedata, synthetic_store, synthetic_top300
+
+DEFAULT_SIZES = [25000, 100000, 500000]
+DEFAULT_CALLS = 500
+DEFAULT_ROUNDS = 3
+WARMUP_CALLS = 5
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "baseline.json")
+
+# Match mode benchmarked; every mode is served by the same synthetic table
+BENCH_MODE = "mixed"
+
+
+def _rss_mb(field: str) -> float:
+    """A /proc/self/status memory field (VmRSS, VmHWM) in MB; the run's peak RSS where there is no /proc."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024   # bytes on macOS, KB elsewhere
+
+
+def _reset_peak_rss():
+    """Reset the kernel's RSS high-water mark to the current RSS (Linux only; no-op elsewhere)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _misspell(title: str, rng) -> str:
+    """Swap two neighbouring letters, the most common typo."""
+    if len(title) < 4:
+        return title
+    i = int(rng.integers(1, len(title) - 2))
+    return title[:i] + title[i + 1] + title[i] + title[i + 2:]
+
+
+def build_registry(n_games: int, seed: int = 0) -> tuple[DataRegistry, dict]:
+    """A registry over a synthetic catalog, plus how long each setup step took."""
+    timings = {}
+    started = time.perf_counter()
+    gamedata = synthetic_gamedata(n_games, seed)
+    store = synthetic_store(gamedata, seed=seed)
+    timings["generate_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    registry = DataRegistry(gamedata, synthetic_top300(gamedata), stores={mode: store for mode in RECIPE_PATHS})
+    timings["index_s"] = time.perf_counter() - started
+    return registry, timings
+
+
+def prepare_inputs(registry: DataRegistry, calls: int, seed: int = 0) -> dict:
+    """
+    Distinct inputs for every timed and warm-up call of each operation. A run with more calls
+    gets the same first inputs, plus more.
+    """
+    rng = np.random.default_rng(seed + 2)
+    total = calls + WARMUP_CALLS
+    titles = np.asarray(registry.names.titles, dtype=object)
+    seeds = titles[rng.permutation(len(titles))[:total]]
+    searched = titles[rng.permutation(len(titles))[:total]]
+
+    # Search queries: a third typed prefixes, a third exact titles, a third misspelled titles
+    queries = []
+    for i, title in enumerate(searched):
+        if i % 3 == 0:
+            queries.append(title[:int(rng.integers(4, 9))].lower())
+        elif i % 3 == 1:
+            queries.append(title)
+        else:
+            queries.append(_misspell(title, rng))
+
+    # Untrimmed neighbour tables, as build_recommendation_table hands them to trim_franchise_clones
+    store = registry.similarity_store(BENCH_MODE)
+    untrimmed = []
+    for title in seeds:
+        similar_ids, scores = store.neighbours(registry.gamedata["id"].iat[registry.names.row_for_name(title)])
+        rows = registry.names.rows_for_ids(similar_ids)
+        table = registry.gamedata.iloc[rows].assign(similarity=scores)
+        untrimmed.append(table.sort_values("similarity", ascending=False, kind="stable"))
+
+    recs = [get_rec_by_name(title, BENCH_MODE, registry=registry) for title in seeds]
+    return {"queries": queries, "seeds": list(seeds), "untrimmed": untrimmed, "recs": recs}
+
+
+def operations(registry: DataRegistry, inputs: dict) -> dict:
+    """
+    Operation name -> (function of one input, list of inputs, reset), where reset (or None)
+    is called before each round to drop anything the previous round cached.
+    """
+    return {
+        "find_closest_name": (lambda query: find_closest_name(query, registry=registry), inputs["queries"],
+                              registry.title_search.search.cache_clear),
+        "get_rec_by_name": (lambda title: get_rec_by_name(title, BENCH_MODE, registry=registry), inputs["seeds"],
+                            None),
+        "trim_franchise_clones": (lambda table: trim_franchise_clones(table, max_per_series=4), inputs["untrimmed"],
+                                  None),
+        "filter_games": (lambda recs: filter_games(recs, SIDEBAR_DEFAULTS, registry=registry), inputs["recs"], None),
+    }
+
+
+def time_operation(func, args: list, rounds: int = DEFAULT_ROUNDS, reset=None) -> dict:
+    """
+    Call func once per argument, rounds times, and summarise the fastest round.
+
+    Each round first calls reset (if given), then uses the first WARMUP_CALLS arguments
+    untimed, to fill caches and code paths, and times the rest.
+
+    Returns:
+      - dict with calls, p50_ms, p95_ms, p99_ms, mean_ms and throughput_per_s of the round
+        with the lowest mean, plus peak_rss_mb and rss_growth_mb (peak RSS above the RSS
+        before the first round) over all rounds.
+    """
+    _reset_peak_rss()
+    rss_before = _rss_mb("VmRSS")
+
+    latencies = None
+    for _ in range(rounds):
+        if reset is not None:
+            reset()
+        for arg in args[:WARMUP_CALLS]:
+            func(arg)
+        round_latencies = np.empty(len(args) - WARMUP_CALLS)
+        for i, arg in enumerate(args[WARMUP_CALLS:]):
+            started = time.perf_counter()
+            func(arg)
+            round_latencies[i] = time.perf_counter() - started
+        if latencies is None or round_latencies.mean() < latencies.mean():
+            latencies = round_latencies
+
+    peak = _rss_mb("VmHWM")
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {"calls": len(latencies), "p50_ms": round(p50, 4), "p95_ms": round(p95, 4), "p99_ms": round(p99, 4),
+            "mean_ms": round(latencies.mean() * 1000, 4),
+            "throughput_per_s": round(len(latencies) / latencies.sum(), 1),
+            "peak_rss_mb": round(peak, 1), "rss_growth_mb": round(max(peak - rss_before, 0.0), 1)}
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, calls: int = DEFAULT_CALLS, rounds: int = DEFAULT_ROUNDS,
+                   seed: int = 0) -> dict:
+    """
+    Benchmark every operation at every catalog size.
+
+    Returns:
+      - report dict: "environment" (versions, machine) and "results" keyed by size (as a
+        string, for JSON) with a "setup" entry and one entry per operation.
+    """
+    report = {"environment": {
+        "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+        "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "calls": calls, "rounds": rounds, "seed": seed,
+    }, "results": {}}
+
+    for n_games in sizes:
+        registry, setup = build_registry(n_games, seed)
+        inputs = prepare_inputs(registry, calls, seed)
+        setup["rss_mb"] = _rss_mb("VmRSS")
+        results = {"setup": {key: round(value, 2) for key, value in setup.items()}}
+        for name, (func, args, reset) in operations(registry, inputs).items():
+            results[name] = time_operation(func, args, rounds, reset)
+            logging.info(f"{n_games} games, {name}: {results[name]}")
+        report["results"][str(n_games)] = results
+        del registry, inputs
+        gc.collect()   # so the next size's peak RSS does not include this one's
+    return report
+
+
+def compare(report: dict, baseline: dict, max_slowdown: float, max_rss_growth: float,
+            min_delta_ms: float = 0.0) -> list:
+    """
+    Operations that regressed against the baseline.
+
+    Returns:
+      - list of (size, operation, metric, baseline value, current value), for every p95
+        latency more than max_slowdown (a fraction) and min_delta_ms above the baseline, and
+        every peak RSS more than max_rss_growth (a fraction) above it.
+    """
+    regressions = []
+    for size, results in report["results"].items():
+        for name, current in results.items():
+            previous = baseline.get("results", {}).get(size, {}).get(name)
+            if name == "setup" or previous is None:
+                continue
+            slower = current["p95_ms"] - previous["p95_ms"]
+            if slower > previous["p95_ms"] * max_slowdown and slower > min_delta_ms:
+                regressions.append((size, name, "p95_ms", previous["p95_ms"], current["p95_ms"]))
+            if current["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + max_rss_growth):
+                regressions.append((size, name, "peak_rss_mb", previous["peak_rss_mb"], current["peak_rss_mb"]))
+    return regressions
+
+
+def print_report(report: dict, baseline: dict = None):
+    """One line per size and operation, with the baseline p95 alongside when there is one."""
+    print(f"{'games':>8} {'operation':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'ops/s':>9} {'peak MB':>9} {'base p95':>9}")
+    for size, results in report["results"].items():
+        for name, row in results.items():
+            if name == "setup":
+                continue
+            previous = (baseline or {}).get("results", {}).get(size, {}).get(name)
+            base = f"{previous['p95_ms']:9.3f}" if previous else f"{'-':>9}"
+            print(f"{size:>8} {name:<22} {row['p50_ms']:9.3f} {row['p95_ms']:9.3f} {row['p99_ms']:9.3f} "
+                  f"{row['throughput_per_s']:9.1f} {row['peak_rss_mb']:9.1f} {base}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation hot paths on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Catalog sizes (games)")
+    parser.add_argument("--calls", type=int, default=DEFAULT_CALLS, help="Timed calls per operation")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="Rounds per operation; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run to --baseline")
+    parser.add_argument("--output", help="Also write the full report to this JSON file")
+    parser.add_argument("--max-slowdown", type=float, default=0.25, help="Allowed p95 growth (fraction)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="p95 growth always allowed (ms)")
+    parser.add_argument("--max-rss-growth", type=float, default=0.10, help="Allowed peak RSS growth (fraction)")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.calls, args.rounds, args.seed)
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    for path in [args.output, args.baseline if args.save_baseline else None]:
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Wrote {path}")
+
+    regressions = compare(report, baseline, args.max_slowdown, args.max_rss_growth, args.min_delta_ms) if baseline else []
+    for size, name, metric, before, after in regressions:
+        print(f"REGRESSION {size} games, {name}: {metric} {before} -> {after}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,141 @@
+# synthetic.py
+# Synthetic catalogs for the benchmarks: a gamedata frame with the registry's core columns, a
+# top-300 list and a matching top-K neighbour store, at any size and without touching data/.
+#
+# The data is shaped like the real thing where it affects the hot paths:
+#   - titles are 1-3 words from a small vocabulary, so fuzzy search sees realistic collisions
+#     and shared prefixes, and a few titles repeat (reprints);
+#   - about a quarter of the games belong to a franchise ("Base Title: Subtitle"), stored in
+#     consecutive rows, and a game's best neighbours are drawn from the rows around it, so
+#     franchise clones show up near the top of its list the way expansions do in the real tables;
+#   - mechanics and categories are space-separated tokens with a skewed popularity, and the
+#     numeric columns cover the ranges the sidebar filters cut on.
+# Every table is a pure function of (n_games, seed).
+
+import numpy as np
+import pandas as pd
+from src.name_index import franchise_key
+from src.similarity_store import SimilarityStore
+
+TITLE_WORDS = [
+    "Age", "Ancient", "Arena", "Ark", "Azul", "Battle", "Blood", "Bonfire", "Brass", "Castle",
+    "Catan", "Century", "Chronicles", "City", "Clans", "Colony", "Codex", "Crown", "Dark",
+    "Deep", "Dice", "Dominion", "Dragon", "Dune", "Dungeon", "Earth", "Empire", "Everdell",
+    "Expedition", "Feast", "Forest", "Fortune", "Frontier", "Galaxy", "Gloom", "Gold", "Great",
+    "Harbor", "Heroes", "Hidden", "Island", "Jungle", "Kingdom", "Knights", "Legacy", "Legends",
+    "Lost", "Machi", "Mage", "Mansion", "Mars", "Merchants", "Mystic", "Night", "Nova", "Ocean",
+    "Odin", "Orchard", "Pandemic", "Planet", "Power", "Quest", "Railroad", "Realm", "Rising",
+    "River", "Root", "Saga", "Scythe", "Sea", "Secret", "Shadow", "Sky", "Spirit", "Star",
+    "Steam", "Stone", "Storm", "Sun", "Terra", "Throne", "Ticket", "Tides", "Tower", "Trade",
+    "Tribes", "Valley", "Viking", "Village", "War", "Wild", "Wings", "Winter", "Wizard", "World",
+]
+
+SUBTITLE_WORDS = [
+    "Expansion", "Second Edition", "Big Box", "Duel", "Legacy", "Deluxe", "Origins", "Seafarers",
+    "Cities", "Frozen North", "Dark Moon", "Promo Pack", "Anniversary Edition", "The Card Game",
+    "Dice Game", "Kids", "Travel Edition", "Season 2", "Director's Cut", "Heroes",
+]
+
+N_MECHANICS = 190
+N_CATEGORIES = 85
+
+# Neighbour ranks drawn from the rows right around a game (where its franchise lives); the
+# rest come from a wider window
+NEAR_RANKS = 10
+NEAR_WINDOW = 8
+FAR_WINDOW = 2000
+
+
+def _token_strings(rng, n_games: int, prefix: str, n_tokens: int, low: int, high: int) -> np.ndarray:
+    """Space-separated token lists, up to low..high distinct tokens per game, popular tokens more likely."""
+    counts = rng.integers(low, high + 1, n_games)
+    popularity = 1.0 / np.arange(1, n_tokens + 1)
+    tokens = rng.choice(n_tokens, size=counts.sum(), p=popularity / popularity.sum())
+    names = np.array([f"{prefix}_{i}" for i in range(n_tokens)], dtype=object)
+    chunks = np.split(names[tokens], np.cumsum(counts)[:-1])
+    return np.array([" ".join(dict.fromkeys(chunk)) for chunk in chunks], dtype=object)
+
+
+def synthetic_gamedata(n_games: int, seed: int = 0) -> pd.DataFrame:
+    """
+    A gamedata frame with the registry's core columns plus franchise_key.
+
+    Parameters:
+      - n_games (int): number of games.
+      - seed (int): random seed.
+
+    Returns:
+      - pd.DataFrame with one row per game, ids ascending with row order.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array(TITLE_WORDS, dtype=object)
+
+    # Base titles of one to three words
+    n_words = rng.choice([1, 2, 3], size=n_games, p=[0.15, 0.55, 0.3])
+    title = words[rng.integers(len(words), size=n_games)]
+    for position in (1, 2):
+        extra = words[rng.integers(len(words), size=n_games)]
+        title = np.where(n_words > position, title + " " + extra, title)
+    # Number most repeated titles ("Dragon Quest 2"), leaving a few true duplicates
+    repeat = pd.Series(title).groupby(title).cumcount().to_numpy()
+    numbered = (repeat > 0) & (rng.random(n_games) > 0.03)
+    title = np.where(numbered, title + " " + (repeat + 1).astype(str).astype(object), title)
+
+    # Franchises: runs of 2-8 consecutive rows sharing the first row's title, later entries subtitled
+    family_size = np.minimum(rng.geometric(0.35, size=n_games), 8)
+    family_size = np.where(rng.random(n_games) < 0.12, np.maximum(family_size, 2), 1)
+    starts = np.cumsum(family_size) - family_size
+    keep = starts < n_games
+    starts, family_size = starts[keep], family_size[keep]
+    family_start = np.repeat(starts, family_size)[:n_games]
+    member = np.arange(n_games) - family_start
+    subtitles = np.array(SUBTITLE_WORDS, dtype=object)[rng.integers(len(SUBTITLE_WORDS), size=n_games)]
+    name = np.where(member > 0, title[family_start] + ": " + subtitles, title)
+
+    minplayers = rng.choice([1, 2, 3, 4], size=n_games, p=[0.25, 0.6, 0.1, 0.05])
+    ranked = min(n_games, 30000)
+    rank = np.zeros(n_games, dtype=np.int64)
+    rank[rng.permutation(n_games)[:ranked]] = np.arange(1, ranked + 1)
+    average = np.clip(rng.normal(6.6, 1.0, n_games), 1, 10)
+
+    gamedata = pd.DataFrame({
+        "id": 1000 + np.sort(rng.choice(20 * n_games, size=n_games, replace=False)),
+        "name": name.astype(str),
+        "yearpublished": np.clip(2024 - rng.gamma(2.0, 8.0, n_games).astype(np.int64), 1900, 2025),
+        "BGGrank": rank,
+        "minplayers": minplayers,
+        "maxplayers": minplayers + rng.choice([0, 1, 2, 3, 4, 6, 10], size=n_games),
+        "playingtime": rng.choice([10, 20, 30, 45, 60, 90, 120, 180, 240, 360], size=n_games),
+        "average": average,
+        "bayesaverage": np.where(rank > 0, 5.5 + 0.3 * (average - 5.5), 0.0),
+        "averageweight": np.clip(rng.normal(2.3, 0.8, n_games), 1, 5),
+        "is_digital": rng.random(n_games) < 0.02,
+        "is_crowdfunded": rng.random(n_games) < 0.1,
+        "mechanics_str": _token_strings(rng, n_games, "Mech", N_MECHANICS, 1, 8),
+        "categories_str": _token_strings(rng, n_games, "Cat", N_CATEGORIES, 1, 5),
+    })
+    gamedata["franchise_key"] = franchise_key(gamedata["name"])
+    return gamedata
+
+
+def synthetic_top300(gamedata: pd.DataFrame) -> pd.DataFrame:
+    """The 300 best-ranked games, in the columns of BGGtop300.csv the app reads."""
+    ranked = gamedata[gamedata["BGGrank"] > 0].nsmallest(300, "BGGrank")
+    return ranked.drop(columns="franchise_key").reset_index(drop=True)
+
+
+def synthetic_store(gamedata: pd.DataFrame, k: int = 50, seed: int = 0) -> SimilarityStore:
+    """
+    A top-K neighbour store for every game in gamedata, best match first.
+
+    The first NEAR_RANKS neighbours come from the NEAR_WINDOW rows on either side (same
+    franchise, when the game has one), the rest from FAR_WINDOW rows on either side.
+    """
+    rng = np.random.default_rng(seed + 1)
+    n_games = len(gamedata)
+    window = np.where(np.arange(k) < NEAR_RANKS, min(NEAR_WINDOW, n_games // 2), min(FAR_WINDOW, n_games // 2))
+    offsets = rng.integers(1, window + 1, size=(n_games, k)) * rng.choice([-1, 1], size=(n_games, k))
+    neighbour_rows = ((np.arange(n_games)[:, None] + offsets) % n_games).astype(np.int32)
+    scores = -np.sort(-rng.uniform(0.2, 0.95, size=(n_games, k)), axis=1)
+    return SimilarityStore(gamedata["id"].to_numpy(), neighbour_rows, scores.astype(np.float16),
+                           np.full(n_games, k, dtype=np.int32))
@@ -0,0 +1,168 @@
+# build_topk.py
+# Pipeline stage: build top-K similarity tables from the tokenized gamedata.
+#
+# The recipe weights in data/recipes.json were not fitted to the shipped top50_*.parquet tables,
+# so a build does not reproduce them: swapping the tables in changes every recommendation. By
+# default the tables are written to data/processed/rebuilt/ and each is compared with the shipped
+# one (share of top-10 neighbours in common); --replace writes them over the shipped tables
+# (and folds away their deltas).
+#
+# Run from the project root after the tokenize step:
+#   python -m data.build_topk                        # candidate tables in data/processed/rebuilt/
+#   python -m data.build_topk --recipe mixed --k 100
+#   python -m data.build_topk --replace              # overwrite the tables the app serves
+#   python -m data.build_topk --features-only        # only features.npz and the ANN indexes
+
+import argparse
+import json
+import logging
+import os
+import pandas as pd
+from src.features import FEATURE_COLUMNS, FeatureMatrices, vectorize_games, build_topk_table
+from src.ann_index import ANNIndex
+from src.similarity_store import SimilarityStore, delta_paths, write_compact
+
+DEFAULT_CONFIG = "data/recipes.json"
+DEFAULT_GAMEDATA = "data/processed/gamedata.parquet"
+DEFAULT_OUT_DIR = "data/processed"
+
+# Subdirectory of out_dir the tables go to unless replace is set
+CANDIDATE_DIR = "rebuilt"
+
+# Neighbours per game compared between a candidate table and the shipped one
+OVERLAP_K = 10
+
+
+def load_recipes(path: str = DEFAULT_CONFIG) -> dict:
+    """Load the recipe config (K, block size and the component weights per mode)."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def _top_pairs(table: pd.DataFrame, k: int) -> pd.DataFrame:
+    """The (base_game_id, similar_game_id) pairs of each game's k best neighbours."""
+    table = table.sort_values(["base_game_id", "similarity_score"], ascending=[True, False], kind="stable")
+    top = table[table.groupby("base_game_id").cumcount() < k]
+    return top[["base_game_id", "similar_game_id"]].drop_duplicates()
+
+
+def table_overlap(table: pd.DataFrame, other_path: str, k: int = OVERLAP_K) -> float:
+    """
+    Share of table's top-k neighbour pairs that the table at other_path also lists in its
+    top k, over the games both tables cover (1.0 means the same neighbours).
+    """
+    new = _top_pairs(table, k)
+    old = _top_pairs(pd.read_parquet(other_path, columns=["base_game_id", "similar_game_id", "similarity_score"]), k)
+    new = new[new["base_game_id"].isin(old["base_game_id"])]
+    shared = new.merge(old, on=["base_game_id", "similar_game_id"])
+    return len(shared) / len(new) if len(new) else 0.0
+
+
+def build_features(gamedata_path=DEFAULT_GAMEDATA, config_path=DEFAULT_CONFIG, out_dir=DEFAULT_OUT_DIR,
+                   recipes=None) -> FeatureMatrices:
+    """
+    Vectorize the token columns and write the feature matrices (for query-time blending) and
+    one ANN index per recipe (for ad-hoc vector queries). The top-K tables are left alone.
+
+    Parameters:
+      - gamedata_path (str): tokenized gamedata parquet.
+      - config_path (str): recipe config, see data/recipes.json.
+      - out_dir (str): where features.npz and the ANN indexes are written.
+      - recipes (list or None): recipes to build ANN indexes for; all configured recipes by default.
+
+    Returns:
+      - the FeatureMatrices written.
+    """
+    config = load_recipes(config_path)
+    df = pd.read_parquet(gamedata_path, columns=["id", *FEATURE_COLUMNS.values()])
+    features = vectorize_games(df)
+
+    os.makedirs(out_dir, exist_ok=True)
+    features_path = os.path.join(out_dir, config["features_output"])
+    features.save(features_path)
+    logging.info(f"Saved feature matrices to {features_path}")
+
+    for name in recipes or list(config["recipes"]):
+        recipe = config["recipes"][name]
+        ann = ANNIndex.build(features, recipe["weights"], **config.get("ann", {}))
+        ann_path = os.path.join(out_dir, recipe["ann_output"])
+        ann.save(ann_path)
+        logging.info(f"Saved ANN index for recipe '{name}' to {ann_path}")
+    return features
+
+
+def build_tables(features: FeatureMatrices, config_path=DEFAULT_CONFIG, out_dir=DEFAULT_OUT_DIR,
+                 recipes=None, k=None, block_size=None, replace=False):
+    """
+    Write one top-K parquet (plus its compact copy) per recipe from built feature matrices.
+    Parameters as in build_topk.
+    """
+    config = load_recipes(config_path)
+    k = k or config["k"]
+    block_size = block_size or config["block_size"]
+
+    table_dir = out_dir if replace else os.path.join(out_dir, CANDIDATE_DIR)
+    os.makedirs(table_dir, exist_ok=True)
+    for name in recipes or list(config["recipes"]):
+        recipe = config["recipes"][name]
+        table = build_topk_table(features, recipe["weights"], k=k, block_size=block_size)
+        shipped_path = os.path.join(out_dir, recipe["output"])
+        if not replace and os.path.exists(shipped_path):
+            overlap = table_overlap(table, shipped_path)
+            logging.info(f"Recipe '{name}': {overlap:.0%} of the top-{OVERLAP_K} neighbours match {shipped_path}")
+        out_path = os.path.join(table_dir, recipe["output"])
+        table.to_parquet(out_path, index=False)
+        logging.info(f"Wrote {len(table)} rows for recipe '{name}' to {out_path}")
+
+        # The fresh table already covers every incremental update (see data/update_topk.py)
+        if replace:
+            for stale in delta_paths(out_path):
+                os.remove(stale)
+                logging.info(f"Removed folded-in delta {stale}")
+        # Memory-mappable copy the app opens instead of parsing the parquet
+        write_compact(out_path, SimilarityStore.from_frame(table))
+
+    if not replace:
+        logging.info(f"Candidate tables are in {table_dir}; the app still serves the ones in {out_dir} "
+                     f"(rerun with --replace to swap them in)")
+
+
+def build_topk(gamedata_path=DEFAULT_GAMEDATA, config_path=DEFAULT_CONFIG, out_dir=DEFAULT_OUT_DIR,
+               recipes=None, k=None, block_size=None, replace=False):
+    """
+    Vectorize the token columns once, then write the feature matrices, one ANN index per recipe
+    and one top-K parquet (plus its compact copy) per recipe.
+
+    Parameters:
+      - gamedata_path (str): tokenized gamedata parquet.
+      - config_path (str): recipe config, see data/recipes.json.
+      - out_dir (str): where the ANN indexes and the feature matrices are written, and the
+        top-K parquets with replace.
+      - recipes (list or None): recipe names to build; all configured recipes by default.
+      - k (int or None), block_size (int or None): override the config values.
+      - replace (bool): write the top-K parquets over the ones in out_dir (removing their deltas)
+        instead of to out_dir/rebuilt/ for comparison.
+    """
+    features = build_features(gamedata_path, config_path, out_dir, recipes)
+    build_tables(features, config_path, out_dir, recipes, k, block_size, replace)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build top-K similarity tables from gamedata.parquet")
+    parser.add_argument("--gamedata", default=DEFAULT_GAMEDATA)
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--recipe", action="append", help="Recipe to build (repeatable); default all")
+    parser.add_argument("--k", type=int, help="Override neighbours per game")
+    parser.add_argument("--block-size", type=int, help="Override rows scored per block")
+    parser.add_argument("--replace", action="store_true",
+                        help="Overwrite the top-K tables the app serves (default: write them to <out-dir>/rebuilt/)")
+    parser.add_argument("--features-only", action="store_true",
+                        help="Only write features.npz and the ANN indexes; leave the top-K tables alone")
+    args = parser.parse_args()
+
+    if args.features_only:
+        build_features(args.gamedata, args.config, args.out_dir, args.recipe)
+    else:
+        build_topk(args.gamedata, args.config, args.out_dir, args.recipe, args.k, args.block_size, args.replace)
@@ -0,0 +1,90 @@
+# compact_topk.py
+# Write (or check) the compact, memory-mappable copies of the top-K similarity tables.
+#
+# build_topk and update_topk already keep them current; run this for tables built before the compact
+# format existed, or after copying parquet files around by hand:
+#   python -m data.compact_topk             # write top50_*.compact/ next to every recipe's table
+#   python -m data.compact_topk --verify    # compare each compact copy against its parquet + deltas
+#
+# --verify reads the parquet table and its deltas directly with pandas, independently of the
+# SimilarityStore code that wrote the compact copy, and checks that every game keeps exactly the same
+# neighbours in the same order (games with equal scores may swap places), and that no score moved by
+# more than float16 rounding.
+
+import argparse
+import logging
+import os
+import sys
+import numpy as np
+import pandas as pd
+from src.similarity_store import SimilarityStore, compact_path, delta_paths, write_compact
+from data.build_topk import DEFAULT_CONFIG, DEFAULT_OUT_DIR, load_recipes
+
+# float16 keeps 11 significant bits, so rounding moves a score in [0, 1] by at most 2**-12
+SCORE_TOLERANCE = 2.0 ** -12
+
+
+def reference_lists(table_path: str) -> pd.DataFrame:
+    """
+    The neighbour lists a top-K parquet and its deltas describe, read straight from the files:
+    each game's rows from the newest file that lists it, best score first, each pair once.
+    """
+    columns = ["base_game_id", "similar_game_id", "similarity_score"]
+    table = pd.read_parquet(table_path, columns=columns)
+    for path in delta_paths(table_path):
+        delta = pd.read_parquet(path, columns=columns)
+        table = pd.concat([table[~table["base_game_id"].isin(delta["base_game_id"])], delta], ignore_index=True)
+    table = table.sort_values(["base_game_id", "similarity_score"], ascending=[True, False], kind="stable")
+    return table.drop_duplicates(["base_game_id", "similar_game_id"])
+
+
+def verify_compact(table_path: str) -> dict:
+    """
+    Compare the compact copy of a top-K table against the table and its deltas.
+
+    Returns:
+      - dict with the number of games, how many of them have a different neighbour list or
+        order, and the largest score error.
+    """
+    reference = reference_lists(table_path)
+    compact = SimilarityStore.from_compact(compact_path(table_path))
+    games = reference["base_game_id"].unique()
+    bases, ranks, similar, scores = compact.neighbours_many(games)
+    served = pd.DataFrame({"base_game_id": bases, "rank": ranks, "similar_game_id": similar, "served_score": scores})
+
+    # A list is wrong if a pair is served twice, is only on one side, or is served after a
+    # pair the reference scores lower
+    both = served.merge(reference, on=["base_game_id", "similar_game_id"], how="outer", indicator=True)
+    matched = both[both["_merge"] == "both"].sort_values(["base_game_id", "rank"], kind="stable")
+    out_of_order = (matched["similarity_score"].diff() > 0) & (matched["base_game_id"].diff() == 0)
+    wrong = np.union1d(both.loc[both["_merge"] != "both", "base_game_id"],
+                       matched.loc[out_of_order, "base_game_id"])
+    wrong = np.union1d(wrong, served.loc[served.duplicated(["base_game_id", "similar_game_id"]), "base_game_id"])
+
+    max_error = float((matched["served_score"] - matched["similarity_score"]).abs().max()) if len(matched) else 0.0
+    return {"games": len(games), "extra_games": len(np.setdiff1d(compact.base_ids, games)),
+            "mismatched_lists": len(wrong), "max_score_error": max_error}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Write or verify the compact copies of the top-K tables")
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--recipe", action="append", help="Recipe to process (repeatable); default all")
+    parser.add_argument("--verify", action="store_true", help="Check the existing copies instead of writing them")
+    args = parser.parse_args()
+
+    config = load_recipes(args.config)
+    failed = False
+    for name in args.recipe or list(config["recipes"]):
+        table_path = os.path.join(args.out_dir, config["recipes"][name]["output"])
+        if not args.verify:
+            write_compact(table_path)
+            continue
+        report = verify_compact(table_path)
+        ok = (report["mismatched_lists"] == 0 and report["extra_games"] == 0
+              and report["max_score_error"] <= SCORE_TOLERANCE)
+        failed |= not ok
+        print(f"{name}: {'OK' if ok else 'MISMATCH'} {report}")
+    sys.exit(1 if failed else 0)
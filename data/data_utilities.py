@@ -1,8 +1,60 @@
 # data_utilities.py
 # One-off ETL helpers for building and cleaning the board game dataset
 
-import pandas as pd
+import ast
+import logging
 import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+RAW_GAMEDATA = "data/raw/gamedata.csv"
+CLEAN_GAMEDATA = "data/processed/gamedata.parquet"
+
+# Bytes of CSV parsed per batch; peak memory scales with this, not with the size of the dump
+CSV_BLOCK_SIZE = 16 << 20
+
+# Explicit types for the raw columns the app relies on, so every batch gets the same schema
+# (inference only sees the first block). Columns not listed here are inferred. Whole-number
+# columns are parsed as float64, since exports often write them as "2017.0", and cast to
+# int64 afterwards (see INTEGER_COLUMNS).
+RAW_COLUMN_TYPES = {
+    "id": pa.int64(),
+    "name": pa.string(),
+    "description_clean": pa.string(),
+    "thumbnail": pa.string(),
+    "image": pa.string(),
+    "boardgamefamily": pa.string(),
+    "category_list": pa.string(),
+    "mech_list": pa.string(),
+    "tags": pa.string(),
+    "yearpublished": pa.float64(),
+    "minplayers": pa.float64(),
+    "maxplayers": pa.float64(),
+    "playingtime": pa.float64(),
+    "average": pa.float64(),
+    "bayesaverage": pa.float64(),
+    "averageweight": pa.float64(),
+    "BGGrank": pa.float64(),
+}
+
+INTEGER_COLUMNS = ["yearpublished", "minplayers", "maxplayers", "playingtime"]
+
+# Values read as missing in any column ("Not Ranked" appears in BGG rank columns)
+RAW_NULL_VALUES = ["", "NA", "N/A", "NaN", "nan", "null", "None", "Not Ranked"]
+
+# Columns added by unwrap_family_column, in output order
+FAMILY_SCHEMA = pa.schema([
+    ("series_names", pa.list_(pa.string())),
+    ("game_tags", pa.list_(pa.string())),
+    ("is_digital", pa.bool_()),
+    ("digital_platforms", pa.list_(pa.string())),
+    ("is_crowdfunded", pa.bool_()),
+    ("crowdfund_platforms", pa.list_(pa.string())),
+    ("family_meta", pa.list_(pa.string())),
+])
 
 
 def parse_family_field(raw: str) -> dict:
@@ -67,28 +119,129 @@ def parse_family_field(raw: str) -> dict:
     return out
 
 
+#HELPER FUNCTION: collect per-part values back into one list per game
+def _lists_per_row(values: pd.Series, n_rows: int, unique: bool = True) -> list:
+    """values is indexed by game row in ascending order; returns n_rows lists in first-seen order."""
+    frame = pd.DataFrame({"row": values.index.to_numpy(), "value": values.to_numpy(dtype=object)})
+    if unique:
+        frame = frame.drop_duplicates()
+    offsets = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(frame["row"].to_numpy(), minlength=n_rows), out=offsets[1:])
+    flat = frame["value"].tolist()
+    return [flat[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+def parse_family_column(raw: pd.Series) -> pd.DataFrame:
+    """
+    Vectorized parse_family_field for a whole column: the family strings are split and
+    exploded once, every part is classified with string methods, and the results are
+    grouped back per game. Output columns and values match parse_family_field.
+    """
+    n_rows = len(raw)
+    parts = raw.reset_index(drop=True).fillna("").astype(str).str.split(";").explode().str.strip()
+    parts = parts[parts != ""]
+    low = parts.str.lower()
+    tail = parts.str.split(":", n=1).str[1].fillna("").str.strip()
+
+    series = low.str.startswith("series:")
+    game = low.str.startswith("game:")
+    digital = low.str.startswith("digital implementation")
+    crowdfunded = low.str.startswith("crowdfunding:") | (low == "crowdfunding")
+    # Parts without a platform name are recorded as "Other"
+    platform = tail.where(tail != "", "Other")
+
+    def flag(mask):
+        return mask.groupby(level=0).any().reindex(range(n_rows), fill_value=False).to_numpy()
+
+    out = pd.DataFrame({
+        "series_names": _lists_per_row(tail[series & (tail != "")], n_rows),
+        "game_tags": _lists_per_row(tail[game & (tail != "")], n_rows),
+        "is_digital": flag(digital),
+        "digital_platforms": _lists_per_row(platform[digital], n_rows),
+        "is_crowdfunded": flag(crowdfunded),
+        "crowdfund_platforms": _lists_per_row(platform[crowdfunded], n_rows),
+        "family_meta": _lists_per_row(parts, n_rows, unique=False),
+    })
+    out.index = raw.index
+    return out
+
+
 def unwrap_family_column(df: pd.DataFrame, raw_col: str = "boardgamefamily") -> pd.DataFrame:
     """Add parsed family columns to the DataFrame."""
-    parsed = (
-        df[raw_col]
-        .fillna("")
-        .apply(parse_family_field)
-        .apply(pd.Series)
-    )
-    return pd.concat([df, parsed], axis=1)
+    return pd.concat([df, parse_family_column(df[raw_col])], axis=1)
+
+
+# Quoted items of a Python list literal such as "['Dice Rolling', "Players' Choice"]"
+_QUOTED_ITEM = r"'[^']*'|\"[^\"]*\""
+
+
+def tokenize_list_column(col: pd.Series) -> pd.Series:
+    """
+    Turn stringified Python lists ("['Hand Management', 'Dice Rolling']") into
+    space-separated tokens ("Hand_Management Dice_Rolling"), the format of the *_str columns.
+
+    Items are pulled out with one regex pass and cleaned with vectorized string methods;
+    only the rare values with escaped quotes go through ast.literal_eval.
+    """
+    index, col = col.index, col.reset_index(drop=True)
+    present = col.notna()
+    escaped = present & col.astype(str).str.contains("\\", regex=False)
+
+    items = col[present & ~escaped].astype(str).str.findall(_QUOTED_ITEM).explode().dropna().str[1:-1]
+    if escaped.any():
+        literal = col[escaped].apply(lambda lst: [t for t in ast.literal_eval(lst) if isinstance(t, str)])
+        items = pd.concat([items, literal.explode().dropna()]).sort_index(kind="stable")
+    tokens = items.str.strip().str.replace(" ", "_", regex=False).str.replace("__", "_", regex=False)
+
+    joined = [" ".join(row) for row in _lists_per_row(tokens, len(col), unique=False)]
+    return pd.Series(joined, index=index, dtype=object)
+
 
+def fix_year_published(years: pd.Series) -> pd.Series:
+    """Whole-number publication years; missing, invalid and pre-1900 years become 0."""
+    years = pd.to_numeric(years, errors="coerce").fillna(0).astype(int)
+    return years.where(years >= 1900, 0)
 
-def build_clean_dataset():
-    """Load raw CSV, unwrap boardgamefamily, and write cleaned Parquet."""
-    df = pd.read_csv("data/raw/gamedata.csv")
-    df = unwrap_family_column(df, raw_col="boardgamefamily")
-    df.to_parquet("data/processed/gamedata.parquet", index=False)
+
+def build_clean_dataset(raw_path: str = RAW_GAMEDATA, out_path: str = CLEAN_GAMEDATA,
+                        block_size: int = CSV_BLOCK_SIZE):
+    """
+    Stream the raw CSV in blocks, unwrap boardgamefamily per block, and append each block
+    to the cleaned Parquet as its own row group, so memory stays bounded by the block size.
+    """
+    reader = pv.open_csv(
+        raw_path,
+        read_options=pv.ReadOptions(block_size=block_size),
+        convert_options=pv.ConvertOptions(column_types=RAW_COLUMN_TYPES, null_values=RAW_NULL_VALUES,
+                                          strings_can_be_null=True),
+    )
+    writer = None
+    n_rows = 0
+    try:
+        for batch in reader:
+            parsed = parse_family_column(batch.column("boardgamefamily").to_pandas())
+            table = pa.Table.from_batches([batch])
+            for col in INTEGER_COLUMNS:
+                if col in table.column_names:
+                    index = table.column_names.index(col)
+                    table = table.set_column(index, col, table[col].cast(pa.int64()))
+            for field in FAMILY_SCHEMA:
+                table = table.append_column(field, pa.array(parsed[field.name].tolist(), type=field.type))
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table)
+            n_rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    logging.info(f"Wrote {n_rows} cleaned games to {out_path}")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     # Run the ETL and then validate a few columns
     build_clean_dataset()
-    df_clean = pd.read_parquet("data/processed/gamedata.parquet")
+    df_clean = pd.read_parquet(CLEAN_GAMEDATA)
     # Quick sanity check
     print(df_clean[[
         "series_names", "game_tags",
@@ -0,0 +1,362 @@
+# pipeline.py
+# The data pipeline, from the raw BGG exports to everything the app loads.
+#
+# Run from the project root:
+#   python -m data.pipeline                 # run every stage whose inputs or code changed
+#   python -m data.pipeline --dry-run       # only report which stages would run
+#   python -m data.pipeline --force details # rerun a stage even if it is up to date
+#   python -m data.pipeline topk            # rebuild the served top-K tables in full
+#
+# Stages, in order:
+#   clean    data/raw/gamedata.csv      -> data/processed/gamedata_clean.parquet (family field unwrapped)
+#   prepare  gamedata_clean.parquet     -> data/processed/gamedata.parquet       (tokens, publication years)
+#   details  gamedata.parquet           -> data/processed/gamedata_details.arrow (heavy columns, fetched by id)
+#   top300   data/raw/BGGtop300.csv     -> data/processed/BGGtop300.csv          (tokens)
+#   features gamedata.parquet + recipes -> features.npz, ann_*/                  (see build_topk.py)
+#   topk     features.npz + recipes     -> top50_*.parquet, top50_*.compact/       (only when named)
+#
+# The topk stage rebuilds every served table in full with the weights in recipes.json, which do
+# not reproduce the shipped tables (see build_topk.py), so it only runs when named on the command
+# line (or in --force; "all" leaves it out). Otherwise, when gamedata.parquet changes, the served
+# tables are patched incrementally instead: before the features stage replaces features.npz,
+# update_topk.py diffs the new gamedata against it and writes delta tables for the added, changed
+# and deleted games.
+#
+# A stage whose inputs are missing (e.g. data/raw/gamedata.csv, which is not in the repo) is
+# reported as blocked and skipped; the other stages still run on the artifacts already present.
+#
+# Every stage has a key: a hash of its inputs' contents, its parameters and the source of the code
+# that implements it. Each output gets a sidecar <output>.manifest.json recording that key, the
+# input hashes, the raw files it ultimately derives from and the code version. A stage whose
+# outputs all carry the current key is skipped. Outputs are written to temporary paths and moved
+# into place only when the whole stage has succeeded, so a failed run never leaves a
+# half-written artifact behind. Inputs are never modified.
+
+import argparse
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pandas as pd
+from data import build_topk, data_utilities, update_topk
+from src import ann_index, features, game_details
+from src import similarity_store
+from src.similarity_store import compact_path, delta_paths
+
+RAW_DIR = "data/raw"
+PROCESSED_DIR = "data/processed"
+
+# gamedata list column -> token column it is tokenized into
+TOKEN_COLUMNS = {
+    "tags": "tags_str",
+    "mech_list": "mechanics_str",
+    "category_list": "categories_str",
+}
+
+
+def file_hash(path: str) -> str:
+    """sha256 of a file's contents, or of every file in a directory (names included)."""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                digest.update(os.path.relpath(full, path).encode())
+                digest.update(file_hash(full).encode())
+        return digest.hexdigest()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def code_version(modules) -> dict:
+    """Short source hash of each module a stage runs, so editing the code invalidates the stage."""
+    return {os.path.basename(inspect.getsourcefile(m)): hashlib.sha256(inspect.getsource(m).encode()).hexdigest()[:12]
+            for m in modules}
+
+
+def git_commit() -> str:
+    """Current commit of the working tree, for the record only; None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def manifest_path(output: str) -> str:
+    return f"{output.rstrip(os.sep)}.manifest.json"
+
+
+def read_manifest(output: str):
+    """The manifest of an artifact, or None if it has none (e.g. it predates the pipeline)."""
+    try:
+        with open(manifest_path(output)) as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def publish(tmp_path: str, path: str):
+    """Move a finished temporary file or directory into place, replacing the old artifact."""
+    if os.path.isdir(tmp_path):
+        if os.path.exists(path):
+            old = f"{path}.old-{os.getpid()}"
+            os.replace(path, old)
+            os.replace(tmp_path, path)
+            shutil.rmtree(old)
+        else:
+            os.replace(tmp_path, path)
+    else:
+        os.replace(tmp_path, path)
+
+
+def write_json_atomic(path: str, payload: dict):
+    directory = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as f:
+        json.dump(payload, f, indent=2)
+    os.replace(f.name, path)
+
+
+class Stage:
+    """
+    One pipeline step: run(inputs, outputs, **params) reads the input paths and writes every
+    output path it is given (temporary paths chosen by the pipeline).
+    """
+
+    def __init__(self, name, run, inputs, outputs, modules, params=None, manual=False):
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.modules = modules
+        self.params = params or {}
+        self.manual = manual   # only runs when asked for by name
+
+    def key(self, input_hashes: dict) -> str:
+        payload = {"stage": self.name, "params": self.params, "inputs": input_hashes,
+                   "code": code_version(self.modules)}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def is_current(self, key: str) -> bool:
+        return all(os.path.exists(out) and (read_manifest(out) or {}).get("key") == key for out in self.outputs)
+
+    def raw_inputs(self, input_hashes: dict) -> dict:
+        """The raw files this stage's outputs ultimately derive from, with their hashes."""
+        raw = {}
+        for path, digest in input_hashes.items():
+            upstream = read_manifest(path)
+            raw.update(upstream["raw_inputs"] if upstream else {path: digest})
+        return raw
+
+    def missing_inputs(self) -> list:
+        return [path for path in self.inputs if not os.path.exists(path)]
+
+    def is_pending(self, force: bool = False) -> bool:
+        """Whether execute() would run the stage: its inputs exist and its outputs are missing or out of date."""
+        if self.missing_inputs():
+            return False
+        return force or not self.is_current(self.key({path: file_hash(path) for path in self.inputs}))
+
+    def execute(self, force: bool = False, dry_run: bool = False) -> bool:
+        """
+        Run the stage unless it is up to date or blocked on missing inputs. Returns whether it
+        ran (or would run).
+        """
+        missing = self.missing_inputs()
+        if missing:
+            logging.warning(f"Stage '{self.name}' is blocked on missing inputs: {missing}")
+            return False
+        input_hashes = {path: file_hash(path) for path in self.inputs}
+        key = self.key(input_hashes)
+        if self.is_current(key) and not force:
+            logging.info(f"Stage '{self.name}' is up to date")
+            return False
+        if dry_run:
+            logging.info(f"Stage '{self.name}' would run")
+            return True
+
+        started = time.time()
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{self.name}-", dir=PROCESSED_DIR)
+        try:
+            tmp_outputs = [os.path.join(tmp_dir, os.path.basename(out.rstrip(os.sep))) for out in self.outputs]
+            self.run(self.inputs, tmp_outputs, **self.params)
+            for tmp_path, out in zip(tmp_outputs, self.outputs):
+                publish(tmp_path, out)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        manifest = {
+            "stage": self.name,
+            "key": key,
+            "inputs": input_hashes,
+            "raw_inputs": self.raw_inputs(input_hashes),
+            "params": self.params,
+            "code_version": code_version(self.modules),
+            "git_commit": git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        for out in self.outputs:
+            write_json_atomic(manifest_path(out), {**manifest, "output_hash": file_hash(out)})
+        logging.info(f"Stage '{self.name}' finished in {time.time() - started:.1f}s")
+        return True
+
+
+def run_clean(inputs, outputs):
+    """Raw CSV -> parquet with the boardgamefamily field unwrapped (streamed in blocks)."""
+    data_utilities.build_clean_dataset(inputs[0], outputs[0])
+
+
+def run_prepare(inputs, outputs):
+    """Add the *_str token columns and normalise publication years, one row group at a time."""
+    source = pq.ParquetFile(inputs[0])
+    writer = None
+    try:
+        for batch in source.iter_batches():
+            df = batch.to_pandas()
+            for list_col, token_col in TOKEN_COLUMNS.items():
+                if list_col in df.columns:
+                    df[token_col] = data_utilities.tokenize_list_column(df[list_col])
+            if "yearpublished" in df.columns:
+                df["yearpublished"] = data_utilities.fix_year_published(df["yearpublished"])
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(outputs[0], table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def run_details(inputs, outputs):
+    """Memory-mappable copy of the columns the app only reads per displayed game (see src/game_details.py)."""
+    game_details.write_details(inputs[0], outputs[0])
+
+
+def run_top300(inputs, outputs):
+    """Tokenize the top-300 list's list columns (it is small, so it is done in one go)."""
+    df = pd.read_csv(inputs[0])
+    for list_col, token_col in TOKEN_COLUMNS.items():
+        if list_col in df.columns:
+            df[token_col] = data_utilities.tokenize_list_column(df[list_col])
+    df.to_csv(outputs[0], index=False)
+
+
+def run_features(inputs, outputs):
+    """Feature matrices and ANN indexes for every recipe, via build_topk.build_features."""
+    gamedata_path, config_path = inputs
+    build_topk.build_features(gamedata_path, config_path, out_dir=os.path.dirname(outputs[0]))
+
+
+def run_topk(inputs, outputs):
+    """Top-K tables (and compact copies) for every recipe from the feature matrices, via build_topk.build_tables."""
+    features_path, config_path = inputs
+    # outputs are temporary paths; the pipeline moves them over the served tables
+    build_topk.build_tables(features.FeatureMatrices.load(features_path), config_path,
+                            out_dir=os.path.dirname(outputs[0]), replace=True)
+
+
+def features_outputs(config_path: str) -> list:
+    """The feature matrices and every ANN index build_features writes; features first."""
+    config = build_topk.load_recipes(config_path)
+    names = [config["features_output"], *(recipe["ann_output"] for recipe in config["recipes"].values())]
+    return [os.path.join(PROCESSED_DIR, name) for name in names]
+
+
+def topk_outputs(config_path: str) -> list:
+    """Every table (and compact copy) build_tables writes for the configured recipes."""
+    config = build_topk.load_recipes(config_path)
+    names = []
+    for recipe in config["recipes"].values():
+        names += [recipe["output"], os.path.basename(compact_path(recipe["output"]))]
+    return [os.path.join(PROCESSED_DIR, name) for name in names]
+
+
+def build_stages(config_path: str = build_topk.DEFAULT_CONFIG) -> list:
+    this_module = sys.modules[__name__]   # run_prepare and run_top300 live here
+    clean_gamedata = os.path.join(PROCESSED_DIR, "gamedata_clean.parquet")
+    gamedata = os.path.join(PROCESSED_DIR, "gamedata.parquet")
+    return [
+        Stage("clean", run_clean, [os.path.join(RAW_DIR, "gamedata.csv")], [clean_gamedata],
+              modules=[data_utilities]),
+        Stage("prepare", run_prepare, [clean_gamedata], [gamedata], modules=[data_utilities, this_module]),
+        Stage("details", run_details, [gamedata], [game_details.details_path_for(gamedata)],
+              modules=[game_details]),
+        Stage("top300", run_top300, [os.path.join(RAW_DIR, "BGGtop300.csv")],
+              [os.path.join(PROCESSED_DIR, "BGGtop300.csv")], modules=[data_utilities, this_module]),
+        Stage("features", run_features, [gamedata, config_path], features_outputs(config_path),
+              modules=[build_topk, features, ann_index]),
+        Stage("topk", run_topk, [features_outputs(config_path)[0], config_path], topk_outputs(config_path),
+              modules=[build_topk, features, similarity_store], manual=True),
+    ]
+
+
+def patch_served_tables(gamedata_path: str, config_path: str, dry_run: bool = False):
+    """
+    Patch the served top-K tables for added, changed and deleted games (data/update_topk.py),
+    diffing gamedata against the feature matrices of the previous run; call it before the
+    features stage replaces them.
+    """
+    config = build_topk.load_recipes(config_path)
+    features_path = os.path.join(PROCESSED_DIR, config["features_output"])
+    tables = [os.path.join(PROCESSED_DIR, recipe["output"]) for recipe in config["recipes"].values()]
+    if not os.path.exists(features_path) or not all(os.path.exists(table) for table in tables):
+        logging.info("No earlier feature matrices to diff gamedata against; the served top-K tables are left as they are")
+        return
+    if dry_run:
+        logging.info("Would patch the served top-K tables for added, changed and deleted games (update_topk)")
+        return
+    update_topk.update_topk(gamedata_path, config_path, PROCESSED_DIR)
+
+
+def run_pipeline(stages=None, force=(), dry_run: bool = False, config_path: str = build_topk.DEFAULT_CONFIG):
+    """
+    Run the pipeline in order, skipping stages that are up to date.
+
+    Parameters:
+      - stages (list or None): stage names to consider; all by default.
+      - force (iterable): stage names to rerun even if up to date ("all" forces every stage
+        except the manual topk stage).
+      - dry_run (bool): only report which stages would run.
+    """
+    requested = set(stages or ()) | set(force)
+    for stage in build_stages(config_path):
+        if stages and stage.name not in stages:
+            continue
+        if stage.manual and stage.name not in requested:
+            logging.info(f"Stage '{stage.name}' skipped: it rebuilds the served tables in full, so it only runs "
+                         f"when named (python -m data.pipeline {stage.name})")
+            continue
+        forced = stage.name in force or ("all" in force and not stage.manual)
+        if stage.name == "features" and "topk" not in requested and stage.is_pending(forced):
+            patch_served_tables(stage.inputs[0], config_path, dry_run)
+        ran = stage.execute(force=forced, dry_run=dry_run)
+        if ran and stage.name == "topk" and not dry_run:
+            # A full build supersedes any incremental deltas (see update_topk.py)
+            for out in stage.outputs:
+                for stale in delta_paths(out):
+                    os.remove(stale)
+                    logging.info(f"Removed folded-in delta {stale}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run the data pipeline, skipping up-to-date stages")
+    parser.add_argument("stages", nargs="*", help="Stages to consider (default: all)")
+    parser.add_argument("--force", action="append", default=[], help="Rerun this stage (repeatable; 'all' for every stage)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages would run")
+    parser.add_argument("--config", default=build_topk.DEFAULT_CONFIG)
+    args = parser.parse_args()
+
+    run_pipeline(args.stages, args.force, args.dry_run, args.config)
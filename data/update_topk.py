@@ -0,0 +1,216 @@
+# update_topk.py
+# Pipeline stage: patch the top-K similarity tables for new or changed games without a full rebuild.
+#
+# Run from the project root after the weekly scrape has been cleaned and tokenized into gamedata.parquet:
+#   python -m data.update_topk                      # detect added/changed games against features.npz
+#   python -m data.update_topk --ids 174430 224517  # or name them explicitly
+#
+# Each run writes one delta parquet per recipe next to its top-K table (top50_mixed.delta-0001.parquet,
+# ...) holding the complete new neighbour lists of every game whose list changed;
+# SimilarityStore.from_parquet applies them in version order, and the compact copy of each table is
+# rewritten to include them. features.npz is updated in place so
+# the next run (and query-time blending) sees the new vectors. Games no longer in gamedata.parquet
+# get an all-zero vector, so every list that held one is recomputed without it; a deleted game's
+# own list is left in the tables, where nothing can look it up. Vocabulary and IDF weights stay fixed,
+# so brand-new tokens only count after the next `python -m data.build_topk`, which also folds the
+# deltas back into the base tables and rebuilds the ANN indexes.
+
+import argparse
+import logging
+import os
+import re
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from src.features import FEATURE_COLUMNS, FeatureMatrices, topk_blockwise
+from src.similarity_store import SimilarityStore, delta_paths, write_compact
+from data.build_topk import DEFAULT_CONFIG, DEFAULT_GAMEDATA, DEFAULT_OUT_DIR, load_recipes
+
+
+def changed_game_ids(features: FeatureMatrices, df: pd.DataFrame) -> np.ndarray:
+    """
+    Ids in df that have no stored feature vector yet, or whose tokens no longer produce
+    the stored vector.
+    """
+    positions = features.positions(df["id"])
+    known = positions >= 0
+    changed = ~known
+    for component, matrix in features.matrices.items():
+        fresh = features.transform(component, df.loc[known, FEATURE_COLUMNS[component]])
+        difference = abs(fresh - matrix[positions[known]]).sum(axis=1)
+        changed[known] |= np.asarray(difference).ravel() > 1e-5
+    return df["id"].to_numpy()[changed]
+
+
+def deleted_game_ids(features: FeatureMatrices, df: pd.DataFrame) -> np.ndarray:
+    """Ids with a (non-zero) stored feature vector that are no longer in df."""
+    gone = ~np.isin(features.ids, df["id"].to_numpy())
+    has_vector = np.zeros(len(features.ids), dtype=bool)
+    for matrix in features.matrices.values():
+        has_vector |= np.diff(matrix.indptr) > 0
+    return features.ids[gone & has_vector]
+
+
+def next_delta_path(table_path: str) -> str:
+    """Path of the next delta version for a top-K parquet."""
+    versions = [int(re.search(r"\.delta-(\d+)\.parquet$", p).group(1)) for p in delta_paths(table_path)]
+    stem, _ = os.path.splitext(table_path)
+    return f"{stem}.delta-{max(versions, default=0) + 1:04d}.parquet"
+
+
+def update_recipe_table(store: SimilarityStore, features: FeatureMatrices, weights: dict, delta_ids,
+                        k: int = 50, block_size: int = 512) -> pd.DataFrame:
+    """
+    New neighbour lists for every game affected by a delta, for one recipe.
+
+    Parameters:
+      - store (SimilarityStore): the current lists (base table plus earlier deltas).
+      - features (FeatureMatrices): vectors that already include the delta games.
+      - weights (dict): the recipe's component weights.
+      - delta_ids (array-like): added, changed or deleted (zero-vector) game ids; ids without
+        a feature vector are skipped with a warning.
+      - k (int), block_size (int): as in data/build_topk.py.
+
+    Returns:
+      - pd.DataFrame with base_game_id, similar_game_id, similarity_score holding the complete
+        lists of the affected games only.
+
+    Lists are recomputed in full for the delta games and for every game whose list held a
+    changed game (its old score may have dropped, letting an unlisted game in) or a game with
+    no feature vector at all (deleted before these features were built). Every other
+    game's list was an exact top-K over an unchanged set apart from the delta games, so
+    merging in the delta games that beat its current K-th score keeps it exact.
+    """
+    ids = features.ids
+    id_position = pd.Index(ids)
+    blended = features.blend(weights)
+    delta_ids = np.asarray(delta_ids)
+    delta_pos = id_position.get_indexer(delta_ids)
+    if (delta_pos < 0).any():
+        unknown = delta_ids[delta_pos < 0]
+        logging.warning(f"Skipping {len(unknown)} delta ids with no feature vector: {unknown[:10].tolist()}")
+        delta_pos = delta_pos[delta_pos >= 0]
+    is_delta = np.zeros(len(ids), dtype=bool)
+    is_delta[delta_pos] = True
+
+    # get_indexer gives -1 for ids the features don't know; never use those as positions
+    bases, ranks, similar, scores = store.neighbours_many(store.base_ids)
+    base_pos = id_position.get_indexer(bases)
+    similar_pos = id_position.get_indexer(similar)
+    stale = similar_pos < 0
+    stale[~stale] = is_delta[similar_pos[~stale]]
+    stale &= base_pos >= 0
+    if (base_pos < 0).any():
+        logging.warning(f"{len(np.unique(bases[base_pos < 0]))} stored lists belong to games with no "
+                        f"feature vector; they are left as they are")
+    recompute = is_delta.copy()
+    recompute[base_pos[stale]] = True
+
+    # Complete lists for the delta games and for the lists that held a changed game
+    rows = np.flatnonzero(recompute)
+    frames = []
+    for start, neighbours, top_scores in topk_blockwise(blended[rows], blended, k, block_size, self_positions=rows):
+        frames.append(pd.DataFrame({
+            "base_game_id": np.repeat(ids[rows[start:start + len(neighbours)]], neighbours.shape[1]),
+            "similar_game_id": ids[neighbours.ravel()],
+            "similarity_score": top_scores.ravel(),
+        }))
+
+    # Every other list only changes if a delta game beats its current K-th score
+    kth = np.zeros(len(ids), dtype=np.float32)
+    last = (ranks == k - 1) & (base_pos >= 0)
+    kth[base_pos[last]] = scores[last]
+    kth[recompute] = np.inf
+    corpus_t = blended.T.tocsc()
+    patches = []
+    for start in range(0, len(delta_pos), block_size):
+        block = delta_pos[start:start + block_size]
+        products = sparse.coo_matrix(blended[block] @ corpus_t)
+        enters = (products.data > 0) & (products.data > kth[products.col])
+        patches.append(pd.DataFrame({
+            "base_game_id": ids[products.col[enters]],
+            "similar_game_id": ids[block[products.row[enters]]],
+            "similarity_score": products.data[enters],
+        }))
+    patches = pd.concat(patches, ignore_index=True) if patches else pd.DataFrame(
+        {"base_game_id": ids[:0], "similar_game_id": ids[:0], "similarity_score": np.zeros(0, np.float32)})
+    patched = np.isin(bases, patches["base_game_id"].unique())
+    kept = pd.DataFrame({"base_game_id": bases[patched], "similar_game_id": similar[patched],
+                         "similarity_score": scores[patched]})
+    merged = pd.concat([kept, patches], ignore_index=True).sort_values(
+        ["base_game_id", "similarity_score"], ascending=[True, False], kind="stable")
+    frames.append(merged[merged.groupby("base_game_id").cumcount() < k])
+
+    table = pd.concat(frames, ignore_index=True)
+    table = table[table["similarity_score"] > 0].reset_index(drop=True)
+    logging.info(f"Recomputed {len(rows)} lists and patched {patches['base_game_id'].nunique()} "
+                 f"for {len(delta_pos)} delta games")
+    return table
+
+
+def update_topk(gamedata_path=DEFAULT_GAMEDATA, config_path=DEFAULT_CONFIG, out_dir=DEFAULT_OUT_DIR,
+                ids=None, recipes=None):
+    """
+    Vectorize added/changed games with the stored vocabularies, then write one delta table per
+    recipe and the updated feature matrices.
+
+    Parameters:
+      - gamedata_path (str): tokenized gamedata parquet including the new games.
+      - config_path (str): recipe config, see data/recipes.json.
+      - out_dir (str): where the top-K parquets and the feature matrices live.
+      - ids (list or None): game ids to update; detected from the data when None.
+      - recipes (list or None): recipe names to update; all configured recipes by default.
+    """
+    config = load_recipes(config_path)
+    features_path = os.path.join(out_dir, config["features_output"])
+    features = FeatureMatrices.load(features_path)
+
+    df = pd.read_parquet(gamedata_path, columns=["id", *FEATURE_COLUMNS.values()])
+    if ids is not None:
+        unknown = np.setdiff1d(ids, df["id"].to_numpy())
+        if len(unknown):
+            raise ValueError(f"Ids not in {gamedata_path}: {unknown[:10].tolist()}")
+        delta_ids = np.asarray(ids)
+    else:
+        delta_ids = changed_game_ids(features, df)
+
+    # Deleted games become all-zero vectors, so the lists that held them are recomputed without them
+    deleted = deleted_game_ids(features, df)
+    if len(deleted):
+        logging.info(f"{len(deleted)} games are no longer in {gamedata_path}; removing them from every list")
+    if not len(delta_ids) and not len(deleted):
+        logging.info("No added, changed or deleted games; nothing to update")
+        return
+    removed = pd.DataFrame({"id": deleted, **{col: "" for col in FEATURE_COLUMNS.values()}})
+    features = features.with_games(pd.concat([df[df["id"].isin(delta_ids)], removed], ignore_index=True))
+    delta_ids = np.concatenate([delta_ids, deleted])
+
+    for name in recipes or list(config["recipes"]):
+        recipe = config["recipes"][name]
+        table_path = os.path.join(out_dir, recipe["output"])
+        # Full-precision scores, since they are compared against freshly computed ones
+        store = SimilarityStore.from_parquet(table_path, score_dtype=np.float32)
+        table = update_recipe_table(store, features, recipe["weights"], delta_ids,
+                                    k=config["k"], block_size=config["block_size"])
+        out_path = next_delta_path(table_path)
+        table.to_parquet(out_path, index=False)
+        logging.info(f"Wrote {len(table)} rows for {table['base_game_id'].nunique()} games "
+                     f"of recipe '{name}' to {out_path}")
+        # The compact copy is stale as soon as a delta lands
+        write_compact(table_path)
+
+    features.save(features_path)
+    logging.info(f"Updated feature matrices for {len(delta_ids)} games in {features_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Patch the top-K tables for added or changed games")
+    parser.add_argument("--gamedata", default=DEFAULT_GAMEDATA)
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument("--out-dir", default=DEFAULT_OUT_DIR)
+    parser.add_argument("--ids", type=int, nargs="+", help="Game ids to update (default: detect)")
+    parser.add_argument("--recipe", action="append", help="Recipe to update (repeatable); default all")
+    args = parser.parse_args()
+
+    update_topk(args.gamedata, args.config, args.out_dir, args.ids, args.recipe)
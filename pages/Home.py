@@ -3,32 +3,27 @@ page_title: Game Recommendations
 """
 
 #This is the home page and also the main recommendation engine page
+import inspect
 import streamlit as st
 import logging
-import os
-import pandas as pd
-from src.helper_funct import sanitize_input, find_closest_name, filter_games, load_parquet_file
-from src.recommendation import get_rec_by_name
-
-# Determine the base directory (project root)
-current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.dirname(current_dir)
-
-#data file paths / load key files
-gamedata_path = os.path.join(project_root, "data", "processed", "gamedata.parquet")
-parquet_dir = os.path.join(project_root, "data", "processed")
-top300_path = os.path.join(project_root, "data", "raw", "BGGtop300.csv")
-
-if "gamedata" not in st.session_state:
-    st.session_state["gamedata"] = load_parquet_file(gamedata_path)
-if "top300" not in st.session_state:
-    st.session_state["top300"] = pd.read_csv(top300_path)
-if "rec_mech" not in st.session_state:
-    st.session_state["rec_mech"] = load_parquet_file(os.path.join(parquet_dir, "top50_mech_heavy.parquet"))
-if "rec_cat" not in st.session_state:
-    st.session_state["rec_cat"] = load_parquet_file(os.path.join(parquet_dir, "top50_cat_heavy.parquet"))
-if "rec_mixed" not in st.session_state:
-    st.session_state["rec_mixed"] = load_parquet_file(os.path.join(parquet_dir, "top50_mixed.parquet"))
+from src.helper_funct import sanitize_input
+from src.data_registry import RECIPE_PATHS
+from src.filters import SIDEBAR_DEFAULTS
+from src.image_cache import THUMBNAIL_WIDTH
+from src.result_cards import RESULTS_PAGE_SIZE
+from src.telemetry import request, span
+from src.streamlit_adapters import get_registry, find_closest_name, rank_filtered, result_cards, thumbnail
+
+# Game data and similarity stores are loaded once per process and shared across sessions
+registry = get_registry()
+for mode in RECIPE_PATHS:
+    registry.similarity_store(mode)
+
+# Recommendations asked for per search; fewer come back only when the filters leave fewer games
+N_RECOMMENDATIONS = 25
+
+# Expanders that report whether they are open (newer Streamlit) let closed results skip their details
+LAZY_EXPANDERS = "on_change" in inspect.signature(st.expander).parameters
 
 def display_welcome():
     """Display the title and welcome message."""
@@ -79,12 +74,14 @@ def show_filter_sidebar():
               min_players, max_players, max_playtime, min_avg, min_weight, and min_year.
     """
     st.sidebar.header("Filter your Results:")
-    min_players = st.sidebar.number_input("Min Players", min_value=1, max_value=2,value=1)
-    max_players = st.sidebar.number_input("Max Players", min_value=1, value=12)
-    max_playtime = st.sidebar.number_input("Max Playtime (minutes)", min_value=5, value=220)
-    min_avg = st.sidebar.slider("Minimum User Rating", min_value=1.0, max_value=10.0, value=5.0, step=0.1)
-    min_weight = st.sidebar.slider("Average Weight (complexity)", min_value=1.0, max_value=5.0, value=1.0, step=0.1)
-    min_year = st.sidebar.number_input("Minimum Publication Year", min_value=1900, value=1970)
+    # Defaults live in src/filters.py so the startup warm-up primes exactly these searches
+    defaults = SIDEBAR_DEFAULTS
+    min_players = st.sidebar.number_input("Min Players", min_value=1, max_value=2,value=defaults["min_players"])
+    max_players = st.sidebar.number_input("Max Players", min_value=1, value=defaults["max_players"])
+    max_playtime = st.sidebar.number_input("Max Playtime (minutes)", min_value=5, value=defaults["max_playtime"])
+    min_avg = st.sidebar.slider("Minimum User Rating", min_value=1.0, max_value=10.0, value=defaults["min_avg"], step=0.1)
+    min_weight = st.sidebar.slider("Average Weight (complexity)", min_value=1.0, max_value=5.0, value=defaults["min_weight"], step=0.1)
+    min_year = st.sidebar.number_input("Minimum Publication Year", min_value=1900, value=defaults["min_year"])
     return {
         "min_players": min_players,
         "max_players": max_players,
@@ -98,68 +95,77 @@ def show_searched_game(selected_game_name: str):
     """
     Display info about the game selected by the user before showing recommendations.
     """
-    original_game_data = st.session_state.get("gamedata")
-    if original_game_data is None or selected_game_name is None:
+    if selected_game_name is None:
         return
 
-    selected_row = original_game_data[original_game_data['name'] == selected_game_name]
-    if not selected_row.empty:
-        row = selected_row.iloc[0]
-        with st.expander(f"🔍 Game Info: {row['name']}"):
-            if pd.notna(row["thumbnail"]):
-                st.image(row["thumbnail"], width=100)
+    registry = get_registry()
+    selected_row = registry.names.row_for_name(selected_game_name)
+    if selected_row is not None:
+        # Description and thumbnail come from this game's cached card
+        card = result_cards([registry.gamedata["id"].iat[selected_row]])[0]
+        with st.expander(f"🔍 Game Info: {registry.gamedata['name'].iat[selected_row]}"):
+            show_card(card)
+
 
-            year = int(row['yearpublished']) if pd.notna(row['yearpublished']) else "N/A"
-            min_players = row['minplayers'] if pd.notna(row['minplayers']) else "N/A"
-            max_players = row['maxplayers'] if pd.notna(row['maxplayers']) else "N/A"
-            playtime = row['playingtime'] if pd.notna(row['playingtime']) else "N/A"
-            rating = f"{row['average']:.2f}" if pd.notna(row['average']) else "N/A"
-            weight = f"{row['averageweight']:.2f}" if pd.notna(row['averageweight']) else "N/A"
-            description = row['description_clean'] if pd.notna(row['description_clean']) else "N/A"
+def show_card(card: dict, similarity=None):
+    """Render a result card (see src/result_cards.py), with the similarity score of a recommendation."""
+    # Served from the local image cache; a thumbnail that can't be fetched is left out
+    image = thumbnail(card["thumbnail"])
+    if image is not None:
+        st.image(image, width=THUMBNAIL_WIDTH)
+    parts = [card["stats"], f"**Similarity Score:** {similarity:.2f}" if similarity is not None else None,
+             card["description"]]
+    st.markdown("  \n".join(part for part in parts if part))
 
-            st.write(f"**Year Published:** {year}")
-            st.write(f"**Min / Max Players:** {min_players} - {max_players}")
-            st.write(f"**Expected Playtime:** {playtime} minutes")
-            st.write(f"**Average User Rating (out of 10):** {rating}")
-            st.write(f"**Complexity Weight (out of 5):** {weight}")
-            st.write(f"**Description:** {description}")
 
+def _turn_page(step: int):
+    st.session_state["results_page"] = st.session_state.get("results_page", 0) + step
 
 
-def display_results(recommended_games):
+@st.fragment
+def display_results(game_ids, scores):
     """
-    Render the top recommended games in expandable UI sections with game details and images.
+    Render one page of the recommendations as expandable UI sections with game details and images.
+
+    Runs as a fragment, so paging and opening a result rerun only this part of the page. A
+    game's details and thumbnail are only fetched when its expander is opened (for the whole
+    visible page on Streamlit versions whose expanders don't report that), and are cached
+    per game, so later reruns reuse them.
 
     Args:
-        recommended_games (pd.DataFrame): DataFrame containing filtered and ranked board game recommendations.
+        game_ids (np.ndarray): recommended game ids, most similar first.
+        scores (np.ndarray): their similarity scores.
     """
-    
-    logging.info(f"After filtering: {len(recommended_games)} games remaining")  #FOR DEBUG
-    for i, row in recommended_games.head(25).iterrows():
-        with st.expander(f"{row['name']}"):
-            # Show a thumbnail if available
-            if pd.notna(row["thumbnail"]):
-                st.image(row["thumbnail"], width=100)
-
-            #catch any NaN data before printing to view
-            # Use inline conditionals to replace NaN values with "N/A"
-            year = int(row['yearpublished']) if pd.notna(row['yearpublished']) else "N/A"
-            min_players = row['minplayers'] if pd.notna(row['minplayers']) else "N/A"
-            max_players = row['maxplayers'] if pd.notna(row['maxplayers']) else "N/A"
-            playtime = row['playingtime'] if pd.notna(row['playingtime']) else "N/A"
-            rating = round(row['average'], 2) if pd.notna(row['average']) else "N/A"
-            weight = round(row['averageweight'], 2) if pd.notna(row['averageweight']) else "N/A"
-            similarity = f"{row['similarity']:.2f}" if pd.notna(row['similarity']) else "N/A"
-            description = row['description_clean'] if pd.notna(row['description_clean']) else "N/A"
-
-            #write results to screen
-            st.write(f"**Year Published:** {year}")
-            st.write(f"**Min / Max Players:** {min_players} - {max_players}")
-            st.write(f"**Expected Playtime:** {playtime} minutes")
-            st.write(f"**Average User Rating (out of 10):** {rating}")
-            st.write(f"**Complexity Weight (out of 5):** {weight}")
-            st.write(f"**Similarity Score:** {similarity}")
-            st.write(f"**Description:** {description}")
+    logging.info(f"After filtering: {len(game_ids)} games remaining")  #FOR DEBUG
+    with span("render"):
+        # Start from the first page whenever the list itself changes
+        if st.session_state.get("results_for") != tuple(game_ids):
+            st.session_state["results_for"] = tuple(game_ids)
+            st.session_state["results_page"] = 0
+        n_pages = max(1, -(-len(game_ids) // RESULTS_PAGE_SIZE))
+        page = min(st.session_state.get("results_page", 0), n_pages - 1)
+        shown = slice(page * RESULTS_PAGE_SIZE, (page + 1) * RESULTS_PAGE_SIZE)
+        page_ids, page_scores = game_ids[shown], scores[shown]
+
+        registry = get_registry()
+        names = registry.gamedata["name"].to_numpy()[registry.names.rows_for_ids(page_ids)]
+        keys = [f"result_{game_id}" for game_id in page_ids]
+        opened = [game_id for game_id, key in zip(page_ids, keys) if not LAZY_EXPANDERS or st.session_state.get(key)]
+        cards = dict(zip(opened, result_cards(opened)))
+
+        for game_id, name, score, key in zip(page_ids, names, page_scores, keys):
+            expander = st.expander(name, key=key, on_change="rerun") if LAZY_EXPANDERS else st.expander(name)
+            with expander:
+                if game_id in cards:
+                    show_card(cards[game_id], score)
+
+        if n_pages > 1:
+            previous_col, label_col, next_col = st.columns([1, 2, 1])
+            previous_col.button("← Previous", key="results_previous", on_click=_turn_page, args=(-1,),
+                                disabled=page == 0)
+            label_col.write(f"Page {page + 1} of {n_pages}")
+            next_col.button("Next →", key="results_next", on_click=_turn_page, args=(1,),
+                            disabled=page == n_pages - 1)
 
 
 def home_page():
@@ -167,40 +173,54 @@ def home_page():
     Main controller for the Home page. Manages game title input, game selection,
     recommendation generation, filtering, and display of results.
     """
+    # Each rerun is one traced request: slow ones are logged with a per-step breakdown
+    with request("home_rerun"):
+        _home_page()
+
+
+def _home_page():
     display_welcome()
     user_input, match_mode = get_user_input()   #this incorporates sanitization function
 
     if user_input:
         # fuzzy search & offer 8 options based on title
         candidates = find_closest_name(user_input, auto_select=False)
+        if not candidates:
+            st.warning("No games matched that title. Please try a different spelling.")
+            return
         options = [f"{c['name']} ({round(c['score'], 1)}%)" for c in candidates]
         selected_option = st.selectbox("Select the game you meant:", options)   #have user confirm game to look up
         selected_game = selected_option.split(" (")[0]           #Extract game name from this format
         st.write("You selected", selected_game)
 
-        if st.button("Get Recommendations") or "recommendations" not in st.session_state:
+        if st.button("Get Recommendations") or "selected_game" not in st.session_state:
+            st.session_state["selected_game"] = selected_game
+            st.session_state["match_mode"] = match_mode
+
+            # 👇 Show selected game info as soon as recommendations are requested
+            show_searched_game(selected_game)
+
+        #Always show the filter sidebar to allow dynamic adjustments.
+        filters = show_filter_sidebar()
+
+        if "selected_game" in st.session_state:
+            # Filters are pushed into the similarity search so strict filters still fill the list
             try:
-                recs = get_rec_by_name(selected_game, match_mode=match_mode, auto_select=False)
-                st.session_state["recommendations"] = recs
-                st.session_state["selected_game"] = selected_game
-                logging.info(f"Recommendations computed for {selected_game}")
-                
-                # 👇 Show selected game info immediately after recommendations are computed
-                show_searched_game(selected_game)
-        
+                # Only the ranked ids and scores; names and details are looked up per page
+                game_ids, scores = rank_filtered(st.session_state["selected_game"],
+                                                 st.session_state["match_mode"], filters, n=N_RECOMMENDATIONS)
+                logging.info(f"Recommendations computed for {st.session_state['selected_game']}")
             except Exception as e:
                 logging.error(f"Error computing recommendations: {e}")
                 st.error("There was an error computing recommendations. Please try again.")
+                return
 
-        #Always show the filter sidebar to allow dynamic adjustments.
-        filters = show_filter_sidebar()
-
-        if "recommendations" in st.session_state:
-            # Apply filtering to the recommendations
-            filtered_recs = filter_games(st.session_state["recommendations"], filters)
             st.subheader(f"Recommendations for {st.session_state['selected_game']}")
+            if len(game_ids) < N_RECOMMENDATIONS:
+                st.info(f"Only {len(game_ids)} of {N_RECOMMENDATIONS} recommendations match your filters. "
+                        "Loosen them to see more games.")
             st.write("Please click on a title to expand it and see more information.")
-            display_results(filtered_recs)
+            display_results(game_ids, scores)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,306 @@
+"""
+Approximate nearest-neighbour index over blended game feature vectors.
+
+The top-50 tables only answer "games like this stored game". To score an arbitrary vector
+(a user-composed profile of mechanics and categories, or a game that is not in the tables
+yet) without scanning the whole catalog, the blended feature rows of one recipe are
+grouped into inverted lists by spherical k-means. A query is compared with the list
+centroids, and only the rows of the n_probe closest lists are re-ranked by exact cosine.
+
+How many lists a query needs depends on the data: on the shipped 3000-game catalog (219
+lists) recall@10 at n_probe=8 is 0.77 for mech, 0.94 for cat and 0.73 for mixed. So each
+index is calibrated when it is built: n_probe is raised until recall@10 on a sample of the
+stored games reaches RECALL_TARGET, and saved with the index as its default. On the shipped
+catalog that is 8 lists for cat, 40 for mech and 60 for mixed (about a quarter of the games),
+for recall@10 of 0.93-0.94 on held-out queries at under 0.6 ms; an index that cannot reach
+the target short of scanning every list gets n_probe = n_lists, i.e. exact search.
+
+Rows are stored grouped by list, so every probed list is one contiguous slice of the CSR
+arrays. The index is a directory of .npy files that is memory-mapped on load, so opening
+it costs a few file opens rather than a rebuild.
+
+    python -m src.ann_index --mode mixed --sample 500 --k 10    # recall and latency report
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+import numpy as np
+from scipy import sparse
+from src.features import normalize_rows, top_k_positions
+
+# Array files making up a saved index, besides meta.json
+_ARRAYS = ["ids", "centroids", "list_offsets", "data", "indices", "indptr"]
+
+# Calibration: recall@CALIBRATION_K wanted, stored games sampled as queries, and the n_probe tried first
+RECALL_TARGET = 0.9
+CALIBRATION_K = 10
+CALIBRATION_SAMPLE = 300
+DEFAULT_N_PROBE = 8
+
+
+def _ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, start + count) for every (start, count) pair."""
+    return np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+def _as_row(vector) -> sparse.csr_matrix:
+    """Accept a sparse row or a dense array as a query without copying CSR input."""
+    if sparse.issparse(vector) and vector.format == "csr":
+        return vector
+    return sparse.csr_matrix(vector)
+
+
+def spherical_kmeans(rows, n_lists: int, iterations: int = 8, seed: int = 0,
+                     block_size: int = 16384) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cluster L2-normalised sparse rows by cosine.
+
+    Returns:
+      - (centroids, assignment): unit-length (n_lists x dim) float32 centroids and the
+        list of every row.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = rows.shape[0]
+    centroids = rows[rng.choice(n_rows, size=n_lists, replace=False)].toarray()
+
+    for _ in range(iterations):
+        assignment = np.concatenate([
+            np.asarray(rows[start:start + block_size] @ centroids.T).argmax(axis=1)
+            for start in range(0, n_rows, block_size)
+        ])
+        members = sparse.csr_matrix((np.ones(n_rows, dtype=np.float32), (assignment, np.arange(n_rows))),
+                                    shape=(n_lists, n_rows))
+        sums = (members @ rows).toarray()
+        norms = np.linalg.norm(sums, axis=1)
+        # A list that lost all its rows is re-seeded from a random row
+        empty = norms == 0
+        sums[empty] = rows[rng.choice(n_rows, size=int(empty.sum()), replace=False)].toarray()
+        norms[empty] = 1
+        centroids = sums / norms[:, None]
+    return centroids.astype(np.float32), assignment
+
+
+class ANNIndex:
+    """
+    Inverted-file index over the blended rows of one recipe.
+
+    Rows of list j are list_offsets[j]:list_offsets[j + 1] in ids and in the CSR arrays
+    (data, indices, indptr), which hold the blended, row-normalised corpus in list order.
+    """
+
+    def __init__(self, ids, weights, centroids, list_offsets, data, indices, indptr,
+                 n_probe: int = DEFAULT_N_PROBE, recall: float = None):
+        self.ids = ids
+        self.weights = weights
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.n_probe = n_probe   # lists a query scans unless told otherwise (see calibrate)
+        self.recall = recall     # recall@CALIBRATION_K measured at that n_probe, if calibrated
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, features, weights: dict, n_lists: int = None, iterations: int = 8, seed: int = 0) -> "ANNIndex":
+        """
+        Cluster every game's blended feature row into inverted lists.
+
+        Parameters:
+          - features (FeatureMatrices): per-component matrices from data/build_topk.py.
+          - weights (dict): recipe weights; queries must be blended with the same weights.
+          - n_lists (int or None): number of lists; 4 * sqrt(n) by default.
+          - iterations (int): k-means rounds.
+          - seed (int): so rebuilds are reproducible.
+        """
+        corpus = features.blend(weights).astype(np.float32)
+        # Games without any tokens can never score above 0, so they are left out
+        keep = np.flatnonzero(np.diff(corpus.indptr) > 0)
+        corpus = corpus[keep]
+        n_lists = min(n_lists or int(4 * np.sqrt(len(keep))), len(keep))
+
+        # Cluster on unit-length rows so every component mix clusters by direction
+        centroids, assignment = spherical_kmeans(normalize_rows(corpus).tocsr(), n_lists, iterations, seed)
+        order = np.argsort(assignment, kind="stable")
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_offsets[1:])
+
+        corpus = corpus[order]
+        logging.info(f"Clustered {len(keep)} games into {n_lists} lists")
+        index = cls(features.ids[keep][order], dict(weights), centroids, list_offsets,
+                    corpus.data, corpus.indices, corpus.indptr.astype(np.int64))
+        index.calibrate(seed=seed)
+        return index
+
+    def calibrate(self, target: float = RECALL_TARGET, sample: int = CALIBRATION_SAMPLE, seed: int = 0) -> int:
+        """
+        Set n_probe to the fewest lists (trying 8, 12, 16, 24, ...) whose recall@CALIBRATION_K
+        reaches target on a sample of stored games, or to n_lists (exact search) if none does.
+
+        Returns:
+          - the chosen n_probe.
+        """
+        rows = np.random.default_rng(seed).choice(len(self), size=min(sample, len(self)), replace=False)
+        queries = [(self._row_vector(row), [self.ids[row]]) for row in rows]
+        # Exact results of every query, computed once for all the n_probe tried
+        exact = [self.exact(vector, CALIBRATION_K, exclude_ids=own)[1] for vector, own in queries]
+        wanted = sum(len(scores) for scores in exact)
+
+        n_probe = DEFAULT_N_PROBE
+        while True:
+            n_probe = min(n_probe, self.n_lists)
+            found = sum(int((self.query(vector, CALIBRATION_K, n_probe, exclude_ids=own)[1] >= scores[-1] - 1e-6).sum())
+                        for (vector, own), scores in zip(queries, exact) if len(scores))
+            recall = found / wanted if wanted else 1.0
+            if recall >= target or n_probe == self.n_lists:
+                break
+            n_probe = max(n_probe + 1, int(n_probe * 1.5))
+        self.n_probe, self.recall = n_probe, recall
+        logging.info(f"Calibrated ANN index: n_probe={n_probe} of {self.n_lists} lists, recall@{CALIBRATION_K} {recall:.3f}")
+        return n_probe
+
+    def _row_vector(self, row: int) -> sparse.csr_matrix:
+        """The stored (blended) vector of corpus row row, as a 1 x dim query."""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        return sparse.csr_matrix((self.data[start:end], self.indices[start:end], [0, end - start]),
+                                 shape=(1, self.dim))
+
+    def save(self, directory: str):
+        """Write the index as one .npy per array plus meta.json."""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"weights": self.weights, "n_probe": self.n_probe, "recall": self.recall}, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ANNIndex":
+        """Open an index written by save(); arrays are memory-mapped read-only unless mmap=False."""
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        # asarray drops the np.memmap subclass (same buffer), whose per-slice overhead dominates small queries
+        arrays = {name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None))
+                  for name in _ARRAYS}
+        logging.info(f"Opened ANN index for {len(arrays['ids'])} games from {directory}")
+        # Indexes saved before calibration existed fall back to DEFAULT_N_PROBE
+        return cls(weights=meta["weights"], n_probe=meta.get("n_probe", DEFAULT_N_PROBE),
+                   recall=meta.get("recall"), **arrays)
+
+    def candidates(self, vector, n_probe: int = None) -> np.ndarray:
+        """Corpus rows of the n_probe lists (the calibrated number by default) whose centroids are closest to the query."""
+        vector = _as_row(vector)
+        n_probe = n_probe or self.n_probe
+        if vector.nnz == 0:
+            return np.empty(0, dtype=np.int64)
+        # Only the query's non-zero dimensions contribute, so read just those centroid columns
+        closeness = self.centroids[:, vector.indices] @ vector.data
+        n_probe = min(n_probe, self.n_lists)
+        lists = np.argpartition(-closeness, n_probe - 1)[:n_probe]
+        starts = self.list_offsets[lists]
+        return _ranges(starts, self.list_offsets[lists + 1] - starts)
+
+    def scores(self, vector, rows: np.ndarray) -> np.ndarray:
+        """Exact blended cosine of the query against the given corpus rows."""
+        vector = _as_row(vector)
+        dense = np.zeros(self.dim, dtype=np.float32)
+        dense[vector.indices] = vector.data
+        starts = self.indptr[rows]
+        counts = self.indptr[rows + 1] - starts
+        flat = _ranges(starts, counts)
+        products = self.data[flat] * dense[self.indices[flat]]
+        # Every indexed row has at least one token, so each row's run of products is non-empty
+        return np.add.reduceat(products, np.cumsum(counts) - counts) if len(rows) else products
+
+    def query(self, vector, k: int = 10, n_probe: int = None, exclude_ids=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k for one blended query vector.
+
+        Parameters:
+          - vector (1 x dim sparse row or array): e.g. FeatureMatrices.blend_tokens(profile, index.weights).
+          - k (int): results wanted.
+          - n_probe (int or None): lists scanned; more lists trade speed for recall. The
+            index's calibrated n_probe by default.
+          - exclude_ids (iterable or None): game ids never returned (e.g. the query game).
+
+        Returns:
+          - (game_ids, scores), best first; only games with a positive score.
+        """
+        vector = _as_row(vector)
+        rows = self.candidates(vector, n_probe)
+        if exclude_ids is not None:
+            rows = rows[~np.isin(self.ids[rows], list(exclude_ids))]
+        if not len(rows):
+            return self.ids[:0], np.empty(0)
+        top, top_scores = top_k_positions(self.scores(vector, rows), k)
+        return self.ids[rows[top]], top_scores
+
+    def exact(self, vector, k: int = 10, exclude_ids=None) -> tuple[np.ndarray, np.ndarray]:
+        """Brute-force top-k over every row; the reference the approximate search is measured against."""
+        vector = _as_row(vector)
+        rows = np.arange(len(self))
+        if exclude_ids is not None:
+            rows = rows[~np.isin(self.ids, list(exclude_ids))]
+        top, top_scores = top_k_positions(self.scores(vector, rows), k)
+        return self.ids[rows[top]], top_scores
+
+
+def measure_recall(index: ANNIndex, sample_rows, k: int = 10, n_probe: int = None) -> dict:
+    """
+    Query the index with stored games' own vectors and compare against exact search.
+
+    Recall is tie-aware: an approximate result counts as found if its score reaches the
+    k-th best exact score, since equally similar games are interchangeable.
+
+    Returns:
+      - dict with recall, mean candidates scanned, and p50/p99 query latency in ms.
+    """
+    found, wanted, scanned, latencies = 0, 0, [], []
+    for row in sample_rows:
+        vector = index._row_vector(row)
+        own = [index.ids[row]]
+        began = time.perf_counter()
+        _, approx_scores = index.query(vector, k, n_probe, exclude_ids=own)
+        latencies.append(time.perf_counter() - began)
+        _, exact_scores = index.exact(vector, k, exclude_ids=own)
+        if len(exact_scores):
+            found += int((approx_scores >= exact_scores[-1] - 1e-6).sum())
+            wanted += len(exact_scores)
+        scanned.append(len(index.candidates(vector, n_probe)))
+    latencies = np.array(latencies) * 1000
+    return {
+        "recall": found / wanted if wanted else 1.0,
+        "candidates": float(np.mean(scanned)),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+if __name__ == "__main__":
+    from src.data_registry import ANN_PATHS
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Report recall and latency of an ANN index against exact cosine")
+    parser.add_argument("--mode", default="mixed", choices=list(ANN_PATHS))
+    parser.add_argument("--sample", type=int, default=500, help="Stored games used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--probe", type=int, default=None, help="Lists scanned per query (default: the calibrated number)")
+    args = parser.parse_args()
+
+    ann = ANNIndex.load(ANN_PATHS[args.mode])
+    sample = np.random.default_rng(0).choice(len(ann), size=min(args.sample, len(ann)), replace=False)
+    report = measure_recall(ann, sample, args.k, args.probe)
+    print(json.dumps({"mode": args.mode, "k": args.k, "n_probe": args.probe or ann.n_probe, "games": len(ann), **report},
+                     indent=2))
@@ -0,0 +1,210 @@
+"""
+Batch recommendations for many seed games at once, outside the Streamlit UI.
+
+Used for nightly email digests and offline evaluation. Seeds are resolved in bulk against
+the name index (exact titles and ids are dictionary/array lookups; only the leftovers go
+through fuzzy matching, spread over a process pool), their neighbour lists are gathered
+from the similarity store in one vectorized call per chunk, joined against gamedata, and
+streamed to parquet or JSONL.
+
+    python -m src.batch --mode mixed --seeds seeds.txt --output recs.parquet
+    python -m src.batch --mode mech --seeds ids.txt --ids --output recs.jsonl --k 20
+"""
+
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.data_registry import DataRegistry
+from src.title_search import TitleSearchIndex
+
+# gamedata columns attached to every recommended game
+BATCH_COLUMNS = ["name", "yearpublished", "minplayers", "maxplayers", "playingtime",
+                 "average", "bayesaverage", "averageweight", "BGGrank"]
+
+# Minimum WRatio score for a fuzzy title match to be accepted
+MIN_FUZZY_SCORE = 80
+
+_worker_index = None
+
+
+def _init_fuzzy_worker(titles):
+    """Build the title index once per worker process."""
+    global _worker_index
+    _worker_index = TitleSearchIndex(titles, limit=1, score_cutoff=MIN_FUZZY_SCORE)
+
+
+def _fuzzy_chunk(queries):
+    """Best (title, score) per query, or (None, 0) when nothing scores high enough."""
+    results = []
+    for query in queries:
+        matches = _worker_index.search(query)
+        results.append(matches[0] if matches else (None, 0))
+    return results
+
+
+def resolve_seeds(registry, names=None, ids=None, workers=None, chunk_size=500) -> pd.DataFrame:
+    """
+    Resolve seed titles and/or ids to gamedata rows.
+
+    Parameters:
+      - registry (DataRegistry): loaded data.
+      - names (list[str] or None): seed titles; exact (normalised) matches are looked up
+        directly, the rest are fuzzy matched in a process pool.
+      - ids (list[int] or None): seed game ids.
+      - workers (int or None): fuzzy-matching processes; None uses the CPU count, 0 runs inline.
+      - chunk_size (int): titles per fuzzy-matching task.
+
+    Returns:
+      - pd.DataFrame with seed (the input value), row (gamedata row or -1), and match_score
+        (100 for exact matches, the fuzzy score otherwise, 0 when unresolved).
+    """
+    frames = []
+    if ids is not None:
+        id_rows = registry.names.rows_for_ids(ids)
+        frames.append(pd.DataFrame({"seed": list(ids), "row": id_rows,
+                                    "match_score": np.where(id_rows >= 0, 100.0, 0.0)}))
+
+    if names is not None:
+        names = list(names)
+        rows = np.array([registry.names.row_for_name(n) if n in registry.names else -1 for n in names],
+                        dtype=np.int64)
+        scores = np.where(rows >= 0, 100.0, 0.0)
+
+        pending = np.flatnonzero(rows < 0)
+        if len(pending):
+            queries = [names[i] for i in pending]
+            chunks = [queries[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+            if workers == 0:
+                _init_fuzzy_worker(registry.names.titles)
+                matched = [m for chunk in chunks for m in _fuzzy_chunk(chunk)]
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_fuzzy_worker,
+                                         initargs=(registry.names.titles,)) as pool:
+                    matched = [m for result in pool.map(_fuzzy_chunk, chunks) for m in result]
+            for i, (title, score) in zip(pending, matched):
+                if title is not None:
+                    rows[i] = registry.names.row_for_name(title)
+                    scores[i] = score
+            logging.info(f"Fuzzy matched {sum(t is not None for t, _ in matched)} of {len(pending)} titles")
+
+        frames.append(pd.DataFrame({"seed": names, "row": rows, "match_score": scores}))
+
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["seed", "row", "match_score"])
+
+
+def recommend_batch(registry, seed_rows, match_mode: str, k: int = 50, max_per_series=None) -> pd.DataFrame:
+    """
+    Neighbour lists for many seed games in one vectorized gather and join.
+
+    Parameters:
+      - registry (DataRegistry): loaded data.
+      - seed_rows (array-like): gamedata rows of the seed games (-1 entries are skipped).
+      - match_mode (str): 'mech', 'cat' or 'mixed'.
+      - k (int): neighbours kept per seed.
+      - max_per_series (int or None): if set, trim franchise clones per seed like the UI does.
+
+    Returns:
+      - pd.DataFrame with seed_id, seed_name, rank, game_id, similarity and BATCH_COLUMNS,
+        best match first within each seed.
+    """
+    gamedata = registry.gamedata
+    seed_rows = np.asarray(seed_rows)
+    seed_ids = gamedata["id"].to_numpy()[seed_rows[seed_rows >= 0]]
+
+    bases, _, similar, scores = registry.similarity_store(match_mode).neighbours_many(seed_ids)
+    rows = registry.names.rows_for_ids(similar)
+    keep = rows >= 0
+    out = pd.DataFrame({"seed_id": bases[keep], "game_id": similar[keep], "similarity": scores[keep]})
+    rows = rows[keep]
+
+    # The stored lists can name a game twice; lists are best match first, so the first pair has
+    # the highest score (build_recommendation_table keeps the same one)
+    unique = ~out.duplicated(["seed_id", "game_id"]).to_numpy()
+    out, rows = out[unique], rows[unique]
+
+    if max_per_series is not None:
+        keys = gamedata["franchise_key"].to_numpy()[rows]
+        in_series = out.groupby([out["seed_id"].to_numpy(), keys], sort=False).cumcount().to_numpy()
+        out, rows = out[in_series < max_per_series], rows[in_series < max_per_series]
+
+    # Rank after any trimming, so rank counts what the reader actually sees
+    rank = out.groupby("seed_id", sort=False).cumcount().to_numpy() + 1
+    out, rows = out[rank <= k].reset_index(drop=True), rows[rank <= k]
+    out.insert(1, "seed_name", gamedata["name"].to_numpy()[registry.names.rows_for_ids(out["seed_id"])])
+    out.insert(2, "rank", rank[rank <= k])
+
+    details = gamedata[BATCH_COLUMNS].iloc[rows].reset_index(drop=True)
+    return pd.concat([out, details], axis=1)
+
+
+def write_batches(frames, output_path: str):
+    """
+    Stream an iterable of result frames to parquet (one row group per frame) or JSONL,
+    chosen by the output file's extension.
+    """
+    if output_path.endswith(".jsonl"):
+        with open(output_path, "w") as f:
+            for frame in frames:
+                frame.to_json(f, orient="records", lines=True)
+        return
+
+    writer = None
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def run_batch(registry, seeds, match_mode: str, output_path: str, by_id=False, k=50,
+              max_per_series=None, workers=None, seeds_per_chunk=2000):
+    """
+    Resolve seeds, compute their recommendations chunk by chunk and stream them to output_path.
+    Returns the seed resolution table so callers can report unresolved seeds.
+    """
+    if by_id:
+        resolved = resolve_seeds(registry, ids=[int(s) for s in seeds], workers=workers)
+    else:
+        resolved = resolve_seeds(registry, names=seeds, workers=workers)
+    unresolved = int((resolved["row"] < 0).sum())
+    if unresolved:
+        logging.warning(f"{unresolved} of {len(resolved)} seeds could not be resolved")
+
+    seed_rows = resolved.loc[resolved["row"] >= 0, "row"].to_numpy()
+    chunks = (recommend_batch(registry, seed_rows[i:i + seeds_per_chunk], match_mode, k, max_per_series)
+              for i in range(0, len(seed_rows), seeds_per_chunk))
+    write_batches(chunks, output_path)
+    logging.info(f"Wrote recommendations for {len(seed_rows)} seeds to {output_path}")
+    return resolved
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Batch board game recommendations")
+    parser.add_argument("--seeds", required=True, help="Text file with one seed title (or id) per line")
+    parser.add_argument("--output", required=True, help="Output .parquet or .jsonl file")
+    parser.add_argument("--mode", default="mixed", choices=["mech", "cat", "mixed"])
+    parser.add_argument("--ids", action="store_true", help="Seeds are game ids rather than titles")
+    parser.add_argument("--k", type=int, default=50, help="Recommendations per seed")
+    parser.add_argument("--max-per-series", type=int, help="Trim franchise clones per seed")
+    parser.add_argument("--workers", type=int, help="Fuzzy-matching processes (0 = inline)")
+    args = parser.parse_args()
+
+    with open(args.seeds) as f:
+        seeds = [line.strip() for line in f if line.strip()]
+
+    resolved = run_batch(DataRegistry.load(), seeds, args.mode, args.output, by_id=args.ids, k=args.k,
+                         max_per_series=args.max_per_series, workers=args.workers)
+    unresolved = resolved.loc[resolved["row"] < 0, "seed"]
+    if len(unresolved):
+        print(f"Unresolved seeds ({len(unresolved)}): {', '.join(map(str, unresolved[:20]))}")
+    print(f"Done: {os.path.abspath(args.output)}")
@@ -0,0 +1,166 @@
+"""
+Small in-process caching layer for the recommendation engine.
+
+The engine used to rely on st.cache_data, which only works inside a Streamlit script
+run. These caches give any caller (the app, batch jobs, benchmarks) per-process caching
+without a UI runtime. Cached values are shared between callers, so treat returned values
+as read-only.
+
+Recommendation results go through ResultCache: it holds ranked id/score arrays rather
+than DataFrames, under a memory cap rather than an entry count, and counts its hits,
+misses and evictions. freeze() turns their arguments into hashable keys. LRUCache holds
+per-key values that are cheaper to build many at a time, such as the Home page's result
+cards.
+"""
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def freeze(value):
+    """Turn dicts, lists and sets (e.g. filter dicts) into hashable tuples for cache keys."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(freeze(v) for v in value))
+    return value
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with an entry cap, filled in batches: get_many() builds every
+    missing key in one call, so a page of results costs one disk read, not one per game.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0}
+
+    def get_many(self, keys, build) -> list:
+        """
+        Values for keys, in order. build(missing_keys) must return a dict with a value for
+        each missing key; it runs outside the lock, and exceptions are not cached.
+        """
+        keys = list(keys)
+        with self._lock:
+            found = {key: self._entries[key] for key in keys if key in self._entries}
+            for key in found:
+                self._entries.move_to_end(key)
+            missing = list(dict.fromkeys(key for key in keys if key not in found))
+            self._counts["hits"] += len(keys) - len(missing)
+            self._counts["misses"] += len(missing)
+
+        if missing:
+            built = build(missing)
+            found.update(built)
+            with self._lock:
+                self._entries.update(built)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counts, "entries": len(self._entries), "maxsize": self.maxsize}
+
+
+# Rough per-entry cost besides the arrays themselves (key tuple, array headers, dict slot)
+_ENTRY_OVERHEAD = 512
+
+
+class ResultCache:
+    """
+    Byte-bounded, thread-safe LRU cache of ranked results.
+
+    Entries are compact (game_ids, scores) arrays rather than DataFrames: int32 ids (int64
+    if an id does not fit) and float32 scores, read-only because they are shared. Callers
+    rebuild their result tables from them, which costs a row lookup in the lean gamedata
+    frame. When the total size passes max_bytes the least recently used entries are evicted.
+
+    Keys are tuples such as ("filtered", game_id, mode, k, frozen_filters); see recommendation.py.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._counts = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _compact(game_ids, scores) -> tuple:
+        game_ids = np.asarray(game_ids)
+        int32 = np.iinfo(np.int32)
+        fits = not len(game_ids) or (game_ids.min() >= int32.min and game_ids.max() <= int32.max)
+        game_ids = game_ids.astype(np.int32 if fits else np.int64)
+        scores = np.asarray(scores, dtype=np.float32)
+        game_ids.setflags(write=False)
+        scores.setflags(write=False)
+        return game_ids, scores
+
+    def get(self, key):
+        """The (game_ids, scores) stored under key, or None; counts a hit or a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counts["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counts["hits"] += 1
+            return entry
+
+    def put(self, key, game_ids, scores) -> tuple:
+        """Store a result (compacted) and evict down to the cap; returns the stored arrays."""
+        entry = self._compact(game_ids, scores)
+        size = entry[0].nbytes + entry[1].nbytes + _ENTRY_OVERHEAD
+        with self._lock:
+            if key in self._entries:
+                old = self._entries.pop(key)
+                self._bytes -= old[0].nbytes + old[1].nbytes + _ENTRY_OVERHEAD
+            if size <= self.max_bytes:
+                self._entries[key] = entry
+                self._bytes += size
+                self._evict()
+        return entry
+
+    def get_or_compute(self, key, compute) -> tuple:
+        """
+        Return the cached (game_ids, scores) for key, or call compute() for them and cache the
+        result. compute runs outside the lock; exceptions are not cached.
+        """
+        entry = self.get(key)
+        if entry is None:
+            entry = self.put(key, *compute())
+        return entry
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, (game_ids, scores) = self._entries.popitem(last=False)
+            self._bytes -= game_ids.nbytes + scores.nbytes + _ENTRY_OVERHEAD
+            self._counts["evictions"] += 1
+
+    def resize(self, max_bytes: int):
+        """Change the memory cap, evicting straight away if the cache is now over it."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Counters since startup plus the current size."""
+        with self._lock:
+            return {**self._counts, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes}
@@ -0,0 +1,230 @@
+"""
+Process-wide registry of the datasets the app serves from.
+
+Every browser session used to keep its own copies of gamedata, the top 300 list and the
+neighbour tables in st.session_state. The registry loads each of them exactly once per
+process and is shared by every caller (Streamlit sessions, batch jobs, benchmarks), so
+callers must treat the frames and indexes it hands out as read-only (copy before modifying).
+
+Nothing here depends on Streamlit: get_registry() is a plain module-level singleton, and
+set_registry() lets headless callers install a registry built from other files.
+"""
+
+import json
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+from src.similarity_store import SimilarityStore
+from src.features import FeatureMatrices
+from src.ann_index import ANNIndex
+from src.name_index import NameIndex, franchise_key
+from src.title_search import TitleSearchIndex
+from src.filters import FilterIndex
+from src.game_details import CORE_COLUMNS, GameDetails, details_path_for
+from src.cache import LRUCache, ResultCache
+
+# Project root, so paths work no matter where streamlit is launched from
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GAMEDATA_PATH = os.path.join(PROJECT_ROOT, "data", "processed", "gamedata.parquet")
+# Tokenized by the data pipeline (data/pipeline.py); trees that predate it only have the raw copy,
+# which the old tokenize script rewrote in place
+TOP300_PATH = os.path.join(PROJECT_ROOT, "data", "processed", "BGGtop300.csv")
+LEGACY_TOP300_PATH = os.path.join(PROJECT_ROOT, "data", "raw", "BGGtop300.csv")
+
+# Top-50 neighbour tables for each match mode
+RECIPE_PATHS = {
+    "mech": os.path.join(PROJECT_ROOT, "data", "processed", "top50_mech_heavy.parquet"),
+    "cat": os.path.join(PROJECT_ROOT, "data", "processed", "top50_cat_heavy.parquet"),
+    "mixed": os.path.join(PROJECT_ROOT, "data", "processed", "top50_mixed.parquet"),
+}
+
+# Approximate nearest-neighbour indexes over the same recipes, for ad-hoc vector queries
+ANN_PATHS = {mode: os.path.join(PROJECT_ROOT, "data", "processed", f"ann_{mode}") for mode in RECIPE_PATHS}
+
+# Per-component feature matrices written by data/build_topk.py, and the recipe weights per mode
+FEATURES_PATH = os.path.join(PROJECT_ROOT, "data", "processed", "features.npz")
+RECIPES_PATH = os.path.join(PROJECT_ROOT, "data", "recipes.json")
+
+# The feature matrices and ANN indexes are not shipped; this builds both without touching the top-50 tables
+FEATURES_BUILD_COMMAND = "python -m data.build_topk --features-only"
+
+# Memory cap of each registry's recommendation result cache (see src/cache.py)
+RESULT_CACHE_BYTES = int(float(os.environ.get("PLAYNEXT_RESULT_CACHE_MB", 32)) * 2**20)
+
+# Formatted result cards (src/result_cards.py) kept per registry
+CARD_CACHE_SIZE = 4096
+
+# Range indexes and chart data of the DataViz page (src/viz_stats.py) kept per registry
+CHART_CACHE_SIZE = 256
+
+# Columns coerced to numbers once at load, so no caller has to (or may) do it on the shared frame
+NUMERIC_COLUMNS = [
+    "minplayers", "maxplayers", "playingtime", "average", "bayesaverage",
+    "averageweight", "yearpublished", "BGGrank",
+]
+
+
+def coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the known numeric columns in place; unparseable values become NaN."""
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+class DataRegistry:
+    """
+    Immutable-by-convention holder for the shared frames and their indexes.
+
+    gamedata (its core columns) and top300 are loaded eagerly, along with the name/id, title
+    search and filter indexes; similarity stores, ANN indexes, feature matrices and the heavy
+    detail columns are loaded on first use and then kept for the life of the process.
+
+    gamedata_path is where columns missing from gamedata are fetched from by details(); a
+    registry built from an in-memory frame without it can only serve that frame's columns.
+    stores maps match modes to neighbour stores to serve instead of reading RECIPE_PATHS
+    (e.g. synthetic tables for benchmarks).
+    """
+
+    def __init__(self, gamedata: pd.DataFrame, top300: pd.DataFrame, gamedata_path: str = None,
+                 stores: dict = None):
+        # Row labels double as positions, so index lookups can be used with .loc and .iloc alike
+        self.gamedata = gamedata.reset_index(drop=True)
+        self.top300 = top300
+        self.names = NameIndex(self.gamedata)
+        self.title_search = TitleSearchIndex(self.names.titles)
+        self.filter_index = FilterIndex(self.gamedata)
+        self._stores = dict(stores or {})
+        self._ann = {}
+        self._features = None
+        self._catalog_feature_rows = None
+        self._gamedata_path = gamedata_path
+        self._details = None
+        # Ranked results computed against this registry's data; dropped with it
+        self.results = ResultCache(RESULT_CACHE_BYTES)
+        self.cards = LRUCache(CARD_CACHE_SIZE)
+        self.charts = LRUCache(CHART_CACHE_SIZE)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, gamedata_path: str = GAMEDATA_PATH, top300_path: str = TOP300_PATH,
+             columns=CORE_COLUMNS) -> "DataRegistry":
+        """
+        Read and type the base datasets and add derived columns.
+
+        Only the given gamedata columns are read (the core columns by default; None for all of
+        them); the rest stay on disk until details() asks for them.
+        """
+        dataset = ds.dataset(gamedata_path, format="parquet")
+        if columns is not None:
+            columns = [col for col in columns if col in dataset.schema.names]
+        gamedata = coerce_numeric(dataset.to_table(columns=columns).to_pandas())
+        gamedata["franchise_key"] = franchise_key(gamedata["name"])   # used by trim_franchise_clones
+        if top300_path == TOP300_PATH and not os.path.exists(top300_path):
+            top300_path = LEGACY_TOP300_PATH
+        top300 = coerce_numeric(pd.read_csv(top300_path))
+        logging.info(f"Registry loaded {len(gamedata)} games ({len(gamedata.columns)} columns) "
+                     f"and {len(top300)} top-300 rows")
+        return cls(gamedata, top300, gamedata_path)
+
+    def similarity_store(self, match_mode: str) -> SimilarityStore:
+        """Return the neighbour store for a match mode ('mech', 'cat' or 'mixed')."""
+        if match_mode not in RECIPE_PATHS:
+            raise ValueError(f"Invalid match mode: {match_mode}")
+        with self._lock:
+            if match_mode not in self._stores:
+                self._stores[match_mode] = SimilarityStore.load(RECIPE_PATHS[match_mode])
+            return self._stores[match_mode]
+
+    def ann_index(self, match_mode: str) -> ANNIndex:
+        """Return the memory-mapped ANN index for a match mode."""
+        if match_mode not in ANN_PATHS:
+            raise ValueError(f"Invalid match mode: {match_mode}")
+        with self._lock:
+            if match_mode not in self._ann:
+                if not os.path.isdir(ANN_PATHS[match_mode]):
+                    raise FileNotFoundError(f"No ANN index at {ANN_PATHS[match_mode]}; build it with {FEATURES_BUILD_COMMAND}")
+                self._ann[match_mode] = ANNIndex.load(ANN_PATHS[match_mode])
+            return self._ann[match_mode]
+
+    def details(self, game_ids, columns) -> pd.DataFrame:
+        """
+        Return any gamedata columns for the given games, loaded or not.
+
+        Columns already in gamedata are sliced from it; the others are fetched by id from disk
+        (see src/game_details.py), so only the rows asked for are ever read.
+
+        Returns:
+          - pd.DataFrame indexed by game id in the order given, with the columns in the order
+            given; unknown ids get a row of NaN.
+        """
+        game_ids = np.asarray(game_ids, dtype=np.int64)
+        columns = list(columns)
+        loaded = [col for col in columns if col in self.gamedata.columns]
+        missing = [col for col in columns if col not in self.gamedata.columns]
+
+        # Unknown ids map to row -1, which reindex turns into a row of NaN
+        frame = self.gamedata[loaded].reindex(self.names.rows_for_ids(game_ids))
+        frame.index = pd.Index(game_ids, name="id")
+        if missing:
+            if self._gamedata_path is None:
+                raise KeyError(f"Columns not in gamedata: {missing}")
+            with self._lock:
+                if self._details is None:
+                    self._details = GameDetails(details_path_for(self._gamedata_path), self._gamedata_path)
+            frame = pd.concat([frame, self._details.fetch(game_ids, missing)], axis=1)
+        return frame[columns]
+
+    def feature_matrices(self) -> FeatureMatrices:
+        """Return the per-component feature matrices used for query-time blending."""
+        with self._lock:
+            if self._features is None:
+                if not os.path.exists(FEATURES_PATH):
+                    raise FileNotFoundError(f"No feature matrices at {FEATURES_PATH}; build them with {FEATURES_BUILD_COMMAND}")
+                self._features = FeatureMatrices.load(FEATURES_PATH)
+                self._catalog_feature_rows = self._features.positions(self.gamedata["id"])
+            return self._features
+
+    def has_feature_matrices(self) -> bool:
+        """Whether feature_matrices() can load; the features are optional and not shipped."""
+        return self._features is not None or os.path.exists(FEATURES_PATH)
+
+    def catalog_feature_rows(self) -> np.ndarray:
+        """Feature-matrix row of each gamedata row (-1 where a game has no feature vector)."""
+        self.feature_matrices()
+        return self._catalog_feature_rows
+
+    def recipe_weights(self, match_mode: str) -> dict:
+        """Component weights that data/build_topk.py used for a match mode's top-50 table."""
+        with open(RECIPES_PATH) as f:
+            recipes = json.load(f)["recipes"]
+        if match_mode not in recipes:
+            raise ValueError(f"Invalid match mode: {match_mode}")
+        return recipes[match_mode]["weights"]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> DataRegistry:
+    """
+    Return the process-wide DataRegistry, loading it on first call.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DataRegistry.load()
+    return _registry
+
+
+def set_registry(registry: DataRegistry):
+    """Install a registry (e.g. one built from synthetic data) as the process-wide default."""
+    global _registry
+    with _registry_lock:
+        _registry = registry
@@ -0,0 +1,299 @@
+"""
+Sparse feature vectors for games and blockwise cosine top-K search.
+
+Every game is described by three token columns produced by the tokenize step:
+mechanics_str, categories_str and tags_str. Each column is turned into an L2-normalised
+TF-IDF matrix, and a recipe is a set of weights over those components. The blended
+similarity of two games is the weighted sum of their per-component cosines, which we get
+from one sparse product by stacking the components scaled by sqrt(weight).
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Feature component -> token column in gamedata
+FEATURE_COLUMNS = {
+    "mechanics": "mechanics_str",
+    "categories": "categories_str",
+    "tags": "tags_str",
+}
+
+# Tokens are already joined with underscores, so whitespace is the only separator
+TOKEN_PATTERN = r"\S+"
+
+
+class FeatureMatrices:
+    """
+    Per-component TF-IDF matrices for a set of games, plus what is needed to vectorize new ones.
+
+    Row i of every matrix belongs to ids[i].
+    """
+
+    def __init__(self, ids, matrices, vocabularies, idf):
+        self.ids = np.asarray(ids)
+        self.matrices = matrices
+        self.vocabularies = vocabularies
+        self.idf = idf
+        self._position = {game_id: i for i, game_id in enumerate(self.ids.tolist())}
+        self._columns = {component: {token: i for i, token in enumerate(vocab)}
+                         for component, vocab in vocabularies.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, game_ids) -> np.ndarray:
+        """Return the row of each game id, or -1 for ids that were not vectorized."""
+        return np.array([self._position.get(game_id, -1) for game_id in game_ids], dtype=np.int64)
+
+    def transform(self, component: str, token_strings) -> sparse.csr_matrix:
+        """
+        Vectorize token strings against the stored vocabulary and IDF weights of a component.
+        Tokens that were not seen when the matrices were built are ignored.
+        """
+        counts, _ = token_counts(token_strings, self._columns[component])
+        return normalize_rows(counts.multiply(self.idf[component]).tocsr())
+
+    def with_games(self, df: pd.DataFrame) -> "FeatureMatrices":
+        """
+        Return a copy with the games in df vectorized against the stored vocabularies and IDF
+        weights: rows of known ids are replaced, unknown ids are appended. Tokens outside the
+        vocabulary are ignored until the next full build.
+
+        Parameters:
+          - df (pd.DataFrame): an 'id' column and the FEATURE_COLUMNS token columns.
+        """
+        positions = self.positions(df["id"])
+        added = positions < 0
+        # Row order of the result within vstack([old rows, df rows])
+        order = np.arange(len(self))
+        order[positions[~added]] = len(self) + np.flatnonzero(~added)
+        order = np.concatenate([order, len(self) + np.flatnonzero(added)])
+
+        matrices = {
+            component: sparse.vstack([matrix, self.transform(component, df[FEATURE_COLUMNS[component]])],
+                                     format="csr")[order]
+            for component, matrix in self.matrices.items()
+        }
+        ids = np.concatenate([self.ids, df["id"].to_numpy()[added]])
+        return FeatureMatrices(ids, matrices, self.vocabularies, self.idf)
+
+    def blend(self, weights: dict, rows=None) -> sparse.csr_matrix:
+        """
+        Stack the components scaled by sqrt(weight), so that a dot product between two
+        blended rows equals the weighted sum of their per-component cosines.
+        """
+        weights = normalize_weights(weights)
+        blocks = []
+        for component, weight in weights.items():
+            matrix = self.matrices[component]
+            if rows is not None:
+                matrix = matrix[rows]
+            blocks.append(matrix * np.sqrt(weight))
+        return sparse.hstack(blocks, format="csr")
+
+    def blend_tokens(self, tokens: dict, weights: dict) -> sparse.csr_matrix:
+        """
+        Vectorize one ad-hoc profile in the same space as blend(weights), e.g. a user's
+        {"mechanics": "Deck_Building Worker_Placement", "categories": ["Fantasy"]}.
+        Token lists or space-separated strings are accepted; missing components are empty.
+        """
+        blocks = []
+        for component, weight in normalize_weights(weights).items():
+            value = tokens.get(component) or ""
+            text = value if isinstance(value, str) else " ".join(value)
+            blocks.append(self.transform(component, [text]) * np.sqrt(weight))
+        return sparse.hstack(blocks, format="csr")
+
+    def blended_scores(self, position: int, weights: dict) -> np.ndarray:
+        """
+        Weighted cosine similarity of one game (by row position) against every game.
+        Each component costs one sparse matrix-vector product, so any weight mix is cheap.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        for component, weight in normalize_weights(weights).items():
+            matrix = self.matrices[component]
+            scores += weight * (matrix @ matrix[position].T).toarray().ravel()
+        return scores
+
+    def save(self, path: str):
+        """Write all components to a single .npz file."""
+        arrays = {"ids": self.ids}
+        for component, matrix in self.matrices.items():
+            arrays[f"{component}_data"] = matrix.data
+            arrays[f"{component}_indices"] = matrix.indices
+            arrays[f"{component}_indptr"] = matrix.indptr
+            arrays[f"{component}_shape"] = np.array(matrix.shape)
+            arrays[f"{component}_vocab"] = np.array(self.vocabularies[component], dtype=object)
+            arrays[f"{component}_idf"] = self.idf[component]
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureMatrices":
+        """Read matrices written by save()."""
+        with np.load(path, allow_pickle=True) as npz:
+            matrices, vocabularies, idf = {}, {}, {}
+            for component in FEATURE_COLUMNS:
+                if f"{component}_data" not in npz:
+                    continue
+                matrices[component] = sparse.csr_matrix(
+                    (npz[f"{component}_data"], npz[f"{component}_indices"], npz[f"{component}_indptr"]),
+                    shape=tuple(npz[f"{component}_shape"]),
+                )
+                vocabularies[component] = npz[f"{component}_vocab"].tolist()
+                idf[component] = npz[f"{component}_idf"]
+            return cls(npz["ids"], matrices, vocabularies, idf)
+
+
+def token_counts(token_strings, vocabulary=None):
+    """
+    Sparse (documents x tokens) count matrix for whitespace-separated token strings.
+
+    Parameters:
+      - token_strings (iterable of str): one string per document; NaN counts as empty.
+      - vocabulary (dict or None): token -> column; unknown tokens are dropped. When None,
+        the sorted set of tokens seen is used.
+
+    Returns:
+      - (csr_matrix, vocabulary)
+    """
+    series = pd.Series(list(token_strings), dtype=object).fillna("").astype(str)
+    exploded = series.str.split().explode().dropna()
+    if vocabulary is None:
+        vocabulary = {token: i for i, token in enumerate(sorted(exploded.unique()))}
+    cols = exploded.map(vocabulary)
+    known = cols.notna().to_numpy()
+    rows = exploded.index.to_numpy()[known]
+    cols = cols.to_numpy()[known].astype(np.int64)
+    counts = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                               shape=(len(series), len(vocabulary)))
+    counts.sum_duplicates()
+    return counts, vocabulary
+
+
+def normalize_rows(matrix) -> sparse.csr_matrix:
+    """L2-normalise the rows of a sparse matrix; all-zero rows stay zero."""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def normalize_weights(weights: dict) -> dict:
+    """
+    Drop zero weights and rescale the rest to sum to 1, so blended scores stay in [0, 1].
+    """
+    unknown = set(weights) - set(FEATURE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown feature components: {sorted(unknown)}")
+    weights = {component: float(w) for component, w in weights.items() if w}
+    if any(w < 0 for w in weights.values()):
+        raise ValueError("Recipe weights must be non-negative.")
+    total = sum(weights.values())
+    if total == 0:
+        raise ValueError("Recipe weights must not all be zero.")
+    return {component: w / total for component, w in weights.items()}
+
+
+def top_k_positions(scores: np.ndarray, k: int, exclude=None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return (positions, scores) of the k highest scores, best first, skipping excluded positions
+    and anything with no similarity at all.
+    """
+    scores = scores.copy() if exclude is not None else scores
+    if exclude is not None:
+        scores[exclude] = -np.inf
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    top = top[scores[top] > 0]
+    return top, scores[top]
+
+
+def vectorize_games(df: pd.DataFrame, components=None) -> FeatureMatrices:
+    """
+    Build one TF-IDF matrix per feature component from the tokenized gamedata columns.
+
+    Parameters:
+      - df (pd.DataFrame): gamedata with an 'id' column and the FEATURE_COLUMNS token columns.
+      - components (list or None): subset of FEATURE_COLUMNS keys; all of them by default.
+
+    Returns:
+      - FeatureMatrices whose rows follow df's row order.
+    """
+    # Only needed for offline builds, so the app does not pay for importing scikit-learn
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    components = components or list(FEATURE_COLUMNS)
+    matrices, vocabularies, idf = {}, {}, {}
+    for component in components:
+        vectorizer = TfidfVectorizer(token_pattern=TOKEN_PATTERN, lowercase=False, norm="l2", dtype=np.float32)
+        matrices[component] = vectorizer.fit_transform(df[FEATURE_COLUMNS[component]].fillna("").astype(str)).tocsr()
+        vocabularies[component] = vectorizer.get_feature_names_out().tolist()
+        idf[component] = vectorizer.idf_.astype(np.float32)
+        logging.info(f"Vectorized {component}: {matrices[component].shape[1]} tokens")
+    return FeatureMatrices(df["id"].to_numpy(), matrices, vocabularies, idf)
+
+
+def topk_blockwise(queries, corpus, k: int, block_size: int = 512, self_offset=None, self_positions=None):
+    """
+    Cosine top-K of every query row against the corpus, computed block by block.
+
+    Only a (block_size x n_corpus) slice of scores is ever dense, so memory stays bounded
+    regardless of catalog size.
+
+    Parameters:
+      - queries (csr_matrix): L2-normalised query rows.
+      - corpus (csr_matrix): L2-normalised corpus rows.
+      - k (int): neighbours to keep per query.
+      - block_size (int): query rows scored per block.
+      - self_offset (int or None): if the queries are corpus rows starting at this offset,
+        each query's own row is excluded from its neighbours.
+      - self_positions (array or None): alternatively, the corpus row of each query (-1 for
+        queries that are not in the corpus), for queries that are scattered corpus rows.
+
+    Yields:
+      - (start, neighbours, scores) per block, where neighbours is a (rows x k) array of corpus
+        row positions, best first, and scores the matching similarities.
+    """
+    corpus_t = corpus.T.tocsc()
+    n_corpus = corpus.shape[0]
+    excludes_self = self_offset is not None or self_positions is not None
+    k = min(k, n_corpus - (1 if excludes_self else 0))
+
+    for start in range(0, queries.shape[0], block_size):
+        block = queries[start:start + block_size]
+        scores = (block @ corpus_t).toarray().astype(np.float32, copy=False)
+        rows = np.arange(scores.shape[0])
+
+        if self_offset is not None:
+            scores[rows, self_offset + start + rows] = -np.inf
+        elif self_positions is not None:
+            own = np.asarray(self_positions[start:start + len(rows)])
+            scores[rows[own >= 0], own[own >= 0]] = -np.inf
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        yield start, np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def build_topk_table(features: FeatureMatrices, weights: dict, k: int = 50, block_size: int = 512) -> pd.DataFrame:
+    """
+    Compute the top-K neighbour table for one recipe.
+
+    Returns:
+      - pd.DataFrame with base_game_id, similar_game_id, similarity_score, best match first
+        within each base game. Pairs with no shared tokens (score 0) are left out.
+    """
+    blended = features.blend(weights)
+    frames = []
+    for start, neighbours, scores in topk_blockwise(blended, blended, k, block_size, self_offset=0):
+        base = np.repeat(features.ids[start:start + len(neighbours)], neighbours.shape[1])
+        frame = pd.DataFrame({
+            "base_game_id": base,
+            "similar_game_id": features.ids[neighbours.ravel()],
+            "similarity_score": scores.ravel(),
+        })
+        frames.append(frame[frame["similarity_score"] > 0])
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,160 @@
+"""
+Columnar filter engine for recommendation results.
+
+The catalog's filterable columns are extracted once, when the registry loads gamedata:
+numeric columns as float arrays, boolean flags as bool arrays, and the mechanics and
+categories token lists as sparse incidence matrices. A filter is a list of predicate
+specs that are AND-ed into one boolean mask, evaluated either over the whole catalog or
+over just the rows of a result list.
+
+Predicate specs are (column, op, value) tuples:
+  - numeric columns:  ">=", "<=", ">", "<", "==", "!=", "between" (value=(lo, hi), inclusive), "in"
+  - flag columns:     "==", "!="                                   e.g. ("is_digital", "==", False)
+  - token columns:    "any", "all", "none" (value=list of tokens)  e.g. ("mechanics", "any", ["Deck_Building"])
+"""
+
+import numpy as np
+import pandas as pd
+from src.features import token_counts
+
+# Columns compared as numbers; NaN never passes a comparison
+FILTER_NUMERIC_COLUMNS = [
+    "minplayers", "maxplayers", "playingtime", "average", "bayesaverage",
+    "averageweight", "yearpublished", "BGGrank",
+]
+
+# Boolean columns produced by data_utilities.parse_family_field
+FILTER_FLAG_COLUMNS = ["is_digital", "is_crowdfunded"]
+
+# Token set name -> tokenized gamedata column
+FILTER_TOKEN_COLUMNS = {
+    "mechanics": "mechanics_str",
+    "categories": "categories_str",
+}
+
+_COMPARISONS = {
+    ">=": np.greater_equal,
+    "<=": np.less_equal,
+    ">": np.greater,
+    "<": np.less,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+# Sidebar filter key -> (column, op) it stands for
+_LEGACY_FILTERS = {
+    "min_players": ("minplayers", ">="),
+    "max_players": ("maxplayers", "<="),
+    "max_playtime": ("playingtime", "<="),
+    "min_avg": ("average", ">="),
+    "min_weight": ("averageweight", ">="),
+    "min_year": ("yearpublished", ">="),
+}
+
+# Initial values of the Home page's sidebar filters, i.e. the filters of a first search
+SIDEBAR_DEFAULTS = {
+    "min_players": 1,
+    "max_players": 12,
+    "max_playtime": 220,
+    "min_avg": 5.0,
+    "min_weight": 1.0,
+    "min_year": 1970,
+}
+
+
+def filters_to_predicates(filters: dict) -> list:
+    """
+    Translate the sidebar filter dict (min_players, max_playtime, ...) into predicate specs.
+    Keys set to None are skipped; extra specs can be passed under the "predicates" key.
+    """
+    predicates = [
+        (column, op, filters[key])
+        for key, (column, op) in _LEGACY_FILTERS.items()
+        if filters.get(key) is not None
+    ]
+    predicates.extend(filters.get("predicates") or [])
+    return predicates
+
+
+class FilterIndex:
+    """
+    Typed, read-only column arrays of a catalog frame for fused mask evaluation.
+    Rows are positions in the frame the index was built from.
+    """
+
+    def __init__(self, gamedata: pd.DataFrame):
+        self.n_rows = len(gamedata)
+        self.numeric = {
+            col: pd.to_numeric(gamedata[col], errors="coerce").to_numpy(dtype=np.float64)
+            for col in FILTER_NUMERIC_COLUMNS if col in gamedata.columns
+        }
+        self.flags = {
+            col: gamedata[col].fillna(False).astype(bool).to_numpy()
+            for col in FILTER_FLAG_COLUMNS if col in gamedata.columns
+        }
+        self.tokens = {}
+        for name, col in FILTER_TOKEN_COLUMNS.items():
+            if col in gamedata.columns:
+                incidence, vocabulary = token_counts(gamedata[col])
+                incidence.data[:] = 1   # presence, not counts
+                self.tokens[name] = (vocabulary, incidence.tocsc())
+
+    def _column(self, column: str, rows):
+        values = self.numeric.get(column)
+        if values is None:
+            values = self.flags.get(column)
+        if values is None:
+            raise ValueError(f"Unknown filter column: {column}")
+        return values if rows is None else values[rows]
+
+    def _token_counts(self, name: str, tokens, rows) -> np.ndarray:
+        """How many of the given tokens each row has."""
+        vocabulary, incidence = self.tokens[name]
+        cols = [vocabulary[t] for t in tokens if t in vocabulary]
+        n = self.n_rows if rows is None else len(rows)
+        if not cols:
+            return np.zeros(n, dtype=np.int64)
+        selected = incidence[:, cols].tocsr()
+        if rows is not None:
+            selected = selected[rows]
+        return np.asarray(selected.sum(axis=1)).ravel()
+
+    def _evaluate(self, predicate, rows) -> np.ndarray:
+        column, op, value = predicate
+        if column in self.tokens:
+            # Deduplicated, so "all" compares the count against distinct tokens only
+            tokens = [value] if isinstance(value, str) else list(dict.fromkeys(value))
+            counts = self._token_counts(column, tokens, rows)
+            if op == "any":
+                return counts > 0
+            if op == "all":
+                return counts == len(tokens)
+            if op == "none":
+                return counts == 0
+            raise ValueError(f"Unsupported operator '{op}' for token column {column}")
+
+        values = self._column(column, rows)
+        if op in _COMPARISONS:
+            return _COMPARISONS[op](values, value)
+        if op == "between":
+            lo, hi = value
+            return (values >= lo) & (values <= hi)
+        if op == "in":
+            return np.isin(values, list(value))
+        raise ValueError(f"Unsupported operator '{op}' for column {column}")
+
+    def mask(self, predicates, rows=None) -> np.ndarray:
+        """
+        AND all predicates into one boolean mask.
+
+        Parameters:
+          - predicates (list): (column, op, value) specs; an empty list keeps everything.
+          - rows (array-like or None): evaluate only these catalog rows (mask is aligned with
+            them); None evaluates the whole catalog.
+        """
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+        result = np.ones(self.n_rows if rows is None else len(rows), dtype=bool)
+        for predicate in predicates:
+            result &= self._evaluate(predicate, rows)
+        return result
@@ -0,0 +1,144 @@
+"""
+Lazy, by-id access to gamedata's heavy columns.
+
+The registry only loads the columns that search, filtering and ranking need. Descriptions,
+image URLs, the raw list columns and family metadata are fetched per game when a result is
+actually rendered, from gamedata_details.arrow: an uncompressed Arrow IPC copy of those
+columns written by the data pipeline (the "details" stage). The file is memory-mapped, so a
+fetch only pages in the requested rows and the mapping is shared by every process on the
+machine.
+
+Trees built before the details stage fall back to a filtered pyarrow.dataset read of
+gamedata.parquet, which gives the same result but decodes the whole of each requested
+column on every call.
+"""
+
+import logging
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+
+# Columns the registry loads eagerly: ids and titles for search, plus everything filtering,
+# ranking and the result tables use. Every other column is a detail column.
+CORE_COLUMNS = [
+    "id", "name", "yearpublished", "BGGrank", "minplayers", "maxplayers", "playingtime",
+    "average", "bayesaverage", "averageweight", "is_digital", "is_crowdfunded",
+    "mechanics_str", "categories_str",
+]
+
+# Rows per record batch in the details file
+DETAILS_BATCH_ROWS = 1024
+
+
+def details_path_for(gamedata_path: str) -> str:
+    """The details file that goes with a gamedata parquet: gamedata.parquet -> gamedata_details.arrow."""
+    stem, _ = os.path.splitext(gamedata_path)
+    return f"{stem}_details.arrow"
+
+
+def write_details(gamedata_path: str, out_path: str, batch_rows: int = DETAILS_BATCH_ROWS):
+    """
+    Copy the id and every non-core column of a gamedata parquet into an uncompressed Arrow IPC
+    file, streaming one record batch at a time.
+    """
+    dataset = ds.dataset(gamedata_path, format="parquet")
+    columns = ["id", *(name for name in dataset.schema.names if name not in CORE_COLUMNS)]
+    schema = pa.schema([dataset.schema.field(name) for name in columns])
+    rows = 0
+    with pa.OSFile(out_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        for batch in dataset.to_batches(columns=columns, batch_size=batch_rows):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    logging.info(f"Wrote {len(columns) - 1} detail columns for {rows} games to {out_path}")
+
+
+def _id_lookup(ids: np.ndarray) -> tuple[pd.Index, np.ndarray]:
+    """Index over the first occurrence of each id, and the position each entry came from."""
+    first = ~pd.Series(ids).duplicated().to_numpy()
+    return pd.Index(ids[first]), np.flatnonzero(first)
+
+
+def _positions(lookup: tuple, game_ids: np.ndarray) -> np.ndarray:
+    """Position of each game id in the looked-up ids, or -1 if it is not there."""
+    index, positions = lookup
+    pos = index.get_indexer(game_ids)
+    return np.where(pos >= 0, positions[pos], -1)
+
+
+def _take_rows(table: pa.Table, positions: np.ndarray) -> pa.Table:
+    """
+    table.take(positions), with -1 giving a row of nulls. Rows are taken batch by batch:
+    Table.take on a multi-batch table first concatenates each column's chunks, which would
+    copy the whole mapped column for a handful of rows.
+    """
+    batches = table.to_batches()
+    starts = np.cumsum([0] + [batch.num_rows for batch in batches])
+    found = np.flatnonzero(positions >= 0)
+    batch_of = np.searchsorted(starts, positions[found], side="right") - 1
+    by_batch = np.argsort(batch_of, kind="stable")
+    slots, batch_of = found[by_batch], batch_of[by_batch]
+    pieces = [batches[b].take(pa.array(positions[slots[batch_of == b]] - starts[b]))
+              for b in np.unique(batch_of)]
+    gathered = pa.Table.from_batches(pieces, schema=table.schema).combine_chunks()
+
+    # Put the gathered rows back in request order; a null index takes a null row
+    order = np.full(len(positions), -1)
+    order[slots] = np.arange(len(slots))
+    return gathered.take(pa.array(order, mask=order < 0))
+
+
+class GameDetails:
+    """
+    Heavy gamedata columns, fetched by game id.
+
+    Parameters:
+      - details_path (str): gamedata_details.arrow; may be missing.
+      - gamedata_path (str): gamedata.parquet, read only when details_path is missing.
+    """
+
+    def __init__(self, details_path: str, gamedata_path: str):
+        if os.path.exists(details_path):
+            # Zero-copy: the table's buffers point straight into the mapped file
+            self.table = pa.ipc.open_file(pa.memory_map(details_path)).read_all()
+            self._lookup = _id_lookup(self.table.column("id").to_numpy())
+            self._dataset = None
+            names = self.table.column_names
+            logging.info(f"Mapped detail columns for {self.table.num_rows} games from {details_path}")
+        else:
+            logging.warning(f"{details_path} not found; reading game details from {gamedata_path} "
+                            f"(run python -m data.pipeline details)")
+            self.table = None
+            self._dataset = ds.dataset(gamedata_path, format="parquet")
+            names = self._dataset.schema.names
+        self.columns = [name for name in names if name != "id"]
+
+    def fetch(self, game_ids, columns=None) -> pd.DataFrame:
+        """
+        Return the requested columns for the given games.
+
+        Parameters:
+          - game_ids (array-like): games to fetch; repeats are allowed.
+          - columns (list or None): columns wanted; every detail column by default.
+
+        Returns:
+          - pd.DataFrame indexed by game id in the order given; unknown ids get a row of NaN.
+        """
+        game_ids = np.asarray(game_ids, dtype=np.int64)
+        columns = list(self.columns if columns is None else columns)
+        unknown = [col for col in columns if col not in self.columns]
+        if unknown:
+            raise KeyError(f"Columns not in the game details: {unknown}")
+
+        if self.table is not None:
+            table, lookup = self.table, self._lookup
+        else:
+            table = self._dataset.to_table(columns=["id", *columns],
+                                           filter=pc.field("id").isin(np.unique(game_ids)))
+            lookup = _id_lookup(table.column("id").to_numpy())
+        frame = _take_rows(table.select(columns), _positions(lookup, game_ids)).to_pandas()
+        frame.index = pd.Index(game_ids, name="id")
+        return frame
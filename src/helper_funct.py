@@ -1,13 +1,12 @@
-import streamlit as st
+import numpy as np
 import pandas as pd
 import re
 import logging
 from rapidfuzz import process, fuzz
-
-#HELPER FUNCTION to improve caching and loading of a parquet file
-@st.cache_data
-def load_parquet_file(path):
-    return pd.read_parquet(path)
+from src.data_registry import get_registry
+from src.name_index import franchise_key
+from src.filters import filters_to_predicates
+from src.telemetry import span
 
 #HELPER FUNCTION --make sure user input isn't a hack-attack; limit to normal text
 def sanitize_input(user_input):
@@ -19,20 +18,31 @@ def sanitize_input(user_input):
     return sanitized.strip()
 
 
-def get_all_variants(selected_name: str, df: pd.DataFrame) -> pd.DataFrame:
+def get_all_variants(selected_name: str, df: pd.DataFrame = None, registry=None) -> pd.DataFrame:
     """
-    Return every game in the same series or with the same Game: tag as selected_name.
+    Return every game sharing a series or a Game: tag with selected_name.
     Falls back to substring matching on the base title.
+    df defaults to the shared gamedata; a custom df must keep gamedata's row labels and "id" column.
     """
-    # 1) Try series_name match
-    series = df.loc[df["name"] == selected_name, "series_name"].iat[0]
-    if series:
-        return df[df["series_name"] == series]
-
-    # 2) Try game_tag match
-    tag = df.loc[df["name"] == selected_name, "game_tag"].iat[0]
-    if tag:
-        return df[df["game_tag"] == tag]
+    registry = registry or get_registry()
+    if df is None:
+        df = registry.gamedata
+    row = registry.names.row_for_name(selected_name)
+    if row is None:
+        raise ValueError(f"Game '{selected_name}' not found in dataset.")
+
+    # series_names and game_tags are list columns that stay on disk until asked for
+    game_id = registry.gamedata.at[row, "id"]
+    lists = registry.details(np.append(df["id"].to_numpy(), game_id), ["series_names", "game_tags"])
+    selected = lists.iloc[-1]
+    lists = lists.iloc[:-1]
+
+    # 1) Try series match, then 2) Game: tag match
+    for col in ["series_names", "game_tags"]:
+        wanted = set(_as_list(selected[col]))
+        if wanted:
+            mask = lists[col].map(lambda values: not wanted.isdisjoint(_as_list(values)))
+            return df[mask.to_numpy()]
 
     # 3) Fallback to base-name substring
     base = selected_name.split(":")[0].strip()
@@ -40,6 +50,13 @@ def get_all_variants(selected_name: str, df: pd.DataFrame) -> pd.DataFrame:
     return df[mask]
 
 
+def _as_list(values) -> list:
+    """A list cell from parquet (array, list or missing) as a plain list."""
+    if values is None or (np.ndim(values) == 0 and pd.isna(values)):
+        return []
+    return list(values)
+
+
 
 
 '''
@@ -81,7 +98,7 @@ def find_closest_name(user_input, auto_select=False):
     return candidate_list
 '''
 
-def find_closest_name(user_input, auto_select=False):
+def find_closest_name(user_input, auto_select=False, registry=None):
     """
     Use fuzzy matching on the provided game name to return candidate matches.
     Prioritizes games that start with the input string, followed by fuzzy matches.
@@ -89,79 +106,46 @@ def find_closest_name(user_input, auto_select=False):
     Parameters:
       - user_input (str): The raw input from the user.
       - auto_select (bool): If True, return only the best match; otherwise, return a list of candidates.
+      - registry (DataRegistry or None): data handle; the process-wide registry by default.
 
     Returns:
-      - If auto_select is True: the best matching game name (str).
+      - If auto_select is True: the best matching game name (str), or None if nothing matched.
       - Otherwise: a list of dictionaries like {"name": ..., "score": ...}
     """
     sanitized = sanitize_input(user_input)
 
-    # Ensure game_index exists
-    if "game_index" not in st.session_state:
-        if "gamedata" not in st.session_state:
-            st.session_state["gamedata"] = load_parquet_file("data/processed/gamedata.parquet")
-            logging.info("Loaded gamedata.parquet into session_state in helper_funct")
-        gamedata_df = st.session_state["gamedata"]
-        st.session_state["game_index"] = {name: idx for idx, name in enumerate(gamedata_df['name'])}
-        logging.info("Computed game_index in helper_funct")
-
-    game_index = st.session_state["game_index"]
-    choices = list(game_index.keys())
-
-    # Prefix matches first (limit to 4)
-    prefix_matches = [name for name in choices if name.lower().startswith(sanitized.lower())][:4]
-
-    # Fuzzy matches (excluding prefix matches)
-    remaining_choices = [name for name in choices if name not in prefix_matches]
-    fuzzy_matches = process.extract(sanitized, remaining_choices, scorer=fuzz.WRatio, limit=12)
-    fuzzy_candidates = [match for match, score, _ in fuzzy_matches]
-
-    # Merge and deduplicate
-    combined = prefix_matches + fuzzy_candidates
-    seen = set()
-    unique_combined = []
-    for name in combined:
-        if name not in seen:
-            seen.add(name)
-            unique_combined.append(name)
-
-    # Final scoring for display
-    matches = process.extract(sanitized, unique_combined, scorer=fuzz.WRatio, limit=12)
+    # Prefix + fuzzy title index is built once per process and memoizes each query
+    with span("fuzzy_search"):
+        matches = (registry or get_registry()).title_search.search(sanitized)
     logging.info("Final prioritized matches: {}".format(matches))
 
     if auto_select:
-        return matches[0][0]
+        return matches[0][0] if matches else None
 
-    return [{"name": match, "score": score} for match, score, _ in matches]
+    return [{"name": match, "score": score} for match, score in matches]
 
 
 def trim_franchise_clones(df, max_per_series=3):
     """
     Limit the number of games from the same franchise in the recommendations.
-    Keeps a maximum number of entries per base title.
+    Keeps the first max_per_series entries per base title, in the frame's existing order,
+    so sort by similarity first to keep the best matches.
 
     Args:
-        df (pd.DataFrame): DataFrame with a 'name' column.
+        df (pd.DataFrame): DataFrame with a 'name' column, and ideally the precomputed
+                           'franchise_key' column added when gamedata is loaded.
         max_per_series (int): Maximum number of games to retain per series.
 
     Returns:
         pd.DataFrame: Trimmed DataFrame with franchise clones limited.
     """
-    import re
-    from collections import defaultdict
+    if "franchise_key" in df.columns:
+        keys = df["franchise_key"]
+    else:
+        keys = franchise_key(df["name"])
 
-    base_name_map = defaultdict(list)
-
-    for idx, name in df['name'].items():
-        # Extract base name: remove colon + subtitle or trailing editions
-        base = re.split(r":|–|-", name)[0].strip().lower()
-        base_name_map[base].append(idx)
-
-    keep_indices = []
-    for indices in base_name_map.values():
-        keep_indices.extend(indices[:max_per_series])  # keep first N games
-
-    return df.loc[keep_indices].copy()
+    rank_in_series = keys.groupby(keys, sort=False, dropna=False).cumcount().to_numpy()
+    return df[rank_in_series < max_per_series].copy()
 
 
 
@@ -171,12 +155,17 @@ def get_root_title(title):
 
 
 
-def filter_games(game_list, filters):
+def filter_games(game_list, filters, registry=None):
     """
     Filter the recommended games DataFrame based on various criteria.
 
+    All conditions are fused into one boolean mask over the registry's precomputed
+    column arrays, so the numeric columns are never re-parsed and the frame is only
+    sliced once.
+
     Parameters:
-      game_list (pd.DataFrame): DataFrame of recommended games.
+      game_list (pd.DataFrame): DataFrame of recommended games, indexed by gamedata row
+                                (as returned by get_rec_by_name).
       filters (dict): A dictionary with keys:
           - min_players (int or None)
           - max_players (int or None)
@@ -184,55 +173,29 @@ def filter_games(game_list, filters):
           - min_avg (float or None)
           - min_weight(float or None)
           - min_year (int or None)
+          - predicates (list or None): extra (column, op, value) specs, see src/filters.py
+      registry (DataRegistry or None): data handle; the process-wide registry by default.
 
     Returns:
       pd.DataFrame: The filtered DataFrame.
     """
-    df = game_list.copy()
-
-    # Ensure 'yearpublished' is numeric, drop NaNs, and convert to int
-    numeric_columns = ['minplayers', 'maxplayers', 'playingtime', 'average', 'averageweight', 'yearpublished']
-    for col in numeric_columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    # Apply filters if they are provided
-    if filters.get('min_players') is not None:
-        df = df[df['minplayers'] >= filters['min_players']]
-        logging.info(f"Filtered by min_players: {filters['min_players']}, remaining: {len(df)}")
-
-    if filters.get('max_players') is not None:
-        df = df[df['maxplayers'] <= filters['max_players']]
-        logging.info(f"Filtered by max_players: {filters['max_players']}, remaining: {len(df)}")
-
-    if filters.get('max_playtime') is not None:
-        df = df[df['playingtime'] <= filters['max_playtime']]
-        logging.info(f"Filtered by max_playtime: {filters['max_playtime']}, remaining: {len(df)}")
-
-    if filters.get('min_avg') is not None:
-        df = df[df['average'] >= filters['min_avg']]
-        logging.info(f"Filtered by min_avg: {filters['min_avg']}, remaining: {len(df)}")
-
-    if filters.get("min_weight") is not None:
-        df = df[df['averageweight'] >= filters['min_weight']]
-        logging.info(f"Filtered by averageweight: {filters['min_weight']}, remaining: {len(df)}")
-
-    if filters.get('min_year') is not None:
-        df = df[df['yearpublished'] >= filters['min_year']]
-        logging.info(f"Filtered by min_year: {filters['min_year']}, remaining: {len(df)}")
-
-    return df
-
-# HELPER FUNCTION: retrieve the full row of data for any game by game id
-def get_game_data(game_id: int) -> pd.Series:
+    with span("filter"):
+        predicates = filters_to_predicates(filters)
+        mask = (registry or get_registry()).filter_index.mask(predicates, rows=game_list.index.to_numpy())
+        logging.info(f"Filtered by {predicates}, remaining: {int(mask.sum())} of {len(game_list)}")
+        return game_list[mask]
+
+# HELPER FUNCTION: retrieve the row of data for any game by game id
+def get_game_data(game_id: int, columns=None, registry=None) -> pd.Series:
     """
-    Return the game data row from the gamedata DataFrame in session_state for the given game ID.
+    Return the game data row from the shared gamedata DataFrame for the given game ID.
+    That frame only holds the core columns; pass columns to get others (e.g. 'description_clean'),
+    which are then fetched from disk for this game alone.
     """
-    if "gamedata" not in st.session_state:
-        st.session_state["gamedata"] = pd.read_parquet("data/processed/gamedata.parquet")
-        logging.info("Loaded gamedata.parquet into session_state in get_game_data")
-
-    gamedata_df = st.session_state["gamedata"]
-    result = gamedata_df[gamedata_df['id'] == game_id]
-    if result.empty:
+    registry = registry or get_registry()
+    row = registry.names.row_for_id(game_id)
+    if row is None:
         raise ValueError("Game ID not found in gamedata.")
-    return result.iloc[0]
+    if columns is not None:
+        return registry.details([game_id], columns).iloc[0]
+    return registry.gamedata.iloc[row]
@@ -0,0 +1,296 @@
+"""
+Local disk cache for game thumbnails.
+
+The Home page used to hand BGG's thumbnail URLs straight to st.image, so every visitor's
+browser fetched every image from the remote host, and a slow or failing host showed up as
+slow or broken result cards. ImageCache fetches each image once, on first use, shrinks it
+to the size the cards show, and stores it on disk; afterwards the app serves the stored
+bytes itself.
+
+Images are stored content-addressed (objects/ab/<sha256>.webp), so games that share an
+image (e.g. BGG's "no image" placeholder) share one file; refs/<sha1 of url> records which
+object a URL maps to. Every read bumps the object's mtime, and once the store passes its
+size cap the least recently used objects (and the refs to them) are removed. Several app
+processes can share one directory: each keeps only its own fetch-failure backoff, counters and
+a running total of the store's size, which it refreshes from disk at least every
+RESCAN_SECONDS, so other processes' writes count towards the cap within that time.
+
+Where images come from is set by PLAYNEXT_IMAGE_ORIGIN:
+  - unset: the thumbnail URLs themselves;
+  - an http(s) base URL: the same paths on that host (a mirror or proxy);
+  - anything else: a local directory holding the images under their URL file names, a
+    stand-in for the remote host in tests and offline development.
+
+A failed fetch is logged and not retried for FAILURE_RETRY_SECONDS; callers get None and
+show the card without an image. To fill the cache ahead of traffic:
+
+    python -m src.image_cache --top 1000
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from PIL import Image
+from src.data_registry import PROJECT_ROOT, get_registry
+from src.telemetry import span
+
+# Width result cards show thumbnails at; images are stored at twice that for high-DPI screens
+THUMBNAIL_WIDTH = 100
+STORED_SIZE = (2 * THUMBNAIL_WIDTH, 2 * THUMBNAIL_WIDTH)
+
+IMAGE_DIR_ENV = "PLAYNEXT_IMAGE_DIR"
+IMAGE_ORIGIN_ENV = "PLAYNEXT_IMAGE_ORIGIN"
+IMAGE_CACHE_MB_ENV = "PLAYNEXT_IMAGE_CACHE_MB"
+
+IMAGE_DIR = os.path.join(PROJECT_ROOT, "image_cache")
+IMAGE_CACHE_MB = 256
+
+# Remote fetches: per-request timeout, largest original accepted, and how long a failed URL is skipped
+FETCH_TIMEOUT = 5
+MAX_SOURCE_BYTES = 10 * 2**20
+FAILURE_RETRY_SECONDS = 300
+
+# Eviction trims the store to this share of its cap, so it doesn't run again on the next write
+EVICT_TO = 0.9
+
+# How stale the store size a process goes by may get before it is rescanned from disk
+RESCAN_SECONDS = 30
+
+
+def fetch_url(url: str, timeout: float = FETCH_TIMEOUT) -> bytes:
+    """Download url; raises on HTTP errors, timeouts and bodies over MAX_SOURCE_BYTES."""
+    request = urllib.request.Request(url, headers={"User-Agent": "PlayNext image cache"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        body = response.read(MAX_SOURCE_BYTES + 1)
+    if len(body) > MAX_SOURCE_BYTES:
+        raise ValueError(f"Image over {MAX_SOURCE_BYTES} bytes: {url}")
+    return body
+
+
+def origin_fetcher(origin: str = None):
+    """
+    Return a fetch(url) -> bytes function for an origin (see the module docstring).
+
+    Parameters:
+      - origin (str or None): None or "" for the URLs themselves, an http(s) base URL, or a
+        local directory.
+    """
+    if not origin:
+        return fetch_url
+    if origin.startswith(("http://", "https://")):
+        base = origin.rstrip("/")
+        return lambda url: fetch_url(base + urllib.parse.urlsplit(url).path)
+
+    def fetch_local(url: str) -> bytes:
+        with open(os.path.join(origin, os.path.basename(urllib.parse.urlsplit(url).path)), "rb") as f:
+            return f.read()
+    return fetch_local
+
+
+def make_thumbnail(source: bytes, size: tuple = STORED_SIZE) -> bytes:
+    """Shrink an image to fit within size (never enlarging it) and encode it as WebP."""
+    with Image.open(io.BytesIO(source)) as image:
+        image.thumbnail(size)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+        out = io.BytesIO()
+        image.save(out, "WEBP", quality=80)
+    return out.getvalue()
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(path), suffix=".tmp", delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
+
+
+class ImageCache:
+    """
+    Content-addressed thumbnail store on disk with a size cap and LRU eviction.
+
+    get(url) returns the thumbnail's bytes, fetching and storing them on first use; it is
+    safe to call from several threads (and processes) at once.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, fetch=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._fetch = fetch or fetch_url
+        self._objects = os.path.join(directory, "objects")
+        self._refs = os.path.join(directory, "refs")
+        self._lock = threading.Lock()
+        self._failed = {}   # url -> time after which it may be fetched again
+        self._counts = {"hits": 0, "misses": 0, "failures": 0, "evictions": 0}
+        self._bytes = sum(size for _, size, _ in self._scan())
+        self._scanned_at = time.time()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects, digest[:2], f"{digest}.webp")
+
+    def _ref_path(self, url: str) -> str:
+        return os.path.join(self._refs, hashlib.sha1(url.encode()).hexdigest())
+
+    def _scan(self) -> list:
+        """(path, size, mtime) of every stored object."""
+        found = []
+        for root, _, files in os.walk(self._objects):
+            for name in files:
+                if name.endswith(".webp"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:   # evicted by another process meanwhile
+                        continue
+                    found.append((path, stat.st_size, stat.st_mtime))
+        return found
+
+    def _read(self, url: str):
+        """The stored thumbnail for url, or None; bumps it as recently used."""
+        try:
+            with open(self._ref_path(url)) as f:
+                path = self._object_path(f.read().strip())
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:   # never stored, or evicted
+            return None
+        return data
+
+    def get(self, url: str):
+        """
+        Thumbnail bytes for an image URL.
+
+        Returns:
+          - WebP bytes, or None if url is empty or the image could not be fetched.
+        """
+        if not url:
+            return None
+        data = self._read(url)
+        with self._lock:
+            if data is not None:
+                self._counts["hits"] += 1
+                return data
+            self._counts["misses"] += 1
+            if self._failed.get(url, 0) > time.time():
+                return None
+
+        try:
+            with span("image_fetch"):
+                data = make_thumbnail(self._fetch(url))
+        except Exception as e:
+            logging.warning(f"Could not fetch image {url}: {e}")
+            with self._lock:
+                self._counts["failures"] += 1
+                self._failed[url] = time.time() + FAILURE_RETRY_SECONDS
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+            with self._lock:
+                self._bytes += len(data)
+        _write_atomic(self._ref_path(url), digest.encode())
+        with self._lock:
+            self._failed.pop(url, None)
+            rescan = time.time() - self._scanned_at > RESCAN_SECONDS
+        if rescan:   # pick up what other processes wrote or evicted
+            total = sum(size for _, size, _ in self._scan())
+            with self._lock:
+                self._bytes, self._scanned_at = total, time.time()
+        with self._lock:
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict()
+        return data
+
+    def _evict(self):
+        """Remove the least recently used objects, and the refs to them, until under the cap."""
+        with self._lock:
+            objects = sorted(self._scan(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in objects)
+            removed = set()
+            for path, size, _ in objects:
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed.add(os.path.basename(path)[:-len(".webp")])
+            self._bytes, self._scanned_at = total, time.time()
+            self._counts["evictions"] += len(removed)
+
+        if removed and os.path.isdir(self._refs):
+            for name in os.listdir(self._refs):
+                ref = os.path.join(self._refs, name)
+                try:
+                    with open(ref) as f:
+                        if f.read().strip() in removed:
+                            os.remove(ref)
+                except FileNotFoundError:
+                    pass
+        logging.info(f"Image cache evicted {len(removed)} images, {total / 2**20:.1f} MB left")
+
+    def prefetch(self, urls, workers: int = 8) -> int:
+        """
+        Fetch and store every image not stored yet, workers at a time.
+
+        Returns:
+          - how many of the (distinct, non-empty) URLs were stored or fetched.
+        """
+        urls = list(dict.fromkeys(url for url in urls if isinstance(url, str) and url))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            stored = sum(data is not None for data in pool.map(self.get, urls))
+        logging.info(f"Prefetched images: {stored} of {len(urls)} stored")
+        return stored
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._counts, "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+def top_thumbnails(top_n: int, registry=None) -> list:
+    """Thumbnail URLs of the top_n best-ranked games (by BGG rank), best first."""
+    registry = registry or get_registry()
+    ranked = registry.gamedata.sort_values("BGGrank", kind="stable", na_position="last")
+    thumbnails = registry.details(ranked["id"].to_numpy()[:top_n], ["thumbnail"])["thumbnail"]
+    return [url for url in thumbnails if pd.notna(url)]
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Return the process-wide ImageCache, configured from the PLAYNEXT_IMAGE_* environment variables."""
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                max_bytes = int(float(os.environ.get(IMAGE_CACHE_MB_ENV, IMAGE_CACHE_MB)) * 2**20)
+                _image_cache = ImageCache(os.environ.get(IMAGE_DIR_ENV, IMAGE_DIR), max_bytes,
+                                          origin_fetcher(os.environ.get(IMAGE_ORIGIN_ENV)))
+    return _image_cache
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Fetch the thumbnails of the best-ranked games into the image cache")
+    parser.add_argument("--top", type=int, default=1000, help="How many games, by BGG rank")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent fetches")
+    args = parser.parse_args()
+    cache = get_image_cache()
+    cache.prefetch(top_thumbnails(args.top), args.workers)
+    print(cache.stats())
@@ -1,73 +1,62 @@
 #This code runs the interactive data visualizations part of DataViz
 
 import streamlit as st
-import pandas as pd
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
+from src.streamlit_adapters import chart_data, range_index
+from src.viz_stats import CHARTS, DATASETS, Y_COLUMN
 
-@st.cache_data
-def load_dataset(dataset_name: str) -> pd.DataFrame:
-    """Load dataset by name, with fallback loading if session cache is missing."""
-    if dataset_name == "Top 300 Games":
-        if "top300" not in st.session_state:
-            st.session_state["top300"] = pd.read_csv("data/raw/BGGtop300.csv")
-        return st.session_state["top300"]
-    else:
-        if "gamedata" not in st.session_state:
-            st.session_state["gamedata"] = pd.read_parquet("data/processed/gamedata.parquet")
-        return st.session_state["gamedata"]
+
+def density_figure(data: dict, x_label: str, title: str) -> go.Figure:
+    """Heatmap of binned chart data (see viz_stats.chart_data); empty bins are left blank."""
+    counts = np.where(data["counts"] > 0, data["counts"], np.nan)
+    x_centers = (data["x_edges"][:-1] + data["x_edges"][1:]) / 2
+    y_centers = (data["y_edges"][:-1] + data["y_edges"][1:]) / 2
+    fig = go.Figure(go.Heatmap(z=counts, x=x_centers, y=y_centers, colorscale="Blues",
+                               colorbar={"title": "Games"},
+                               hovertemplate="%{x:.3g}, %{y:.2f}: %{z} games<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title=x_label, yaxis_title=Y_COLUMN)
+    return fig
 
 
 def display_interactive_charts():
     """Display interactive visualizations (e.g., Plotly charts) on the page."""
     st.header("Interactive Data Visualizations")
+    show_chart()
 
-    # Let the user choose which dataset to use
-    dataset_option = st.selectbox("Choose Dataset:",
-                                  options=["Top 300 Games", "Full Dataset"],
-                                  key="dataset_option")
-    df = load_dataset(dataset_option)
 
-    # Ensure key columns are numeric
-    for col in ["average", "playingtime", "averageweight", "BGGrank"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
+@st.fragment
+def show_chart():
+    """
+    The dataset/chart pickers, range slider and chart. Runs as a fragment, so moving the
+    slider reruns only this part of the page.
+    """
+    # Let the user choose which dataset to use
+    dataset_option = st.selectbox("Choose Dataset:", options=DATASETS, key="dataset_option")
 
     # Let the user choose which correlation to display
+    chart_option = st.selectbox("Select chart to display:", options=list(CHARTS), key="chart_option")
+    x_col, x_label = CHARTS[chart_option]
 
-    chart_option = st.selectbox("Select chart to display:",
-                                options=["Average Game Rating vs Playtime",
-                                         "Average Game Rating vs BGG Rank",
-                                         "Average Game Rating vs Game Weight"],
-                                key="chart_option")
+    # Allow the user to adjust the x-axis range; the bounds come from the precomputed range index
+    index = range_index(dataset_option, x_col)
+    x_range = st.slider(f"Select {x_label} range:", min_value=index.x_min, max_value=index.x_max,
+                        value=(index.x_min, index.x_max))
 
-    if chart_option == "Average Game Rating vs Playtime":
-        x_col = "playingtime"
-        x_label = "Playtime (in minutes)"
-    elif chart_option == "Average Game Rating vs BGG Rank":
-        x_col = "BGGrank"
-        x_label = "Board Game Geek Ranking"
-    elif chart_option == "Average Game Rating vs Game Weight":
-        x_col = "averageweight"
-        x_label = "Game Weight (scale 1-5)"
+    # Points for small ranges, a density heatmap binned server-side for large ones
+    data = chart_data(dataset_option, x_col, x_range)
+    title = f"Correlation: Bayesian Rating vs {x_label}"
+    if data["kind"] == "scatter":
+        fig = px.scatter(
+            x=data["x"],
+            y=data["y"],
+            labels={"x": x_label, "y": Y_COLUMN},
+            title=title
+        )
     else:
-        x_col = "playingtime"
-        x_label = "Playtime (in minutes)"
-
-    # Allow the user to adjust the x-axis range
-    x_min = float(df[x_col].min())
-    x_max = float(df[x_col].max())
-    x_range = st.slider(f"Select {x_label} range:", min_value=x_min, max_value=x_max, value=(x_min, x_max))
-
-    # Filter the DataFrame based on the selected range
-    df_filtered = df[(df[x_col] >= x_range[0]) & (df[x_col] <= x_range[1])]
-
-    # Create a scatter plot using Plotly Express
-    fig = px.scatter(
-        df_filtered,
-        x=x_col,
-        y="average",
-        labels={x_col: x_label, "bayesaverage": "Bayesian Rating (1-10)"},
-        title=f"Correlation: Bayesian Rating vs {x_label}"
-    )
+        fig = density_figure(data, x_label, title)
+        st.caption(f"{data['n']:,} games in this range, shown as a density map")
 
     st.plotly_chart(fig, use_container_width=True)
 
@@ -0,0 +1,81 @@
+"""
+Name -> row and id -> row lookups over gamedata, built once when the data is loaded.
+
+Titles are matched on a normalised key (lowercase, trimmed, single spaces). Several games
+can share a title (reprints, unrelated games with the same name); all of their rows are
+kept, ordered so the best-ranked game comes first and is the one a bare title resolves to.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def normalize_title(name) -> str:
+    """Lowercase, trim and collapse internal whitespace so lookups ignore formatting."""
+    return " ".join(str(name).lower().split())
+
+
+def franchise_key(names: pd.Series) -> pd.Series:
+    """
+    Base title used to group franchise entries: the part of the name before the first
+    colon or dash, trimmed and lowercased ("Catan: Seafarers" -> "catan"). Vectorized.
+    """
+    return names.fillna("").astype(str).str.split(r":|–|-", n=1, regex=True).str[0].str.strip().str.lower()
+
+
+class NameIndex:
+    """
+    Precomputed title and id lookups for a gamedata frame.
+
+    Row numbers are positions in the frame the index was built from.
+    """
+
+    def __init__(self, gamedata: pd.DataFrame):
+        keys = gamedata["name"].fillna("").astype(str).str.lower().str.split().str.join(" ")
+
+        # Prefer ranked games (lowest BGG rank) when a title is shared, then original order
+        if "BGGrank" in gamedata.columns:
+            rank = pd.to_numeric(gamedata["BGGrank"], errors="coerce")
+            rank = rank.where(rank > 0, np.inf).fillna(np.inf).to_numpy()
+        else:
+            rank = np.zeros(len(gamedata))
+
+        ordered = pd.DataFrame({"key": keys.to_numpy(), "rank": rank, "row": np.arange(len(gamedata))})
+        ordered = ordered.sort_values(["key", "rank", "row"], kind="stable")
+        self._rows = {key: tuple(rows) for key, rows in ordered.groupby("key", sort=False)["row"]}
+        self._rows.pop("", None)
+
+        # Display title for each distinct key, taken from its preferred row, best-ranked first
+        names = gamedata["name"].to_numpy()
+        preferred = sorted((rows[0] for rows in self._rows.values()), key=lambda row: (rank[row], row))
+        self.titles = [names[row] for row in preferred]
+
+        ids = gamedata["id"].to_numpy()
+        first = ~pd.Series(ids).duplicated().to_numpy()
+        self._id_index = pd.Index(ids[first])
+        self._id_rows = np.flatnonzero(first)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, name):
+        return normalize_title(name) in self._rows
+
+    def rows_for_name(self, name: str) -> tuple:
+        """All rows whose title matches name, preferred game first; empty if none."""
+        return self._rows.get(normalize_title(name), ())
+
+    def row_for_name(self, name: str):
+        """The preferred row for a title, or None if the title is unknown."""
+        rows = self.rows_for_name(name)
+        return rows[0] if rows else None
+
+    def rows_for_ids(self, game_ids) -> np.ndarray:
+        """Vectorized id -> row lookup; unknown ids map to -1."""
+        pos = self._id_index.get_indexer(np.asarray(game_ids))
+        return np.where(pos >= 0, self._id_rows[pos], -1)
+
+    def row_for_id(self, game_id):
+        """The row for a single game id, or None if the id is unknown."""
+        row = self.rows_for_ids([game_id])[0]
+        return None if row < 0 else int(row)
@@ -1,11 +1,80 @@
-import streamlit as st
+import numpy as np
 import pandas as pd
 import logging
-from src.helper_funct import trim_franchise_clones
+from src.helper_funct import trim_franchise_clones, filter_games
+from src.filters import filters_to_predicates
+from src.features import top_k_positions
+from src.data_registry import FEATURES_BUILD_COMMAND, get_registry
+from src.cache import freeze
+from src.telemetry import span
+
+# Columns returned with every recommendation table (all loaded with the registry)
+RESULT_COLUMNS = [
+    'name', 'yearpublished', 'BGGrank', 'categories_str', 'mechanics_str',
+    'minplayers', 'maxplayers', 'playingtime', 'average', 'bayesaverage',
+    'averageweight', 'similarity'
+]
+
+# Heavy columns shown when a result is rendered; fetched by id with attach_details()
+DETAIL_COLUMNS = [
+    'description_clean', 'thumbnail', 'image', 'category_list', 'mech_list', 'tags', 'tags_str'
+]
+
+
+def resolve_game_id(registry, game_name: str) -> int:
+    """
+    Map a title (already fuzzy matched and sanitized) to its game id via the registry's name index.
+    Shared titles resolve to the best-ranked game.
+    """
+    row = registry.names.row_for_name(game_name)
+    if row is None:
+        raise ValueError(f"Game '{game_name}' not found in dataset.")
+    return registry.gamedata["id"].iat[row]
+
+
+def build_recommendation_table(registry, similar_ids, scores) -> pd.DataFrame:
+    """
+    Attach game metadata to neighbour ids and scores, trim franchise clones and
+    return the standard recommendation columns, most similar first.
+
+    The result keeps gamedata's row labels as its index.
+    """
+    # Look up metadata rows by id instead of merging against the full table
+    with span("merge"):
+        rows = registry.names.rows_for_ids(similar_ids)
+        keep = (rows >= 0) & ~pd.Index(rows).duplicated()   # unknown ids dropped, each game listed once
+        merged = registry.gamedata.iloc[rows[keep]].copy()
+        merged["similarity"] = scores[keep]
+        merged = merged.sort_values(by="similarity", ascending=False, kind="stable")
+
+    # Reduce the number of "clones" to 4, keeping the most similar of each franchise
+    with span("trim_clones"):
+        recommendations = trim_franchise_clones(merged, max_per_series=4)
+
+    # Filter and return selected columns
+    return recommendations[RESULT_COLUMNS]
+
+
+def attach_details(recs: pd.DataFrame, columns=DETAIL_COLUMNS, registry=None) -> pd.DataFrame:
+    """
+    Add the heavy detail columns to the rows of a recommendation table that will be shown.
+    Only those rows are read from disk, so slice the table (e.g. .head(25)) before calling.
+
+    Parameters:
+    - recs (pd.DataFrame): a recommendation table, indexed by gamedata row.
+    - columns (list): detail columns to add.
+    - registry (DataRegistry or None): data handle; the process-wide registry by default.
+    """
+    registry = registry or get_registry()
+    with span("details_fetch"):
+        game_ids = registry.gamedata["id"].to_numpy()[recs.index.to_numpy()]
+        details = registry.details(game_ids, columns).set_axis(recs.index)
+        return pd.concat([recs, details], axis=1)
+
 
 # FUNCTION: Find "similar" games given a user input game, applying various filters
-@st.cache_data(show_spinner="Computing recommendations...")
-def get_rec_by_name(game_name: str, match_mode: str = "mech", auto_select: bool = False) -> pd.DataFrame:
+def get_rec_by_name(game_name: str, match_mode: str = "mech", auto_select: bool = False,
+                    registry=None) -> pd.DataFrame:
     """
     Given a board game name and a match mode, return a DataFrame of recommended games.
 
@@ -13,53 +82,275 @@ def get_rec_by_name(game_name: str, match_mode: str = "mech", auto_select: bool
     - game_name (str): The game title to base recommendations on.
     - match_mode (str): One of ['mech', 'cat', 'mixed'], selects which similarity matrix to use.
     - auto_select (bool): Reserved for future use / debugging.
+    - registry (DataRegistry or None): data handle; the process-wide registry by default.
 
     Returns:
     - pd.DataFrame: A filtered, sorted recommendation table.
     """
 
-    # Load main game data from session (assumes it was preloaded elsewhere)
-    df = st.session_state["gamedata"]
+    # Shared, read-only game data for this process
+    registry = registry or get_registry()
+    game_id = resolve_game_id(registry, game_name)
 
-    #identify related game from user input (already fuzzy matched and sanitized)
-    # Normalize title for matching
-    df["name_lower"] = df["name"].str.lower().str.strip()
-    game_name_lower = game_name.lower().strip()
+    # Slice this game's neighbours out of the pre-indexed top-50 store for the match mode.
+    # The store already holds compact id/score rows, so this path needs no result cache.
+    with span("neighbour_lookup"):
+        similar_ids, scores = registry.similarity_store(match_mode).neighbours(game_id)
+    return build_recommendation_table(registry, similar_ids, scores)
 
-    # Find matching game row (assume exact match from fuzzy logic earlier)
-    game_row = df[df["name_lower"] == game_name_lower]
-    if game_row.empty:
-        raise ValueError(f"Game '{game_name}' not found in dataset.")
 
-    game_id = game_row["id"].values[0]
+# FUNCTION: Find "similar" games with a custom mix of mechanics, categories and tags
+def get_rec_by_weights(game_name: str, weights: dict, k: int = 50, registry=None) -> pd.DataFrame:
+    """
+    Like get_rec_by_name, but blends the feature components with arbitrary weights at query time
+    instead of reading one of the fixed top-50 tables.
 
-    # Load the correct top-50 parquet based on match mode
-    recipe_paths = {
-        "mech": "data/processed/top50_mech_heavy.parquet",
-        "cat": "data/processed/top50_cat_heavy.parquet",
-        "mixed": "data/processed/top50_mixed.parquet"
-    }
-    if match_mode not in recipe_paths:
-        raise ValueError(f"Invalid match mode: {match_mode}")
+    Parameters:
+    - game_name (str): The game title to base recommendations on.
+    - weights (dict): Component weights, e.g. {"mechanics": 0.7, "categories": 0.3}.
+      Keys must be 'mechanics', 'categories' or 'tags'; weights are rescaled to sum to 1.
+    - k (int): Number of neighbours to score before clone trimming.
+    - registry (DataRegistry or None): data handle; the process-wide registry by default.
 
-    sim_df = pd.read_parquet(recipe_paths[match_mode])
+    Returns:
+    - pd.DataFrame: Same columns as get_rec_by_name, sorted by blended similarity.
+    """
+    registry = registry or get_registry()
+    game_id = resolve_game_id(registry, game_name)
 
-    # Filter to only rows where 'source_game_id' matches the game we're recommending from
-    matches = sim_df[sim_df["base_game_id"] == game_id]
+    def rank():
+        features = registry.feature_matrices()
+        position = features.positions([game_id])[0]
+        if position < 0:
+            raise ValueError(f"Game '{game_name}' has no feature vector; rebuild features.npz.")
 
-    # Join similarity scores with full game metadata
-    merged = matches.merge(df, left_on="similar_game_id", right_on="id", how="inner")
+        # Score the game against the whole catalog with one sparse product per component
+        scores = features.blended_scores(position, weights)
+        top, top_scores = top_k_positions(scores, k, exclude=position)
+        return features.ids[top], top_scores
 
-    # Rename column
-    merged["similarity"] = merged["similarity_score"]  # rename for legacy compatibility
+    similar_ids, scores = registry.results.get_or_compute(("weights", game_id, freeze(weights), k), rank)
+    return build_recommendation_table(registry, similar_ids, scores)
 
-    # Reduce the number of "clones" to 4
-    recommendations = trim_franchise_clones(merged, max_per_series=4)
 
-    # Filter and return selected columns
-    return recommendations[[
-        'name', 'description_clean', 'thumbnail', 'image', 'yearpublished',
-        'category_list', 'mech_list', 'tags', 'BGGrank', 'tags_str',
-        'categories_str', 'mechanics_str', 'minplayers', 'maxplayers', 'playingtime',
-        'average', 'bayesaverage', 'averageweight', 'similarity'
-    ]].sort_values(by="similarity", ascending=False)
+# FUNCTION: Recommendations that satisfy the sidebar filters, without starving the list
+def get_rec_filtered(game_name: str, match_mode: str, filters: dict, n: int = 25, registry=None) -> pd.DataFrame:
+    """
+    Return up to n recommendations that pass the filters.
+
+    The stored top-50 list is tried first. When the filters leave fewer than n games, those
+    stored matches are kept, in their stored order, and the list is filled up from a search
+    run on demand against the rest of the filter-eligible catalog (blended with the mode's
+    recipe weights). Without the feature matrices (features.npz) there is nothing to widen
+    with, and fewer than n games come back.
+
+    Parameters:
+    - game_name (str): The game title to base recommendations on.
+    - match_mode (str): One of ['mech', 'cat', 'mixed'].
+    - filters (dict): Sidebar filters, as accepted by filter_games.
+    - n (int): Number of recommendations wanted.
+    - registry (DataRegistry or None): data handle; the process-wide registry by default.
+
+    Returns:
+    - pd.DataFrame: Same columns as get_rec_by_name; stored matches first, then widened ones.
+    """
+    registry = registry or get_registry()
+    similar_ids, scores = rank_filtered(game_name, match_mode, filters, n, registry)
+    recs = build_recommendation_table(registry, similar_ids, scores)
+    # The ranking puts the stored matches first, so keep its order rather than sorting by score
+    return recs.loc[pd.Index(registry.names.rows_for_ids(similar_ids)).intersection(recs.index, sort=False)]
+
+
+def rank_filtered(game_name: str, match_mode: str, filters: dict, n: int = 25, registry=None) -> tuple:
+    """
+    The ranking behind get_rec_filtered, as (game_ids, scores) arrays, most similar first
+    (clones already trimmed). This is the form kept in the result cache, so a caller that
+    only shows part of the list can look up just those rows instead of building the table.
+    """
+    registry = registry or get_registry()
+    with span("recommend"):
+        game_id = resolve_game_id(registry, game_name)
+        key = ("filtered", game_id, match_mode, n, freeze(filters))
+        return registry.results.get_or_compute(
+            key, lambda: _ranking(registry, _filtered_recs(registry, game_name, game_id, match_mode, filters, n)))
+
+
+def _ranking(registry, recs: pd.DataFrame) -> tuple:
+    """The (game_ids, scores) behind a recommendation table, as kept in the result cache."""
+    return registry.gamedata["id"].to_numpy()[recs.index.to_numpy()], recs["similarity"].to_numpy()
+
+
+def _filtered_recs(registry, game_name: str, game_id, match_mode: str, filters: dict, n: int) -> pd.DataFrame:
+    """The uncached body of get_rec_filtered."""
+    recs = filter_games(get_rec_by_name(game_name, match_mode=match_mode, registry=registry), filters, registry)
+    if len(recs) >= n:
+        return recs.head(n)
+
+    # Widening the search needs the feature matrices (built by the warm-up or the pipeline);
+    # without them the stored matches are the answer
+    if not registry.has_feature_matrices():
+        logging.warning(f"Feature matrices not built ({FEATURES_BUILD_COMMAND}); "
+                        f"returning {len(recs)} stored matches for '{game_name}'")
+        return recs
+
+    features = registry.feature_matrices()
+    position = features.positions([game_id])[0]
+    if position < 0:
+        logging.warning(f"No feature vector for '{game_name}'; returning {len(recs)} stored matches")
+        return recs
+
+    # Score against the whole catalog, then keep only rows that pass the filters and are not
+    # already listed; the stored matches keep their place at the top, in their stored order
+    feature_rows = registry.catalog_feature_rows()
+    eligible = registry.filter_index.mask(filters_to_predicates(filters)) & (feature_rows >= 0)
+    eligible[registry.names.row_for_id(game_id)] = False
+    eligible[recs.index.to_numpy()] = False
+
+    blended = features.blended_scores(position, registry.recipe_weights(match_mode))
+    scores = np.full(len(feature_rows), -np.inf, dtype=np.float32)
+    scores[eligible] = blended[feature_rows[eligible]]
+
+    # Widen the candidate pool until clone trimming still leaves n games (or we run out)
+    n_eligible = int(eligible.sum())
+    if not n_eligible:
+        return recs
+    k = 4 * n
+    while True:
+        top, top_scores = top_k_positions(scores, min(k, n_eligible))
+        widened = build_recommendation_table(registry, registry.gamedata["id"].to_numpy()[top], top_scores)
+        merged = trim_franchise_clones(pd.concat([recs, widened]), max_per_series=4)
+        if len(merged) >= n or k >= n_eligible:
+            break
+        k *= 4
+
+    # Every stored match that passed the filters must survive the widening
+    dropped = recs.index.difference(merged.index)
+    if len(dropped):
+        raise RuntimeError(f"Filtered search for '{game_name}' dropped {len(dropped)} stored matches")
+    logging.info(f"Filtered search for '{game_name}' kept {len(recs)} stored matches and scored "
+                 f"{n_eligible} eligible games, k={k}")
+    return merged.head(n)
+
+
+# Aggregation methods for basket recommendations
+BASKET_METHODS = ("sum", "max", "rrf")
+
+# Rank offset for reciprocal-rank fusion; 60 is the customary constant
+RRF_K = 60
+
+
+def _scatter_scores(rows, ranks, scores, n_rows: int, method: str) -> np.ndarray:
+    """
+    Fold many seeds' neighbour lists into one score per gamedata row in a single scatter.
+    Rows that no seed points at get 0.
+    """
+    if method == "sum":
+        return np.bincount(rows, weights=scores, minlength=n_rows)
+    if method == "rrf":
+        return np.bincount(rows, weights=1.0 / (RRF_K + ranks + 1), minlength=n_rows)
+    if method == "max":
+        out = np.zeros(n_rows)
+        np.maximum.at(out, rows, scores)
+        return out
+    raise ValueError(f"Invalid basket method: {method} (expected one of {BASKET_METHODS})")
+
+
+# FUNCTION: Recommendations from a basket of liked (and optionally disliked) games
+def get_rec_by_basket(liked: list, disliked: list = (), match_mode: str = "mixed", method: str = "sum",
+                      n: int = 25, registry=None) -> pd.DataFrame:
+    """
+    Aggregate the stored neighbour lists of several seed games into one ranking.
+
+    All seeds' neighbours are gathered from the similarity store in one call and
+    scatter-added into a per-game score, so the cost grows with the number of neighbours,
+    not with repeated single-game lookups. Disliked games' neighbours are aggregated the
+    same way and subtracted. Seed games themselves are never recommended.
+
+    Parameters:
+    - liked (list[str]): Titles of games the user likes.
+    - disliked (list[str]): Titles of games the user dislikes.
+    - match_mode (str): One of ['mech', 'cat', 'mixed'].
+    - method (str): 'sum' (total similarity), 'max' (best single similarity) or
+      'rrf' (reciprocal-rank fusion, 1 / (60 + rank) summed over seeds).
+    - n (int): Number of recommendations wanted (before clone trimming).
+    - registry (DataRegistry or None): data handle; the process-wide registry by default.
+
+    Returns:
+    - pd.DataFrame: Same columns as get_rec_by_name; 'similarity' holds the aggregated score.
+    """
+    registry = registry or get_registry()
+    if not liked:
+        raise ValueError("At least one liked game is required.")
+    key = ("basket", freeze(liked), freeze(disliked), match_mode, method, n)
+    similar_ids, scores = registry.results.get_or_compute(
+        key, lambda: _basket_ranking(registry, liked, disliked, match_mode, method, n))
+    return build_recommendation_table(registry, similar_ids, scores).head(n)
+
+
+def _basket_ranking(registry, liked, disliked, match_mode: str, method: str, n: int) -> tuple:
+    """The uncached body of get_rec_by_basket: the top 4n (game_ids, scores) before clone trimming."""
+    game_ids = registry.gamedata["id"].to_numpy()
+    store = registry.similarity_store(match_mode)
+    n_rows = len(game_ids)
+
+    def seed_rows(titles):
+        rows = np.array([registry.names.row_for_name(t) if t in registry.names else -1 for t in titles],
+                        dtype=np.int64)
+        missing = [t for t, row in zip(titles, rows) if row < 0]
+        if missing:
+            raise ValueError(f"Games not found in dataset: {missing}")
+        return rows
+
+    def aggregate(rows):
+        _, ranks, similar, scores = store.neighbours_many(game_ids[rows])
+        neighbour_rows = registry.names.rows_for_ids(similar)
+        known = neighbour_rows >= 0
+        return _scatter_scores(neighbour_rows[known], ranks[known], scores[known], n_rows, method)
+
+    liked_rows = seed_rows(list(liked))
+    total = aggregate(liked_rows)
+    touched = total > 0
+
+    excluded = liked_rows
+    if disliked:
+        disliked_rows = seed_rows(list(disliked))
+        total = total - aggregate(disliked_rows)
+        excluded = np.concatenate([liked_rows, disliked_rows])
+
+    # Only games some liked seed points at are candidates; seeds never recommend themselves
+    total = np.where(touched, total, -np.inf)
+    top, top_scores = top_k_positions(total, 4 * n, exclude=excluded)
+    return game_ids[top], top_scores
+
+
+# FUNCTION: Recommendations for a profile of mechanics/categories/tags instead of a seed game
+def get_rec_by_profile(profile: dict, match_mode: str = "mixed", n: int = 25, n_probe: int = None,
+                       registry=None) -> pd.DataFrame:
+    """
+    Score an ad-hoc feature profile against the catalog through the ANN index.
+
+    Parameters:
+    - profile (dict): tokens per component, e.g. {"mechanics": ["Deck_Building"],
+      "categories": "Fantasy Adventure"}. Tokens use the tokenized (underscored) spelling;
+      unknown tokens are ignored.
+    - match_mode (str): One of ['mech', 'cat', 'mixed'], selects the recipe weights.
+    - n (int): Number of recommendations wanted (before clone trimming).
+    - n_probe (int or None): ANN lists scanned; more lists trade speed for recall. The index's
+      calibrated default (see src/ann_index.py) if None.
+    - registry (DataRegistry or None): data handle; the process-wide registry by default.
+
+    Returns:
+    - pd.DataFrame: Same columns as get_rec_by_name, sorted by blended similarity.
+    """
+    registry = registry or get_registry()
+
+    def rank():
+        index = registry.ann_index(match_mode)
+        vector = registry.feature_matrices().blend_tokens(profile, index.weights)
+        if vector.nnz == 0:
+            raise ValueError("None of the profile's tokens are known; nothing to match against.")
+        return index.query(vector, k=4 * n, n_probe=n_probe)
+
+    key = ("profile", freeze(profile), match_mode, n, n_probe)
+    similar_ids, scores = registry.results.get_or_compute(key, rank)
+    return build_recommendation_table(registry, similar_ids, scores).head(n)
@@ -0,0 +1,69 @@
+"""
+Result cards: the part of a recommendation the Home page renders that does not depend on
+the search.
+
+A card is a game's thumbnail URL plus two Markdown blocks: its stats (year, player count,
+playtime, rating, weight) and its description. The description and thumbnail are detail columns
+read from disk (see src/game_details.py), so cards are built for all the games a render
+needs in one fetch and then kept in the registry's card cache; later reruns, pages and
+searches that show the same game reuse the formatted card instead of reading and
+formatting it again.
+"""
+
+import pandas as pd
+from src.data_registry import get_registry
+
+# Results per page on the Home page (the warm-up builds the cards of the first page)
+RESULTS_PAGE_SIZE = 10
+
+# gamedata columns a card is built from
+CARD_COLUMNS = [
+    "yearpublished", "minplayers", "maxplayers", "playingtime", "average", "averageweight",
+    "description_clean", "thumbnail",
+]
+
+
+def _or_na(value, fmt: str = "{}"):
+    return fmt.format(value) if pd.notna(value) else "N/A"
+
+
+def format_card(row) -> dict:
+    """
+    Build a card from one row holding CARD_COLUMNS.
+
+    Returns:
+      - dict with "stats" and "description" (Markdown str) and "thumbnail" (URL or None).
+    """
+    year = int(row["yearpublished"]) if pd.notna(row["yearpublished"]) else "N/A"
+    lines = [
+        f"**Year Published:** {year}",
+        f"**Min / Max Players:** {_or_na(row['minplayers'])} - {_or_na(row['maxplayers'])}",
+        f"**Expected Playtime:** {_or_na(row['playingtime'])} minutes",
+        f"**Average User Rating (out of 10):** {_or_na(row['average'], '{:.2f}')}",
+        f"**Complexity Weight (out of 5):** {_or_na(row['averageweight'], '{:.2f}')}",
+    ]
+    # Two trailing spaces make each field its own line within one Markdown element
+    return {"stats": "  \n".join(lines),
+            "description": f"**Description:** {_or_na(row['description_clean'])}",
+            "thumbnail": row["thumbnail"] if pd.notna(row["thumbnail"]) else None}
+
+
+def result_cards(game_ids, registry=None) -> list:
+    """
+    Cards for the given games, in order, from the registry's card cache; the missing ones
+    are built from a single details fetch.
+
+    Parameters:
+      - game_ids (array-like): games to show.
+      - registry (DataRegistry or None): data handle; the process-wide registry by default.
+
+    Returns:
+      - list of card dicts (see format_card).
+    """
+    registry = registry or get_registry()
+
+    def build(missing):
+        rows = registry.details(missing, CARD_COLUMNS).to_dict("records")
+        return {game_id: format_card(row) for game_id, row in zip(missing, rows)}
+
+    return registry.cards.get_many([int(game_id) for game_id in game_ids], build)
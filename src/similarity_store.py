@@ -0,0 +1,216 @@
+"""
+Pre-indexed similarity store for the top-K neighbour tables.
+
+The top50_*.parquet files are long tables of (base_game_id, similar_game_id, similarity_score).
+Rather than scanning the whole table with a boolean mask for every lookup, the store keeps
+them as two dense (n_games x K) arrays, best match first per row: the neighbours' row
+numbers as int32 and their scores as float16, with sorted game ids to map ids to rows.
+Fetching one game's neighbours is a binary search plus two row slices.
+
+The same arrays can be written as .npy files (write_compact, data/compact_topk.py) and memory-mapped at
+startup, which skips parsing the parquet entirely and lets the OS share the pages between
+processes.
+
+Incremental updates (data/update_topk.py) are written as delta tables next to the base
+table; they hold complete replacement lists and are layered on top at load time.
+"""
+
+import glob
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+_COLUMNS = ["base_game_id", "similar_game_id", "similarity_score"]
+
+# Array files of a compact store, besides meta.json
+_ARRAYS = ["ids", "neighbour_rows", "scores", "counts"]
+
+
+def delta_paths(path: str) -> list:
+    """
+    Delta tables written by data/update_topk.py for a top-K parquet, oldest first.
+    top50_mixed.parquet has deltas top50_mixed.delta-0001.parquet, top50_mixed.delta-0002.parquet, ...
+    """
+    stem, _ = os.path.splitext(path)
+    return sorted(glob.glob(f"{glob.escape(stem)}.delta-*.parquet"))
+
+
+def compact_path(path: str) -> str:
+    """Directory holding the compact arrays of a top-K parquet: top50_mixed.compact/."""
+    stem, _ = os.path.splitext(path)
+    return f"{stem}.compact"
+
+
+def source_signature(path: str) -> dict:
+    """Name, size and mtime of a top-K parquet and its deltas, to tell whether a compact copy is stale."""
+    return {os.path.basename(p): [os.path.getsize(p), os.stat(p).st_mtime_ns] for p in [path, *delta_paths(path)]}
+
+
+def merge_deltas(base: pd.DataFrame, deltas: list) -> pd.DataFrame:
+    """
+    Layer delta tables over a base neighbour table. A delta holds complete lists, so every
+    base game keeps only the rows of the newest table that mentions it.
+    """
+    if not deltas:
+        return base
+    frames = [frame.assign(version=version) for version, frame in enumerate([base, *deltas])]
+    merged = pd.concat(frames, ignore_index=True)
+    newest = merged.groupby("base_game_id")["version"].transform("max")
+    return merged.loc[merged["version"] == newest, _COLUMNS].reset_index(drop=True)
+
+
+def write_compact(path: str, store: "SimilarityStore" = None):
+    """
+    Write the compact arrays of a top-K parquet (plus its deltas) next to it.
+    Pass the store when it is already in memory to skip re-reading the tables.
+    """
+    store = store or SimilarityStore.from_parquet(path)
+    directory = compact_path(path)
+    store.save_compact(directory, source_signature(path))
+    logging.info(f"Wrote compact neighbour lists for {len(store)} games to {directory}")
+
+
+class SimilarityStore:
+    """
+    Neighbour lists for one recommendation mode.
+
+    Row i belongs to game ids[i] (ids are sorted). Its neighbours are ids[neighbour_rows[i, :c]]
+    with scores scores[i, :c], best first, where c = counts[i]; the rest of the row is
+    padding (-1 and 0).
+    """
+
+    def __init__(self, ids, neighbour_rows, scores, counts):
+        self.ids = ids
+        self.neighbour_rows = neighbour_rows
+        self.scores = scores
+        self.counts = counts
+        self.base_ids = ids[self.counts > 0]
+
+    @classmethod
+    def from_frame(cls, sim_df: pd.DataFrame, score_dtype=np.float16) -> "SimilarityStore":
+        """
+        Build a store from a long-format neighbour table.
+
+        Parameters:
+          - sim_df (pd.DataFrame): columns base_game_id, similar_game_id, similarity_score.
+          - score_dtype: float16 (3 significant digits, plenty for ranking and display) by
+            default; pass np.float32 where scores feed further arithmetic.
+        """
+        base = sim_df["base_game_id"].to_numpy()
+        similar = sim_df["similar_game_id"].to_numpy()
+        score = sim_df["similarity_score"].to_numpy()
+
+        # Sort by base game, then by descending score within each base game; the order is
+        # fixed here at full precision, so quantizing the scores cannot reorder a list
+        order = np.lexsort((-score, base))
+        base, similar, score = base[order], similar[order], score[order]
+
+        # A pair listed twice keeps its best score (the tables as shipped repeat ~1% of pairs)
+        first = ~pd.DataFrame({"base": base, "similar": similar}).duplicated().to_numpy()
+        base, similar, score = base[first], similar[first], score[first]
+
+        ids = np.union1d(base, similar)
+        rows = np.searchsorted(ids, base)
+        ranks = np.arange(len(base)) - np.searchsorted(base, base, side="left")
+        k = int(ranks.max()) + 1 if len(ranks) else 0
+
+        neighbour_rows = np.full((len(ids), k), -1, dtype=np.int32)
+        scores = np.zeros((len(ids), k), dtype=score_dtype)
+        neighbour_rows[rows, ranks] = np.searchsorted(ids, similar)
+        scores[rows, ranks] = score
+        return cls(ids, neighbour_rows, scores, np.bincount(rows, minlength=len(ids)).astype(np.int32))
+
+    @classmethod
+    def from_parquet(cls, path: str, score_dtype=np.float16) -> "SimilarityStore":
+        """
+        Read a top-K parquet file once, apply any delta tables written since it was built,
+        and index it by base_game_id.
+        """
+        deltas = [pd.read_parquet(p, columns=_COLUMNS) for p in delta_paths(path)]
+        sim_df = merge_deltas(pd.read_parquet(path, columns=_COLUMNS), deltas)
+        store = cls.from_frame(sim_df, score_dtype)
+        logging.info(f"Indexed {len(sim_df)} neighbour rows for {len(store)} games from {path}"
+                     + (f" (+{len(deltas)} deltas)" if deltas else ""))
+        return store
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarityStore":
+        """
+        The store for a top-K parquet: its compact arrays when they are current (memory-mapped,
+        no parsing), otherwise the parquet and its deltas.
+        """
+        directory = compact_path(path)
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                current = json.load(f)["sources"] == source_signature(path)
+        except (OSError, KeyError, json.JSONDecodeError):
+            current = False
+        if current:
+            return cls.from_compact(directory)
+        if os.path.isdir(directory):
+            logging.warning(f"{directory} is older than {path} or its deltas; "
+                            f"rebuild it with python -m data.compact_topk")
+        return cls.from_parquet(path)
+
+    def save_compact(self, directory: str, sources: dict):
+        """Write the arrays as .npy files plus meta.json recording the tables they came from."""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"k": self.neighbour_rows.shape[1], "games": len(self), "sources": sources}, f, indent=2)
+
+    @classmethod
+    def from_compact(cls, directory: str) -> "SimilarityStore":
+        """Memory-map arrays written by save_compact()."""
+        # asarray drops the np.memmap subclass (same buffer), which is slow to slice
+        arrays = {name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r"))
+                  for name in _ARRAYS}
+        store = cls(**arrays)
+        logging.info(f"Mapped neighbour lists for {len(store)} games from {directory}")
+        return store
+
+    def __len__(self):
+        return len(self.base_ids)
+
+    def _rows(self, game_ids) -> np.ndarray:
+        """Row of each game id, or -1 for ids without neighbours."""
+        game_ids = np.asarray(game_ids)
+        if not len(self.ids):
+            return np.full(game_ids.shape, -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, game_ids), len(self.ids) - 1)
+        found = (self.ids[rows] == game_ids) & (self.counts[rows] > 0)
+        return np.where(found, rows, -1)
+
+    def __contains__(self, game_id):
+        return bool(self._rows([game_id])[0] >= 0)
+
+    def neighbours(self, game_id: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (similar_game_ids, similarity_scores) for a game, best match first.
+        Unknown games return two empty arrays.
+        """
+        row = self._rows([game_id])[0]
+        if row < 0:
+            return self.ids[:0], np.empty(0, dtype=np.float32)
+        count = self.counts[row]
+        return self.ids[self.neighbour_rows[row, :count]], self.scores[row, :count].astype(np.float32)
+
+    def neighbours_many(self, game_ids) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vectorized lookup for many base games at once.
+
+        Returns (base_game_ids, ranks, similar_game_ids, similarity_scores) as flat aligned
+        arrays, one entry per neighbour, in input order and best match first per base game.
+        Unknown ids contribute no rows.
+        """
+        game_ids = np.asarray(game_ids)
+        rows = self._rows(game_ids)
+        found = rows >= 0
+        block = self.neighbour_rows[rows[found]]
+        # Rows are filled from the left, so the column of each valid entry is its rank
+        which, ranks = np.nonzero(block >= 0)
+        return (game_ids[found][which], ranks, self.ids[block[which, ranks]],
+                self.scores[rows[found]][which, ranks].astype(np.float32))
@@ -0,0 +1,52 @@
+"""
+Thin Streamlit adapters over the headless engine.
+
+The engine modules (data_registry, recommendation, helper_funct, ...) never import
+streamlit, so batch jobs, tests and benchmarks can use them without a UI runtime. The
+pages go through these wrappers instead, which only add the Streamlit-specific parts:
+spinners while data loads or results compute.
+
+get_registry() is wrapped in st.cache_resource only so the loading spinner shows once. It
+returns the data_registry singleton, so "Clear cache" in the Streamlit menu does not reload
+the data: it gets the same registry back. Restart the process to pick up new data files.
+"""
+
+import streamlit as st
+from src import data_registry, helper_funct, image_cache, recommendation, result_cards as cards, viz_stats
+
+
+@st.cache_resource(show_spinner="Loading game data...")
+def get_registry() -> data_registry.DataRegistry:
+    """The process-wide registry, loaded behind a spinner on first use."""
+    return data_registry.get_registry()
+
+
+def find_closest_name(user_input, auto_select=False):
+    """UI wrapper for helper_funct.find_closest_name."""
+    return helper_funct.find_closest_name(user_input, auto_select=auto_select, registry=get_registry())
+
+
+def rank_filtered(game_name: str, match_mode: str, filters: dict, n: int = 25):
+    """UI wrapper for recommendation.rank_filtered."""
+    with st.spinner("Computing recommendations..."):
+        return recommendation.rank_filtered(game_name, match_mode, filters, n, registry=get_registry())
+
+
+def result_cards(game_ids):
+    """UI wrapper for result_cards.result_cards."""
+    return cards.result_cards(game_ids, registry=get_registry())
+
+
+def thumbnail(url):
+    """UI wrapper for image_cache: a thumbnail's bytes from the local image cache, or None."""
+    return image_cache.get_image_cache().get(url)
+
+
+def range_index(dataset: str, x_col: str):
+    """UI wrapper for viz_stats.range_index."""
+    return viz_stats.range_index(dataset, x_col, registry=get_registry())
+
+
+def chart_data(dataset: str, x_col: str, x_range: tuple):
+    """UI wrapper for viz_stats.chart_data."""
+    return viz_stats.chart_data(dataset, x_col, x_range, registry=get_registry())
@@ -0,0 +1,257 @@
+"""
+Lightweight span timing and sampled profiling for the recommendation flow.
+
+span("name") times a block and adds it to a per-name histogram that lives for the life of
+the process; the engine wraps the steps a search goes through (fuzzy search, neighbour
+lookup, merge, clone trimming, filtering, detail fetches) and the Home page wraps its
+rendering. The cost is two clock reads and a short lock, so spans stay on in production.
+
+request("name") marks one unit of work, e.g. a Streamlit rerun of the Home page. The spans
+inside it are also collected as a trace (nested spans count in full in each, so a breakdown
+can add up to more than the request); requests slower than PLAYNEXT_SLOW_MS (500 by
+default) are logged with that breakdown and the most recent ones kept for metrics_json().
+
+Profiling is sampled: with PLAYNEXT_PROFILE_RATE set (0-1, off by default) that fraction of
+requests also run under cProfile, and with PLAYNEXT_PROFILE_MEMORY=1 under tracemalloc as
+well. Captures are written to PLAYNEXT_PROFILE_DIR (profiles/ by default), one at a time;
+a request that arrives while another is being profiled is just timed.
+
+Aggregated metrics are exported as Prometheus text (prometheus_text()) or a dict for JSON
+(metrics_json()); the readiness server in src/warmup.py serves them on /metrics and
+/metrics.json. To merge the sampled cProfile captures into one report:
+
+    python -m src.telemetry profiles/ --top 30
+"""
+
+import argparse
+import bisect
+import contextvars
+import cProfile
+import itertools
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds, in seconds (Prometheus "le" labels)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# How many slow request traces metrics_json() keeps
+SLOW_TRACES_KEPT = 20
+
+SLOW_MS_ENV = "PLAYNEXT_SLOW_MS"
+PROFILE_RATE_ENV = "PLAYNEXT_PROFILE_RATE"
+PROFILE_MEMORY_ENV = "PLAYNEXT_PROFILE_MEMORY"
+PROFILE_DIR_ENV = "PLAYNEXT_PROFILE_DIR"
+
+_spans = {}
+_spans_lock = threading.Lock()
+_slow_traces = deque(maxlen=SLOW_TRACES_KEPT)
+_profile_lock = threading.Lock()
+_captures = itertools.count(1)
+
+# Spans recorded so far in the current request, or None outside one
+_trace = contextvars.ContextVar("playnext_trace", default=None)
+
+
+class _SpanStats:
+    """Count, total, max and bucket counts of one span name's durations."""
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)   # last one is +Inf
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile from the buckets (linear within a bucket, capped at the max), in seconds."""
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= target:
+                low = BUCKETS[i - 1] if i else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(low + (high - low) * (target - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+def record(name: str, seconds: float):
+    """Add one duration to a span's histogram (and to the current request's trace)."""
+    with _spans_lock:
+        stats = _spans.get(name)
+        if stats is None:
+            stats = _spans[name] = _SpanStats()
+        stats.add(seconds)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append((name, seconds))
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block under name; exceptions are timed too and re-raised."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+
+def _profile_path(name: str, capture: int, suffix: str) -> str:
+    directory = os.environ.get(PROFILE_DIR_ENV, "profiles")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{capture}-{name}{suffix}")
+
+
+@contextmanager
+def request(name: str):
+    """
+    Time one unit of work (recorded as span name) and trace the spans inside it.
+
+    Slow requests are logged with their breakdown. A sampled share of requests is also
+    profiled, see the module docstring.
+    """
+    token = _trace.set([])
+    rate = float(os.environ.get(PROFILE_RATE_ENV) or 0)
+    profiling = rate > 0 and random.random() < rate and _profile_lock.acquire(blocking=False)
+    profiler = memory = None
+    if profiling:
+        profiler = cProfile.Profile()
+        memory = os.environ.get(PROFILE_MEMORY_ENV) == "1" and not tracemalloc.is_tracing()
+        if memory:
+            tracemalloc.start()
+        profiler.enable()
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        trace = _trace.get()
+        _trace.reset(token)
+        if profiling:
+            profiler.disable()
+            _save_profile(name, profiler, memory)
+            _profile_lock.release()
+        record(name, seconds)
+
+        if seconds * 1000 >= float(os.environ.get(SLOW_MS_ENV) or 500):
+            steps = _summarise(trace)
+            with _spans_lock:
+                _slow_traces.append({"request": name, "at": time.time(), "ms": round(seconds * 1000, 1),
+                                     "spans": steps})
+            breakdown = ", ".join(f"{step} {ms:.0f}ms" for step, ms in steps.items())
+            logging.warning(f"Slow {name}: {seconds * 1000:.0f}ms ({breakdown or 'no spans'})")
+
+
+def _summarise(trace: list) -> dict:
+    """Total milliseconds per span name, largest first."""
+    totals = {}
+    for step, seconds in trace:
+        totals[step] = totals.get(step, 0.0) + seconds * 1000
+    return {step: round(ms, 1) for step, ms in sorted(totals.items(), key=lambda item: -item[1])}
+
+
+def _save_profile(name: str, profiler: cProfile.Profile, memory: bool):
+    """Write a sampled cProfile capture (and the top allocations, if traced)."""
+    capture = next(_captures)
+    snapshot = None
+    if memory:
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+    try:
+        path = _profile_path(name, capture, ".prof")
+        profiler.dump_stats(path)
+        if snapshot is not None:
+            with open(_profile_path(name, capture, ".alloc.txt"), "w") as f:
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
+        logging.info(f"Saved sampled profile of {name} to {path}")
+    except OSError as e:
+        logging.warning(f"Could not save profile of {name}: {e}")
+
+
+def reset():
+    """Drop every aggregated metric and kept trace (e.g. between benchmark runs)."""
+    with _spans_lock:
+        _spans.clear()
+        _slow_traces.clear()
+
+
+def metrics_json() -> dict:
+    """
+    Aggregated metrics as plain data.
+
+    Returns:
+      - dict with "spans" (per name: count, total_s, mean_ms, p50_ms, p95_ms, p99_ms, max_ms;
+        quantiles are estimated from the histogram buckets) and "slow_requests" (the most
+        recent slow request traces, oldest first).
+    """
+    with _spans_lock:
+        spans = {name: {
+            "count": stats.count,
+            "total_s": round(stats.total, 4),
+            "mean_ms": round(stats.total / stats.count * 1000, 3),
+            "p50_ms": round(stats.quantile(0.5) * 1000, 3),
+            "p95_ms": round(stats.quantile(0.95) * 1000, 3),
+            "p99_ms": round(stats.quantile(0.99) * 1000, 3),
+            "max_ms": round(stats.max * 1000, 3),
+        } for name, stats in sorted(_spans.items())}
+        return {"spans": spans, "slow_requests": list(_slow_traces)}
+
+
+def prometheus_text(gauges: dict = None) -> str:
+    """
+    Aggregated metrics in the Prometheus text exposition format: one histogram,
+    playnext_span_seconds, labelled by span name.
+
+    Parameters:
+      - gauges (dict or None): extra {metric_name: number} samples to append, e.g. cache counters.
+    """
+    lines = ["# HELP playnext_span_seconds Time spent in each step of the recommendation flow.",
+             "# TYPE playnext_span_seconds histogram"]
+    with _spans_lock:
+        for name, stats in sorted(_spans.items()):
+            cumulative = 0
+            for bound, count in zip([*BUCKETS, "+Inf"], stats.buckets):
+                cumulative += count
+                lines.append(f'playnext_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'playnext_span_seconds_sum{{span="{name}"}} {stats.total:.6f}')
+            lines.append(f'playnext_span_seconds_count{{span="{name}"}} {stats.count}')
+    for metric, value in (gauges or {}).items():
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def summarise_profiles(directory: str, top: int = 30, sort: str = "cumulative"):
+    """Merge every sampled .prof capture in directory and print the top functions."""
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".prof"))
+    if not paths:
+        print(f"No .prof files in {directory}")
+        return
+    stats = pstats.Stats(*paths)
+    print(f"{len(paths)} sampled requests")
+    stats.sort_stats(sort).print_stats(top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise sampled cProfile captures")
+    parser.add_argument("directory", nargs="?", default=os.environ.get(PROFILE_DIR_ENV, "profiles"))
+    parser.add_argument("--top", type=int, default=30)
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key (cumulative, tottime, ...)")
+    args = parser.parse_args()
+    summarise_profiles(args.directory, args.top, args.sort)
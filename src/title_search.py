@@ -0,0 +1,113 @@
+"""
+Autocomplete index for game titles.
+
+Titles are normalised once and kept in sorted arrays: one of whole titles and one of the
+individual words in each title, so prefix and word-prefix matches are binary searches
+instead of scans. The expensive WRatio scorer then runs once, over a bounded candidate pool
+(prefix and word-prefix hits, plus plain-ratio near-misses when a typo leaves that pool
+short), and results are memoized per query so the repeated keystrokes of a Streamlit
+rerun cost a dict lookup.
+"""
+
+import re
+from functools import lru_cache
+import numpy as np
+from rapidfuzz import process, fuzz
+from src.name_index import normalize_title
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class TitleSearchIndex:
+    """
+    Prefix + fuzzy search over a fixed list of display titles.
+
+    Titles should be ordered by popularity: when a query matches more titles than the
+    candidate pool can hold, the earlier titles are kept.
+
+    Parameters:
+      - titles (list[str]): distinct display titles.
+      - prefix_limit (int): how many whole-title prefix matches are always considered.
+      - limit (int): maximum number of results returned.
+      - score_cutoff (float): minimum WRatio score (0-100) for a result.
+      - pool_size (int): cap on word-prefix candidates scored with WRatio.
+      - ratio_pool (int): plain-ratio near-misses added when prefix lookups find too little.
+      - cache_size (int): number of distinct queries memoized.
+    """
+
+    def __init__(self, titles, prefix_limit=4, limit=12, score_cutoff=50,
+                 pool_size=500, ratio_pool=50, cache_size=4096):
+        self.titles = list(titles)
+        self.normalized = [normalize_title(t) for t in self.titles]
+        self.prefix_limit = prefix_limit
+        self.limit = limit
+        self.score_cutoff = score_cutoff
+        self.pool_size = pool_size
+        self.ratio_pool = ratio_pool
+
+        normalized = np.array(self.normalized)
+        self._order = np.argsort(normalized, kind="stable")
+        self._sorted = normalized[self._order]
+
+        # Every word of every title, sorted, with the title it came from
+        words, owners = [], []
+        for pos, title in enumerate(self.normalized):
+            for word in set(WORD_PATTERN.findall(title)):
+                words.append(word)
+                owners.append(pos)
+        words = np.array(words)
+        word_order = np.argsort(words, kind="stable")
+        self._words = words[word_order]
+        self._word_owner = np.array(owners, dtype=np.int32)[word_order]
+
+        self.search = lru_cache(maxsize=cache_size)(self._search)
+
+    def __len__(self):
+        return len(self.titles)
+
+    @staticmethod
+    def _prefix_range(sorted_values: np.ndarray, prefix: str):
+        lo = np.searchsorted(sorted_values, prefix, side="left")
+        hi = np.searchsorted(sorted_values, prefix + "\U0010ffff", side="left")
+        return lo, hi
+
+    def prefix_positions(self, query: str, limit: int) -> np.ndarray:
+        """Positions (into titles) of up to `limit` titles starting with query, alphabetically."""
+        lo, hi = self._prefix_range(self._sorted, query)
+        return self._order[lo:min(hi, lo + limit)]
+
+    def word_prefix_positions(self, query: str, limit: int) -> np.ndarray:
+        """
+        Positions of titles containing a word that starts with one of the query's words,
+        most popular first, capped at `limit`.
+        """
+        tokens = WORD_PATTERN.findall(query)
+        long_tokens = [t for t in tokens if len(t) > 1] or tokens
+        hits = [self._word_owner[slice(*self._prefix_range(self._words, t))] for t in long_tokens]
+        if not hits:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(hits))[:limit]
+
+    def _search(self, query: str) -> tuple:
+        """
+        Return ((title, score), ...) best first. Call through self.search to use the memo.
+        """
+        query = normalize_title(query)
+        if not query:
+            return ()
+
+        # Candidate pool: whole-title prefixes and word prefixes
+        pool = set(self.prefix_positions(query, self.prefix_limit).tolist())
+        pool.update(self.word_prefix_positions(query, self.pool_size).tolist())
+
+        # Typos defeat prefix lookups; only then pay for a plain-ratio sweep to find near-misses
+        if len(pool) < self.limit:
+            for _, _, pos in process.extract(query, self.normalized, scorer=fuzz.ratio, processor=None,
+                                             limit=self.ratio_pool):
+                pool.add(pos)
+
+        # One WRatio pass over the bounded pool
+        choices = {pos: self.normalized[pos] for pos in sorted(pool)}
+        matches = process.extract(query, choices, scorer=fuzz.WRatio, processor=None,
+                                  limit=self.limit, score_cutoff=self.score_cutoff)
+        return tuple((self.titles[pos], score) for _, score, pos in matches)
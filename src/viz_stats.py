@@ -0,0 +1,112 @@
+"""
+Precomputed statistics behind the DataViz page's interactive chart.
+
+The chart plots the average user rating against one numeric column, for a range of that
+column the user picks. Filtering the frame on every slider move costs a pass over every row,
+and a scatter of the full dataset sends every point to the browser. Instead, each
+(dataset, column) pair gets a SortedXY range index: the typed x and y values, sorted by x,
+so a range is two binary searches and a slice. Ranges with at most MAX_SCATTER_POINTS games
+are plotted as points; larger ones are binned into a 2D histogram here and sent as a
+density heatmap, whose size does not grow with the number of games.
+
+Nothing here depends on Streamlit. Indexes and chart data are kept in the registry's chart
+cache, keyed by (dataset, column) and (dataset, column, range), so a range looked at before
+is served without recomputing it.
+"""
+
+import numpy as np
+from src.data_registry import get_registry
+from src.telemetry import span
+
+# Datasets the page offers, and the frame each one reads
+DATASETS = ["Top 300 Games", "Full Dataset"]
+
+# Chart name -> (x column, x axis label); every chart plots Y_COLUMN against its x column
+CHARTS = {
+    "Average Game Rating vs Playtime": ("playingtime", "Playtime (in minutes)"),
+    "Average Game Rating vs BGG Rank": ("BGGrank", "Board Game Geek Ranking"),
+    "Average Game Rating vs Game Weight": ("averageweight", "Game Weight (scale 1-5)"),
+}
+Y_COLUMN = "average"
+
+# Ranges with more games than this are drawn as a density heatmap of DENSITY_BINS (x, y) bins
+MAX_SCATTER_POINTS = 2000
+DENSITY_BINS = (80, 50)
+
+
+class SortedXY:
+    """
+    One chart's x and y values as read-only float64 arrays, sorted by x; rows missing
+    either value are left out.
+    """
+
+    def __init__(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        keep = ~(np.isnan(x) | np.isnan(y))
+        order = np.argsort(x[keep], kind="stable")
+        self.x = x[keep][order]
+        self.y = y[keep][order]
+        self.x.flags.writeable = False
+        self.y.flags.writeable = False
+
+    @property
+    def x_min(self) -> float:
+        return float(self.x[0]) if len(self.x) else 0.0
+
+    @property
+    def x_max(self) -> float:
+        return float(self.x[-1]) if len(self.x) else 0.0
+
+    def slice(self, low: float, high: float) -> tuple:
+        """(x, y) views of the values with low <= x <= high."""
+        start = np.searchsorted(self.x, low, side="left")
+        stop = np.searchsorted(self.x, high, side="right")
+        return self.x[start:stop], self.y[start:stop]
+
+
+def _frame(dataset: str, registry):
+    return registry.top300 if dataset == "Top 300 Games" else registry.gamedata
+
+
+def range_index(dataset: str, x_col: str, registry=None) -> SortedXY:
+    """The (cached) range index of Y_COLUMN against x_col in a dataset."""
+    registry = registry or get_registry()
+
+    def build(keys):
+        frame = _frame(dataset, registry)
+        return {keys[0]: SortedXY(frame[x_col], frame[Y_COLUMN])}
+
+    return registry.charts.get_many([("index", dataset, x_col)], build)[0]
+
+
+def chart_data(dataset: str, x_col: str, x_range: tuple, registry=None) -> dict:
+    """
+    What the chart draws for a range of x_col.
+
+    Parameters:
+      - dataset (str): one of DATASETS.
+      - x_col (str): x column of one of CHARTS.
+      - x_range (tuple): inclusive (low, high) bounds on x_col.
+      - registry (DataRegistry or None): data handle; the process-wide registry by default.
+
+    Returns:
+      - dict with "n" (games in the range) and "kind": "scatter" with "x" and "y" arrays, or
+        "density" with "counts" (y bins by x bins) and the bin edges "x_edges" and "y_edges".
+        Arrays are shared through the cache; treat them as read-only.
+    """
+    registry = registry or get_registry()
+    low, high = float(x_range[0]), float(x_range[1])
+
+    def build(keys):
+        with span("viz_stats"):
+            x, y = range_index(dataset, x_col, registry).slice(low, high)
+            if len(x) <= MAX_SCATTER_POINTS:
+                data = {"kind": "scatter", "n": len(x), "x": x, "y": y}
+            else:
+                counts, x_edges, y_edges = np.histogram2d(x, y, bins=DENSITY_BINS)
+                data = {"kind": "density", "n": len(x), "counts": counts.T,
+                        "x_edges": x_edges, "y_edges": y_edges}
+        return {keys[0]: data}
+
+    return registry.charts.get_many([("chart", dataset, x_col, low, high)], build)[0]
@@ -0,0 +1,268 @@
+"""
+Startup warm-up and readiness signal for the deployed app.
+
+Without a warm-up the first visitor after a deploy or restart pays for reading the data,
+importing rapidfuzz, building the name/title/filter indexes, opening the neighbour tables
+and filling the recommendation caches. warm_up() does all of that up front and then
+primes the caches for the most searched titles (the top of BGGtop300.csv), running the
+same calls a first search makes, with the sidebar's default filters, in every match mode.
+Trees shipped without features.npz get it built here, since filtered searches need it to
+fill their lists.
+
+Readiness is reported three ways, so a load balancer can hold traffic until a replica is warm:
+  - is_ready() / status() for in-process callers;
+  - a JSON file written atomically when warm-up finishes (PLAYNEXT_READY_FILE);
+  - an optional HTTP endpoint on its own port (PLAYNEXT_HEALTH_PORT): GET /ready returns
+    200 once warm and 503 before (or if warm-up failed); GET /health is always 200.
+
+The same port serves the span metrics of src/telemetry.py, plus the result cache counters:
+GET /metrics in the Prometheus text format and GET /metrics.json as JSON. The image cache
+counters (src/image_cache.py) are served there too. With PLAYNEXT_PREFETCH_IMAGES=N the
+warm-up also fetches the thumbnails of the N best-ranked games once the replica is ready.
+
+Streamlit only runs streamlit_app.py when a session connects, so calling start_warm_up()
+there warms the process on the first visit at the latest. To warm at boot, before any
+visitor, launch the app through this module instead of `streamlit run`:
+
+    python -m src.warmup --health-port 8502 -- --server.port 8501
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.data_registry import ANN_PATHS, FEATURES_PATH, RECIPE_PATHS, get_registry
+from src.features import FEATURE_COLUMNS, vectorize_games
+from src.filters import SIDEBAR_DEFAULTS
+from src.helper_funct import find_closest_name
+from src.image_cache import get_image_cache, top_thumbnails
+from src.recommendation import DETAIL_COLUMNS, rank_filtered
+from src.result_cards import RESULTS_PAGE_SIZE, result_cards
+from src import telemetry
+
+# How many of the best-ranked top-300 titles get their searches primed
+WARMUP_TITLES = 50
+
+# Deployment settings, read from the environment so streamlit_app.py needs no arguments
+READY_FILE_ENV = "PLAYNEXT_READY_FILE"
+HEALTH_PORT_ENV = "PLAYNEXT_HEALTH_PORT"
+WARMUP_TITLES_ENV = "PLAYNEXT_WARMUP_TITLES"
+PREFETCH_IMAGES_ENV = "PLAYNEXT_PREFETCH_IMAGES"
+
+_status = {"state": "idle"}
+_status_lock = threading.Lock()
+_started = False
+_health_server = None
+
+
+def _set_status(**fields):
+    with _status_lock:
+        _status.update(fields)
+
+
+def status() -> dict:
+    """Snapshot of the warm-up state: idle, warming, ready or failed, plus timings."""
+    with _status_lock:
+        return dict(_status)
+
+
+def is_ready() -> bool:
+    return status()["state"] == "ready"
+
+
+def write_ready_file(path: str, payload: dict):
+    """Write the readiness file atomically, so a probe never reads half of it."""
+    directory = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as f:
+        json.dump(payload, f, indent=2)
+    os.replace(f.name, path)
+
+
+def warmup_titles(registry, top_n: int = WARMUP_TITLES) -> list:
+    """The best-ranked titles of the top-300 list that are also in gamedata."""
+    top300 = registry.top300.sort_values("BGGrank", kind="stable")
+    return [name for name in top300["name"].dropna().astype(str) if name in registry.names][:top_n]
+
+
+def build_feature_matrices(registry, path: str = FEATURES_PATH):
+    """
+    Vectorize gamedata's token columns into features.npz when the tree ships without it, so
+    filtered searches can fill their lists (the ANN indexes stay optional; see data/build_topk.py).
+    The file is written atomically, so replicas warming up at once never read half of it.
+    """
+    frame = registry.details(registry.gamedata["id"].to_numpy(), list(FEATURE_COLUMNS.values()))
+    features = vectorize_games(frame.rename_axis("id").reset_index())
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), suffix=".npz", delete=False) as f:
+        pass
+    features.save(f.name)
+    os.replace(f.name, path)
+    logging.info(f"Warm-up: built feature matrices for {len(features.ids)} games at {path}")
+
+
+def warm_up(top_n: int = WARMUP_TITLES, ready_file: str = None, registry=None) -> dict:
+    """
+    Build every shared index and prime the caches for the top_n most searched titles.
+
+    Parameters:
+      - top_n (int): titles whose searches are primed, in every match mode.
+      - ready_file (str or None): readiness file to remove now and write once warm.
+      - registry (DataRegistry or None): data handle; the process-wide registry by default.
+
+    Returns:
+      - the final status() dict.
+    """
+    if ready_file and os.path.exists(ready_file):
+        os.remove(ready_file)
+    started = time.time()
+    _set_status(state="warming", started_at=started, pid=os.getpid())
+    try:
+        registry = registry or get_registry()
+        for mode in RECIPE_PATHS:
+            registry.similarity_store(mode)
+            # ANN indexes and feature matrices are optional (not shipped); only open them if built
+            if os.path.isdir(ANN_PATHS[mode]):
+                registry.ann_index(mode)
+            else:
+                logging.info(f"Warm-up: no ANN index for '{mode}' at {ANN_PATHS[mode]}; skipped")
+        if not registry.has_feature_matrices():
+            try:
+                build_feature_matrices(registry)
+            except OSError:
+                logging.exception("Warm-up: could not build feature matrices; filtered searches may return short lists")
+        if registry.has_feature_matrices():
+            registry.feature_matrices()
+        registry.details([], DETAIL_COLUMNS)   # opens (maps) the detail columns
+        indexes_done = time.time()
+
+        titles = warmup_titles(registry, top_n)
+        for title in titles:
+            find_closest_name(title, registry=registry)
+            for mode in RECIPE_PATHS:
+                # Same filters and n as the Home page, so its first search finds this result cached
+                similar_ids, _ = rank_filtered(title, mode, dict(SIDEBAR_DEFAULTS), 25, registry=registry)
+                result_cards(similar_ids[:RESULTS_PAGE_SIZE], registry=registry)
+    except Exception as e:
+        logging.exception("Warm-up failed; the app still serves, loading data on demand")
+        _set_status(state="failed", error=str(e), seconds=round(time.time() - started, 2))
+        return status()
+
+    # The primed searches are not traffic; start the span metrics from zero
+    telemetry.reset()
+    _set_status(state="ready", titles=len(titles), index_seconds=round(indexes_done - started, 2),
+                seconds=round(time.time() - started, 2), result_cache=registry.results.stats())
+    logging.info(f"Warm-up finished in {time.time() - started:.1f}s ({len(titles)} titles primed)")
+    if ready_file:
+        write_ready_file(ready_file, status())
+
+    # Images come from a remote host, so they are fetched after the replica takes traffic
+    prefetch_images = int(os.environ.get(PREFETCH_IMAGES_ENV) or 0)
+    if prefetch_images:
+        try:
+            get_image_cache().prefetch(top_thumbnails(prefetch_images, registry))
+        except Exception:
+            logging.exception("Image prefetch failed; thumbnails are fetched on first view instead")
+    return status()
+
+
+def result_cache_stats() -> dict:
+    """The shared registry's result cache counters, or {} while the registry is still loading."""
+    return get_registry().results.stats() if is_ready() else {}
+
+
+class _HealthHandler(BaseHTTPRequestHandler):
+    """
+    GET /health (liveness) and GET /ready (readiness) as small JSON responses, and the
+    telemetry metrics on GET /metrics (Prometheus text) and GET /metrics.json.
+    """
+
+    def do_GET(self):
+        content_type = "application/json"
+        if self.path == "/health":
+            code, body = 200, {"state": "alive"}
+        elif self.path == "/ready":
+            body = status()
+            code = 200 if body["state"] == "ready" else 503
+        elif self.path == "/metrics.json":
+            code, body = 200, {**telemetry.metrics_json(), "result_cache": result_cache_stats(),
+                               "image_cache": get_image_cache().stats()}
+        elif self.path == "/metrics":
+            counters = {}
+            for cache, stats in (("result", result_cache_stats()), ("image", get_image_cache().stats())):
+                for name, value in stats.items():
+                    suffix = "_total" if name in ("hits", "misses", "evictions", "failures") else ""
+                    counters[f"playnext_{cache}_cache_{name}{suffix}"] = value
+            code, body = 200, telemetry.prometheus_text(counters)
+            content_type = "text/plain; version=0.0.4"
+        else:
+            code, body = 404, {"error": "not found"}
+        payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass   # probes hit this every few seconds; keep them out of the app log
+
+
+def start_health_server(port: int, host: str = "0.0.0.0"):
+    """Serve /health and /ready on a daemon thread (once per process); returns the server."""
+    global _health_server
+    with _status_lock:
+        if _health_server is None:
+            _health_server = ThreadingHTTPServer((host, port), _HealthHandler)
+            threading.Thread(target=_health_server.serve_forever, name="playnext-health", daemon=True).start()
+            logging.info(f"Readiness endpoint on http://{host}:{port}/ready")
+    return _health_server
+
+
+def start_warm_up(top_n: int = None, ready_file: str = None, health_port: int = None) -> bool:
+    """
+    Start warm_up() on a background thread, once per process; later calls do nothing.
+    Arguments left as None are read from the PLAYNEXT_* environment variables.
+
+    Returns whether this call started it.
+    """
+    global _started
+    with _status_lock:
+        if _started:
+            return False
+        _started = True
+
+    top_n = top_n if top_n is not None else int(os.environ.get(WARMUP_TITLES_ENV, WARMUP_TITLES))
+    ready_file = ready_file or os.environ.get(READY_FILE_ENV)
+    health_port = health_port or os.environ.get(HEALTH_PORT_ENV)
+    if health_port:
+        start_health_server(int(health_port))
+    threading.Thread(target=warm_up, args=(top_n, ready_file), name="playnext-warmup", daemon=True).start()
+    return True
+
+
+def serve(argv=None):
+    """Start the warm-up (and readiness endpoint) first, then run the Streamlit app in this process."""
+    from streamlit.web import cli as stcli
+
+    parser = argparse.ArgumentParser(description="Run the app with a warm-up at boot")
+    parser.add_argument("--health-port", type=int, help="Port for GET /ready and /health")
+    parser.add_argument("--ready-file", help="Readiness file written once warm")
+    parser.add_argument("--titles", type=int, help="Top-300 titles to prime")
+    parser.add_argument("--app", default="streamlit_app.py")
+    args, streamlit_args = parser.parse_known_args(argv)
+
+    start_warm_up(args.titles, args.ready_file, args.health_port)
+    sys.argv = ["streamlit", "run", args.app, *[a for a in streamlit_args if a != "--"]]
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # Go through the importable module, not this __main__ copy, so streamlit_app.py's own
+    # start_warm_up() call sees that the warm-up already started
+    import src.warmup
+    src.warmup.serve()
@@ -1,4 +1,10 @@
 import streamlit as st
+from src.warmup import start_warm_up
+
+# Build the shared indexes and prime the caches in the background, once per process
+# (a no-op when the app was launched with python -m src.warmup, which started it at boot)
+start_warm_up()
+
 from pages import Home
 from pages import DataViz
 from pages import About